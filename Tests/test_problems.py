@@ -1,11 +1,21 @@
+import os
+import pytest
 import controller
 from src.core.definitions import console as console
 from src.core.solver import Solver as Solver
+from src.core.solver import one_answer_left as one_answer_left
 from src.problems.problems import get_best_time as get_best_time
 # problems, solver
 # import math
 # NOTE: run .venv/bin/pytest --capture=tee-sys to see code output in real-time, rather than having it all captured.
 class TestProblems:
+    @pytest.fixture(autouse=True)
+    def checkpoint_directory(self, tmp_path, monkeypatch):
+        """
+        Have every test's solves write their checkpoint files to a temporary directory, rather than to CHECKPOINT_DIRECTORY in the repository, so that a failed test can't leave one behind for later runs.
+        """
+        monkeypatch.setattr(controller, "CHECKPOINT_DIRECTORY", str(tmp_path / "Checkpoints"))
+
     @staticmethod
     def get_problem_and_compare_output(p_id, expected_cost):
         """
@@ -38,4 +48,544 @@ class TestProblems:
         TestProblems.get_problem_and_compare_output("f5xtdf", (1.8717948717948716, 5.282051282051283))
 
     def test_I48Z(self):
-        TestProblems.get_problem_and_compare_output("i48zcx", (2.1666666666666665, 5.895833333333333))
\ No newline at end of file
+        TestProblems.get_problem_and_compare_output("i48zcx", (2.1666666666666665, 5.895833333333333))
+
+    @staticmethod
+    def solve_with_config(p_id, settings, **make_solver_kwargs):
+        """
+        Return controller.make_solver(problem `p_id`, **`make_solver_kwargs`), made with the config settings in the dict `settings` of {setting name : value}, which are put back afterwards.
+        """
+        from src.core import config
+        old_settings = {name : getattr(config, name) for name in settings}
+        for (name, value) in settings.items():
+            setattr(config, name, value)
+        try:
+            return controller.make_solver(controller.get_requested_problem(p_id=p_id), **make_solver_kwargs)
+        finally:
+            for (name, value) in old_settings.items():
+                setattr(config, name, value)
+
+    @staticmethod
+    def compare_with_config(p_ids, base_settings=None, compare_caches=True, **overrides):
+        """
+        Assert that solving each problem in `p_ids` with the config settings `overrides` gives the same expected cost as, and (if `compare_caches`) the same filtered cache as, solving it with the settings `base_settings` (a dict of {setting name : value}, or None for the current settings).
+
+        Returns
+        -------
+        A list of (base solver, overridden solver) for each problem, for the caller to check more things about.
+        """
+        solver_pairs = []
+        for p_id in p_ids:
+            base_s = TestProblems.solve_with_config(p_id, base_settings or dict())
+            overridden_s = TestProblems.solve_with_config(p_id, overrides)
+            assert (overridden_s.expected_cost == base_s.expected_cost)
+            if compare_caches:
+                assert (overridden_s._evaluations_cache == base_s._evaluations_cache)
+            solver_pairs.append((base_s, overridden_s))
+        return solver_pairs
+
+    def test_parallel_f52(self):
+        """
+        Assert that solving with worker processes produces the same evaluation cost and the same filtered cache as solving in one process.
+        """
+        for split_depth in [0, 1]:
+            TestProblems.compare_with_config(["f52lujg"], NUM_PROCESSES=2, PARALLEL_SPLIT_DEPTH=split_depth)
+
+    def test_parallel_1_N(self):
+        for split_depth in [0, 1]:
+            TestProblems.compare_with_config(["1_N"], NUM_PROCESSES=2, PARALLEL_SPLIT_DEPTH=split_depth)
+
+    def test_lower_bound_pruning(self):
+        """
+        Assert that pruning moves by their lower bound costs gives the same expected cost and filtered cache as not pruning, in both modes.
+        """
+        for (pruned_s, unpruned_s) in TestProblems.compare_with_config(
+            ["f52lujg", "1_N"],
+            base_settings={"S_MODE_LOWER_BOUND_PRUNING" : True, "N_MODE_LOWER_BOUND_PRUNING" : True},
+            S_MODE_LOWER_BOUND_PRUNING=False,
+            N_MODE_LOWER_BOUND_PRUNING=False,
+        ):
+            assert (pruned_s.use_lower_bound_pruning and not(unpruned_s.use_lower_bound_pruning))
+
+    def test_lower_bound_costs(self):
+        """
+        Assert that calculate_lower_bound_cost is at most the exact cost, in both rounds and queries, of every game state of the solved policy.
+        """
+        from src.core import config, solver_utils
+        for p_id in ["f52lujg", "1_N"]:
+            s = controller.make_solver(controller.get_requested_problem(p_id=p_id))
+            stack = [s.initial_game_state]
+            while stack:
+                gs = stack.pop()
+                if one_answer_left(s.full_cwas_list, gs.cwa_set):
+                    continue
+                (_, _, gs_tuple, node_cost) = s.get_move_mcost_gs_ncost_from_cache(gs)
+                lower_bound_cost = solver_utils.calculate_lower_bound_cost(s._answer_counts(gs.cwa_set).values(), gs)
+                assert all(
+                    (lower_bound <= cost + config.A_TOL) for (lower_bound, cost) in zip(lower_bound_cost, node_cost)
+                )
+                stack.extend(gs_tuple)
+
+    def test_move_orderings(self):
+        """
+        Assert that every move ordering finds the same expected cost as qs_dict order.
+        """
+        for p_id in ["f52lujg", "1_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            solvers = controller.compare_move_orderings(p)
+            for s in solvers[1:]:
+                assert (s.expected_cost == solvers[0].expected_cost)
+
+    def test_cutoff_bounds(self):
+        """
+        Assert that letting searches stop early with Cost_Bounds doesn't change the filtered cache, which should only have exact costs in it.
+        """
+        from src.core.definitions import Cost_Bounds
+        for (bounds_s, no_bounds_s) in TestProblems.compare_with_config(["f52lujg", "1_N"], USE_CUTOFF_BOUNDS=False):
+            assert all(type(cost) is not Cost_Bounds for (move, cost) in bounds_s._evaluations_cache.values())
+
+    def test_iterative_search_engine(self):
+        """
+        Assert that the iterative search engine produces the same evaluation cost and the same filtered cache as the recursive one.
+        """
+        for (recursive_s, iterative_s) in TestProblems.compare_with_config(
+            ["f52lujg", "1_N"], SEARCH_ENGINE="iterative"
+        ):
+            assert (iterative_s.max_search_stack_depth > 0)
+
+    def test_time_budget(self):
+        """
+        Assert that solving with a time budget gives a valid policy no worse than the capitulate one, and the optimal policy if there is enough time.
+        """
+        p = controller.get_requested_problem(p_id="2_N")
+        capitulate_s = controller.make_solver(p, capitulate=True)
+        out_of_time_s = controller.make_solver(p, time_budget=2)
+        assert (out_of_time_s.proven_optimal is False)
+        assert ((2.267857142857143, 6.136904761904762) <= out_of_time_s.expected_cost <= capitulate_s.expected_cost)
+        p = controller.get_requested_problem(p_id="f52lujg")
+        s = controller.make_solver(p, time_budget=600)
+        assert (s.proven_optimal is True)
+        assert (s._evaluations_cache == controller.make_solver(p)._evaluations_cache)
+
+    def test_bounded_evaluations_cache(self):
+        """
+        Assert that an evaluations cache too small for the whole search evicts entries, but still gives the same filtered cache.
+        """
+        for (p_id, max_entries) in [("f52lujg", 500), ("1_N", 100)]:
+            [(unbounded_s, bounded_s)] = TestProblems.compare_with_config([p_id], EVAL_CACHE_MAX_ENTRIES=max_entries)
+            assert (unbounded_s.evaluations_cache_stats.num_evictions == 0)
+            assert (bounded_s.evaluations_cache_stats.num_evictions > 0)
+
+    def test_spilled_evaluations_cache(self, tmp_path):
+        """
+        Assert that an evaluations cache that spills its evicted entries to disk finds them there, and gives the same filtered cache as an unbounded one.
+        """
+        for (p_id, max_entries) in [("f52lujg", 500), ("1_N", 100)]:
+            [(unbounded_s, spilled_s)] = TestProblems.compare_with_config(
+                [p_id], EVAL_CACHE_MAX_ENTRIES=max_entries, EVAL_CACHE_SPILL_DIRECTORY=str(tmp_path)
+            )
+            assert (spilled_s.evaluations_cache_stats.num_disk_hits > 0)
+            assert (spilled_s.evaluations_cache_stats.num_misses == unbounded_s.evaluations_cache_stats.num_misses)
+
+    def test_packed_cache_keys(self):
+        """
+        Assert that keying the evaluations cache by packed ints gives the same solution as keying it by cache game states.
+        """
+        for (unpacked_s, packed_s) in TestProblems.compare_with_config(
+            ["f52lujg", "1_N"],
+            base_settings={"STANDARD_BITSET_TYPE" : int, "PACKED_CACHE_KEYS" : False},
+            compare_caches=False,
+            STANDARD_BITSET_TYPE=int,
+            PACKED_CACHE_KEYS=True,
+        ):
+            assert (len(packed_s._evaluations_cache) == len(unpacked_s._evaluations_cache))
+            for (cache_key, evaluation) in packed_s._evaluations_cache.items():
+                if type(cache_key) is int:
+                    cache_key = controller.solver.solver_utils.unpack_cache_key(cache_key)
+                assert (unpacked_s._evaluations_cache[cache_key] == evaluation)
+
+    def test_array_costs(self, tmp_path):
+        """
+        Assert that keeping the evaluations cache's costs in arrays gives the same filtered cache, with and without evicting entries to disk.
+        """
+        for (max_entries, spill_directory) in [(None, None), (100, str(tmp_path))]:
+            TestProblems.compare_with_config(
+                ["f52lujg", "1_N"],
+                EVAL_CACHE_ARRAY_COSTS=True,
+                EVAL_CACHE_MAX_ENTRIES=max_entries,
+                EVAL_CACHE_SPILL_DIRECTORY=spill_directory,
+            )
+
+    def test_array_costs_dict_methods(self):
+        """
+        Assert that an Evaluations_Cache with array costs reads like one without through the dict methods too (==, !=, items(), values(), update(), setdefault(), popitem(), copy() and pickling), including the live caches of searches that haven't been filtered yet.
+        """
+        import pickle
+        from src.core import config
+        from src.core.definitions import Cost_Bounds
+        from src.core.evaluations_cache import Evaluations_Cache
+        entries = {1 : (1.0, 2.0), 2 : Cost_Bounds(lower=(1.0, 2.0), upper=(3.0, 4.0)), 3 : (2.5, 3.5)}
+        tuple_cache = Evaluations_Cache()
+        tuple_cache.update(entries)
+        array_cache = Evaluations_Cache(array_costs=True)
+        array_cache.update(tuple_cache)
+        assert (array_cache == tuple_cache == entries) and (tuple_cache == array_cache) and (entries == array_cache)
+        assert (dict(array_cache.items()) == entries) and (list(array_cache.values()) == list(entries.values()))
+        assert (array_cache.copy() == entries) and (type(array_cache.copy()) is dict)
+        assert (pickle.loads(pickle.dumps(array_cache)) == entries)
+        assert (array_cache.setdefault(1, (5.0, 5.0)) == (1.0, 2.0))
+        array_cache[1] = (1.0, 2.5)
+        assert (array_cache != tuple_cache) and not(array_cache == entries)
+        assert (array_cache.popitem() == (3, (2.5, 3.5)))
+        for p_id in ["f52lujg", "1_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            searched_solvers = []
+            for array_costs in [False, True]:
+                old_array_costs = config.EVAL_CACHE_ARRAY_COSTS
+                config.EVAL_CACHE_ARRAY_COSTS = array_costs
+                try:
+                    s = controller.Solver_Nightmare(p) if (p.mode == controller.NIGHTMARE) else controller.solver.Solver(p)
+                finally:
+                    config.EVAL_CACHE_ARRAY_COSTS = old_array_costs
+                s._search(qs_dict=s.qs_dict, game_state=s.initial_game_state)
+                searched_solvers.append(s)
+            (tuple_costs_s, array_costs_s) = searched_solvers
+            assert (array_costs_s._evaluations_cache.cost_array is not None)
+            assert (array_costs_s._evaluations_cache == tuple_costs_s._evaluations_cache)
+            assert (dict(array_costs_s._evaluations_cache.items()) == dict(tuple_costs_s._evaluations_cache.items()))
+
+    def test_interned_cwa_sets(self):
+        """
+        Assert that interning the evaluations cache's cwa_sets gives the same filtered cache, with and without evicting entries, and shares some cwa_sets.
+        """
+        for max_entries in [None, 100]:
+            for (s, interned_s) in TestProblems.compare_with_config(
+                ["f52lujg", "1_N"],
+                base_settings={"EVAL_CACHE_INTERN_CWA_SETS" : False},
+                EVAL_CACHE_INTERN_CWA_SETS=True,
+                EVAL_CACHE_MAX_ENTRIES=max_entries,
+            ):
+                assert (interned_s.evaluations_cache_stats.num_shared_cwa_sets > 0)
+                assert (interned_s.evaluations_cache_stats.num_bytes_saved > 0)
+                assert (s.evaluations_cache_stats.num_shared_cwa_sets == 0)
+
+    def test_qs_dict_memo(self):
+        """
+        Assert that memoizing filtered qs_dicts gives the same filtered cache, with a memo big enough for every qs_dict and one that has to evict some, and that the big memo gets hits.
+        """
+        for max_entries in [100_000, 4]:
+            for (s, memo_s) in TestProblems.compare_with_config(
+                ["f52lujg", "1_N"],
+                base_settings={"QS_DICT_MEMO_MAX_ENTRIES" : 0},
+                QS_DICT_MEMO_MAX_ENTRIES=max_entries,
+            ):
+                assert (s.qs_dict_memo_stats is None)
+                if max_entries == 4:
+                    assert (memo_s.qs_dict_memo_stats.num_evictions > 0)
+                else:
+                    assert (memo_s.qs_dict_memo_stats.num_hits > 0)
+                    assert (memo_s.qs_dict_memo_stats.num_evictions == 0)
+                assert (not memo_s.qs_dict_memo.entries)
+
+    def test_canonical_form_cache(self):
+        """
+        Assert that keeping canonical forms across rounds gives the same filtered cache as converting each round on its own, with a cache big enough for every cwa_set and one that has to evict some, and that both get hits.
+        """
+        for max_entries in [100_000, 16]:
+            [(s, cached_s)] = TestProblems.compare_with_config(
+                ["1_N"], base_settings={"CANONICAL_CACHE_MAX_ENTRIES" : 0}, CANONICAL_CACHE_MAX_ENTRIES=max_entries
+            )
+            assert (s.canonical_form_cache_stats is None)
+            assert (cached_s.canonical_form_cache_stats.num_hits > 0)
+            if max_entries == 16:
+                assert (cached_s.canonical_form_cache_stats.num_evictions > 0)
+            else:
+                assert (cached_s.canonical_form_cache_stats.num_evictions == 0)
+            assert (not len(cached_s.canonical_form_cache))
+
+    def test_int_working_cwa_sets(self):
+        """
+        Assert that int working cwa_sets give the same solution and filtered cache as frozenset ones, and the same capitulate policy cost.
+        """
+        for (frozenset_s, int_s) in TestProblems.compare_with_config(
+            ["f52lujg", "1_N"],
+            base_settings={"WORKING_CWA_SET_TYPE" : frozenset},
+            compare_caches=False,
+            WORKING_CWA_SET_TYPE=int,
+        ):
+            assert (type(int_s.initial_game_state.cwa_set) is int)
+            assert (len(int_s._evaluations_cache) == len(frozenset_s._evaluations_cache))
+            for (cache_gs, evaluation) in int_s._evaluations_cache.items():
+                if cache_gs not in frozenset_s._evaluations_cache: # a working game state, so its cwa_set differs.
+                    cache_gs = cache_gs._replace(
+                        cwa_set=frozenset(controller.solver.solver_utils.cwa_set_indexes(cache_gs.cwa_set))
+                    )
+                assert (frozenset_s._evaluations_cache[cache_gs] == evaluation)
+            p_id = frozenset_s.problem.identity
+            assert (
+                TestProblems.solve_with_config(p_id, {"WORKING_CWA_SET_TYPE" : int}, capitulate=True).expected_cost ==
+                TestProblems.solve_with_config(p_id, {"WORKING_CWA_SET_TYPE" : frozenset}, capitulate=True).expected_cost
+            )
+
+    def test_rule_masks_by_verifier(self):
+        """
+        Assert that the rule masks by verifier from Solver.cwa_rule_masks have the same possible rules for each verifier as the loop over every CWA (get_set_r_unique_ids_vs_from_cwas_set_representation), and that the minimal_vs_list made from them groups the verifiers like grouping those loop's sets does, for the game states one query from the start, for standard and nightmare problems and both working cwa_set types.
+        """
+        from src.core import solver_utils
+        from src.core.solver_nightmare import _calculate_minimal_vs_list
+        for p_id in ["f52lujg", "1_N", "2_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            s = controller.Solver_Nightmare(p) if (p.mode == controller.NIGHTMARE) else controller.solver.Solver(p)
+            all_rule_ids_by_verifier = controller.solver.get_set_r_unique_ids_vs_from_cwas_set_representation(
+                s.full_cwas_list, s.initial_game_state.cwa_set, s.num_rcs, s.n_mode
+            )
+            rule_unique_ids = sorted(set().union(*all_rule_ids_by_verifier)) # bit k of a rule mask is rule_unique_ids[k]
+            for set_type in [frozenset, int]:
+                cwa_sets = [s.initial_game_state.cwa_set] + [
+                    cwa_set for q_infos in s.qs_dict.values() for q_info in q_infos.values() for cwa_set in q_info
+                ]
+                for cwa_set in cwa_sets:
+                    game_state = s.initial_game_state._replace(cwa_set=solver_utils.make_working_cwa_set(
+                        solver_utils.cwa_set_indexes(cwa_set), set_type
+                    ))
+                    rule_ids_by_verifier = controller.solver.get_set_r_unique_ids_vs_from_cwas_set_representation(
+                        s.full_cwas_list, game_state.cwa_set, s.num_rcs, s.n_mode
+                    )
+                    rule_masks_by_verifier = solver_utils.get_rule_masks_by_verifier(game_state.cwa_set, s.cwa_rule_masks)
+                    assert (rule_ids_by_verifier == [
+                        {rule_id for (bit, rule_id) in enumerate(rule_unique_ids) if ((rule_mask >> bit) & 1)}
+                        for rule_mask in rule_masks_by_verifier
+                    ])
+                    expected_minimal_vs_list = []
+                    for (v_index, rule_ids) in enumerate(rule_ids_by_verifier):
+                        for v_set in expected_minimal_vs_list:
+                            if rule_ids_by_verifier[min(v_set)] == rule_ids:
+                                v_set.add(v_index)
+                                break
+                        else:
+                            expected_minimal_vs_list.append({v_index})
+                    assert (_calculate_minimal_vs_list(s.cwa_rule_masks, game_state) == expected_minimal_vs_list)
+
+    def test_query_table_full_filter(self):
+        """
+        Assert that full_filter gives the same qs_dict with a Query_Table as with set operations, for the game states one query from the start, for both working cwa_set types.
+        """
+        from src.core import config, solver_utils, query_table
+        old_working_cwa_set_type = config.WORKING_CWA_SET_TYPE
+        try:
+            for p_id in ["f52lujg", "1_N"]:
+                p = controller.get_requested_problem(p_id=p_id)
+                for set_type in [frozenset, int]:
+                    config.WORKING_CWA_SET_TYPE = set_type
+                    s = controller.Solver_Nightmare(p) if (p.mode == controller.NIGHTMARE) else controller.solver.Solver(p)
+                    assert (type(s.qs_dict) is query_table.Query_Dict)
+                    for q_infos in s.qs_dict.values():
+                        for q_info in q_infos.values():
+                            for cwa_set in q_info:
+                                filtered_qs_dict = solver_utils.full_filter(s.qs_dict, cwa_set)
+                                assert (type(filtered_qs_dict) is query_table.Query_Dict)
+                                assert (
+                                    list(filtered_qs_dict.items()) ==
+                                    list(solver_utils.full_filter(dict(s.qs_dict), cwa_set).items())
+                                )
+        finally:
+            config.WORKING_CWA_SET_TYPE = old_working_cwa_set_type
+
+    def test_rule_reject_masks(self):
+        """
+        Assert that every rule's reject mask and reject set have the possibilities its function rejects, whether the function was called on arrays of digits or on one possibility at a time.
+        """
+        from src.core import rules
+        from src.core.definitions import possibilities, int_to_tri_sq_ci_tuple
+        for rule_card in rules.rcs_deck.values():
+            for rule in rule_card:
+                rejected = [not(rule.func(*int_to_tri_sq_ci_tuple(p))) for p in possibilities]
+                assert (rule.reject_mask == sum((1 << i) for (i, is_rejected) in enumerate(rejected) if is_rejected))
+                assert (rule.reject_set == {p for (p, is_rejected) in zip(possibilities, rejected) if is_rejected})
+
+    def test_possible_rules_combos(self):
+        """
+        Assert that the backtracking combo enumerator gives the same combos and answers, in the same order, as checking every combo of the rules cards, for standard and extreme problems.
+        """
+        from src.core import solver_utils, rules
+        for p_id in ["1", "2", "c630yvb", "f52lujg", "f5xtdf", "f435fe"]:
+            rcs_list = rules.make_rcs_list(controller.get_requested_problem(p_id=p_id))
+            assert (
+                solver_utils._get_possible_rules_combos_with_answers(rcs_list) ==
+                solver_utils._get_possible_rules_combos_with_answers_product(rcs_list)
+            )
+
+    def test_nightmare_cwas_list(self):
+        """
+        Assert that a Nightmare_Cwas_List gives the same CWAs, in the same order, as a list with a tuple for each permutation of each combo, and the same one_answer_left for the game states one query from the start, for both working cwa_set types.
+        """
+        import itertools
+        from src.core import solver_utils, rules
+        for p_id in ["1_N", "2_N"]:
+            rcs_list = rules.make_rcs_list(controller.get_requested_problem(p_id=p_id))
+            full_cwas_list = solver_utils.make_full_cwas_list(True, rcs_list)
+            expected_full_cwas_list = sorted([
+                (combo, permutation, answer)
+                for (combo, answer) in solver_utils._get_possible_rules_combos_with_answers(rcs_list)
+                for permutation in itertools.permutations(range(len(rcs_list)))
+            ], key=lambda cwa: cwa[-1])
+            assert (type(full_cwas_list) is solver_utils.Nightmare_Cwas_List)
+            assert (list(full_cwas_list) == expected_full_cwas_list)
+            assert ([full_cwas_list[i] for i in range(len(full_cwas_list))] == expected_full_cwas_list)
+            assert (full_cwas_list[-3:] == expected_full_cwas_list[-3:])
+            for set_type in [frozenset, int]:
+                s = controller.Solver_Nightmare(controller.get_requested_problem(p_id=p_id))
+                cwa_sets = [s.initial_game_state.cwa_set] + [
+                    solver_utils.make_working_cwa_set(solver_utils.cwa_set_indexes(cwa_set), set_type)
+                    for q_infos in s.qs_dict.values() for q_info in q_infos.values() for cwa_set in q_info
+                ]
+                for cwa_set in cwa_sets:
+                    cwa_set = solver_utils.make_working_cwa_set(solver_utils.cwa_set_indexes(cwa_set), set_type)
+                    assert (
+                        one_answer_left(full_cwas_list, cwa_set) ==
+                        one_answer_left(expected_full_cwas_list, cwa_set)
+                    )
+
+    def test_base_qs_dict(self):
+        """
+        Assert that every query in the base qs_dict splits the CWAs by whether the rule each gives the verifier rejects the proposal, that it has every useful query, and that its Query_Table rows are its cwa_set_trues, for both working cwa_set types.
+        """
+        from src.core import solver_utils, query_table, rules
+        from src.core.definitions import all_125_possibilities_set
+        for p_id in ["f52lujg", "1_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            n_mode = (p.mode == controller.NIGHTMARE)
+            flat_rule_list = rules.make_flat_rule_list(rules.make_rcs_list(p))
+            full_cwas_list = solver_utils.make_full_cwas_list(n_mode, rules.make_rcs_list(p))
+            cwa_rule_ids = solver_utils.make_cwa_rule_ids(full_cwas_list, n_mode)
+            for set_type in [frozenset, int]:
+                (base_qs_dict, true_bits_by_query) = solver_utils._init_base_qs_dict(
+                    full_cwas_list, flat_rule_list, n_mode, set_type
+                )
+                num_queries = 0
+                for (v_index, rule_ids) in enumerate(cwa_rule_ids.T.tolist()):
+                    for proposal in all_125_possibilities_set:
+                        cwa_set_false = solver_utils.make_working_cwa_set([
+                            cwa_index for (cwa_index, rule_id) in enumerate(rule_ids)
+                            if (proposal in flat_rule_list[rule_id].reject_set)
+                        ], set_type)
+                        q_info = base_qs_dict.get(proposal, dict()).get(v_index)
+                        if (0 < solver_utils.cwa_set_len(cwa_set_false) < len(full_cwas_list)):
+                            num_queries += 1
+                            assert (q_info.cwa_set_false == cwa_set_false)
+                            assert (solver_utils.cwa_set_len(q_info.cwa_set_true | q_info.cwa_set_false) == len(full_cwas_list))
+                        else:
+                            assert (q_info is None)
+                assert (num_queries == solver_utils.get_num_queries_in_qs_dict(base_qs_dict))
+                table = query_table.Query_Table(base_qs_dict, len(full_cwas_list))
+                assert (table.true_bits == query_table.Query_Table(
+                    base_qs_dict, len(full_cwas_list), true_bits_by_query
+                ).true_bits).all()
+
+    def test_isomorphic_proposals(self):
+        """
+        Assert that the indexed isomorphic proposals filter gives the same lists as the pairwise one, for the game states one query from the start, with and without a Query_Table.
+        """
+        from src.core import solver_utils
+        for p_id in ["f52lujg", "1_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            s = controller.Solver_Nightmare(p) if (p.mode == controller.NIGHTMARE) else controller.solver.Solver(p)
+            for q_infos in s.qs_dict.values():
+                for q_info in q_infos.values():
+                    for cwa_set in q_info:
+                        for small_partition_set_dict in [
+                            solver_utils.query_table.get_rows_and_pset_dict(s.qs_dict, cwa_set)[1],
+                            solver_utils._get_updated_qs_dict_and_pset_dict(s.qs_dict, cwa_set)[1],
+                        ]:
+                            assert (
+                                solver_utils._get_isomorphic_proposals_lol(small_partition_set_dict) ==
+                                solver_utils._get_isomorphic_proposals_lol_pairwise(small_partition_set_dict)
+                            )
+
+    def test_checkpoint_resume(self):
+        """
+        Assert that a solve that runs out of time keeps its checkpoint file, that the file has game states in it, and that resuming from it finds the optimal cost with less searching than starting over, and deletes the file. Also assert that starting over moves an existing checkpoint aside rather than deleting it.
+        """
+        import time
+        from src.core import solver_checkpoint
+        from src.core.evaluations_cache import Evaluations_Cache
+        p = controller.get_requested_problem(p_id="f52lujg")
+        f_name = controller.checkpoint_f_name_from_id(p.identity)
+        start = time.time()
+        fresh_s = controller.make_solver(p)
+        time_budget = (time.time() - start) / 2 # long enough to search something, however fast this machine is.
+        assert not os.path.exists(f_name)
+        controller.make_solver(p, time_budget=time_budget)
+        assert os.path.exists(f_name)
+        checkpoint_cache = Evaluations_Cache()
+        solver_checkpoint.read_checkpoint(f_name, p, checkpoint_cache)
+        assert (len(checkpoint_cache) > 0)
+        resumed_s = controller.make_solver(p, resume=True)
+        assert (resumed_s.proven_optimal is True)
+        assert (resumed_s.expected_cost == fresh_s.expected_cost)
+        assert (resumed_s.evaluations_cache_stats.num_misses < fresh_s.evaluations_cache_stats.num_misses)
+        assert not os.path.exists(f_name)
+        controller.make_solver(p, time_budget=time_budget)
+        controller.make_solver(p, time_budget=time_budget)
+        assert os.path.exists(f_name)
+        assert (len(os.listdir(os.path.dirname(f_name))) == 2) # and the first one's, moved aside.
+
+    def test_checkpoint_changed_entries(self):
+        """
+        Assert that the entries an Evaluations_Cache gives for a checkpoint since a mark include ones whose evaluation changed, e.g. a Cost_Bounds replaced by the exact cost, with and without array costs, and that only the latest mark can be given.
+        """
+        from src.core.definitions import Cost_Bounds
+        from src.core.evaluations_cache import Evaluations_Cache
+        for array_costs in [False, True]:
+            cache = Evaluations_Cache(array_costs=array_costs)
+            cache[0] = Cost_Bounds(lower=(1.0, 2.0), upper=(3.0, 4.0))
+            cache[1] = (1.0, 2.0)
+            old_mark = cache.mark()
+            mark = cache.mark()
+            cache[2] = (2.0, 3.0)
+            cache[0] = (1.5, 2.5)
+            assert (cache.new_entries(mark) == [(2, (2.0, 3.0)), (0, (1.5, 2.5))])
+            with pytest.raises(ValueError):
+                cache.new_entries(old_mark)
+
+    def test_checkpoint_entries_after_evictions(self, tmp_path):
+        """
+        Assert that after evictions, the entries an Evaluations_Cache gives for a checkpoint are still only the ones set since the mark, not the whole cache: the ones still in memory if evicted entries are dropped, and all of them if they are spilled to disk.
+        """
+        from src.core.evaluations_cache import Evaluations_Cache
+        for spill_directory in [None, str(tmp_path)]:
+            cache = Evaluations_Cache(max_entries=100, spill_directory=spill_directory)
+            old_keys = [(i << 20) | 1 for i in range(100)] # packed cache keys, so that keep_priority() works on them.
+            new_keys = [(i << 20) | 1 for i in range(100, 300)]
+            for cache_key in old_keys:
+                cache[cache_key] = (1.0, 2.0)
+            mark = cache.mark()
+            for cache_key in new_keys:
+                cache[cache_key] = (1.0, 3.0)
+            assert (cache.num_evictions > 0)
+            new_entries = cache.new_entries(mark)
+            assert all((cache_key in new_keys) and (evaluation == (1.0, 3.0)) for (cache_key, evaluation) in new_entries)
+            if spill_directory is None:
+                assert ([cache_key for (cache_key, _) in new_entries] == [k for k in new_keys if (k in cache)])
+                assert (len(cache.dirty_keys) == len(new_entries))
+            else:
+                assert ([cache_key for (cache_key, _) in new_entries] == new_keys)
+            cache.close()
+
+    def test_solve_game_state(self):
+        """
+        Assert that lazily solving one game state at a time finds the same moves and costs as solving the whole problem first.
+        """
+        for p_id in ["f52lujg", "1_N"]:
+            p = controller.get_requested_problem(p_id=p_id)
+            solved_s = controller.make_solver(p)
+            lazy_s = controller.make_solver(p, lazy=True)
+            stack = [lazy_s.initial_game_state]
+            while stack:
+                gs = stack.pop()
+                if one_answer_left(lazy_s.full_cwas_list, gs.cwa_set):
+                    continue
+                lazy_answer = lazy_s.solve_game_state(gs)
+                assert (lazy_s.proven_optimal is True)
+                assert (lazy_answer == solved_s.get_move_mcost_gs_ncost_from_cache(gs))
+                stack.extend(lazy_answer[2])
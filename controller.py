@@ -1,6 +1,7 @@
-import pickle, os, platform, gc, argparse, git
+import pickle, os, platform, gc, argparse, git, timeit
 from rich import print as rprint
 from rich.text import Text
+from rich.table import Table
 # My imports
 from src.core.definitions import *
 from src.core.config import *
@@ -22,12 +23,21 @@ def update_query_history(q_history, move, new_round: bool, result: bool):
         print(f"Move: {move}")
         exit()
 
-def play_from_solver(s: solver.Solver, display_problem = True):
+def print_not_proven_optimal_note(s: solver.Solver):
+    """ Print a note if `s` was solved with a time budget and its moves are not proven optimal. """
+    if(getattr(s, "proven_optimal", True) is False):
+        console.print(
+            "[b #af87ff]NOTE[/b #af87ff]: This solver ran out of time, so its moves are not proven optimal.",
+            highlight=False
+        )
+
+def play_from_solver(s: solver.Solver, display_problem = True, seconds_per_move = None):
     """
-    This function assumes that the solver s has already been solved.
+    This function assumes that the solver s has already been solved (possibly with a time budget), unless `seconds_per_move` is not None. In that case, s is played lazily: each move is searched for when it is needed, for at most about `seconds_per_move` seconds, and only the game tree under the current game state is searched (see Solver.solve_game_state).
     If display_problem is off, will not display the problem
     """
     sd = display.Solver_Displayer(s)
+    print_not_proven_optimal_note(s)
     current_gs = s.initial_game_state
     full_cwa = s.full_cwa_list_from_game_state(current_gs)
     current_score = (0, 0) # current_round_num, total_queries_made
@@ -44,9 +54,17 @@ def play_from_solver(s: solver.Solver, display_problem = True):
     )
     print()
     while not(solver.one_answer_left(s.full_cwas_list, current_gs.cwa_set)):
-        (best_move, mcost, gs_tup, expected_cost) = s.get_move_mcost_gs_ncost_from_cache(
-            current_gs
-        )
+        if(seconds_per_move is None):
+            (best_move, mcost, gs_tup, expected_cost) = s.get_move_mcost_gs_ncost_from_cache(
+                current_gs
+            )
+        else:
+            (best_move, mcost, gs_tup, expected_cost) = s.solve_game_state(current_gs, seconds_per_move)
+            if not s.proven_optimal:
+                console.print(
+                    "[b #af87ff]NOTE[/b #af87ff]: Ran out of time, so this move is not proven optimal.",
+                    highlight=False
+                )
         full_cwa = s.full_cwa_list_from_game_state(current_gs)
         expected_total_score = add_tups(current_score, expected_cost)
         if(current_score > (0, 0)):
@@ -72,9 +90,10 @@ def play_from_solver(s: solver.Solver, display_problem = True):
 
 def display_solution_from_solver(s: solver.Solver, display_problem = True):
     """
-    This function assumes that the solver s has already been solved.
+    This function assumes that the solver s has already been solved (possibly with a time budget).
     """
     sd = display.Solver_Displayer(s)
+    print_not_proven_optimal_note(s)
     if(display_problem):
         sd.print_problem(s.rcs_list, s.problem, active=True)
     full_cwa = s.full_cwa_list_from_game_state(s.initial_game_state)
@@ -110,8 +129,19 @@ def f_name_from_id(identity):
     f_name = f"{PICKLE_DIRECTORY}/{identity}.bin"
     return(f_name)
 
-def make_solver(problem: Problem, capitulate=False):
-    """ Makes a solver and solve()s the problem. """
+def checkpoint_f_name_from_id(identity):
+    """
+    The checkpoint file that solving the problem with ID `identity` writes its progress to (see CHECKPOINT_SECONDS).
+    Stored in f"{CHECKPOINT_DIRECTORY}/{identity}.checkpoint"
+    """
+    if(identity[0] == '#'):
+        identity = identity[1:]
+    return f"{CHECKPOINT_DIRECTORY}/{identity}.checkpoint"
+
+def make_solver(problem: Problem, capitulate=False, time_budget=None, lazy=False, resume=False):
+    """
+    Makes a solver and solve()s the problem, unless `lazy`. If `time_budget` is not None, solve()s for about that many seconds. Unless capitulating, the solve writes checkpoints (see CHECKPOINT_SECONDS), and if `resume`, it continues from the checkpoint an earlier unfinished solve of this problem left.
+    """
     if capitulate:
         s = Solver_Capitulate(problem)
     else:
@@ -142,15 +172,21 @@ def make_solver(problem: Problem, capitulate=False):
         "[b #af87ff]NOTE[/b #af87ff]: If you think this problem will take a long time to solve, be sure to enable the 'Prevent your Mac from automatically sleeping when the display is off' system setting (or equivalent for your computer).",
         highlight=False
     )
+    if(lazy):
+        return s
     print("\nSolving . . .")
-    s.solve()
+    checkpoint_f_name = (
+        None if (capitulate or (CHECKPOINT_SECONDS is None)) else checkpoint_f_name_from_id(problem.identity)
+    )
+    s.solve(time_budget=time_budget, checkpoint_f_name=checkpoint_f_name, resume=resume)
     return s
 
-def pickle_solver(problem: Problem, pickle_entire=False, force_overwrite=False):
+def pickle_solver(problem: Problem, pickle_entire=False, force_overwrite=False, resume=False):
     """
     Given a Problem named tuple, if the solver for it hasn't already been pickled, makes it and pickles it; otherwise it does nothing. 
     If pickle_entire is True, pickles the entire solver. If it's false, sets the solver's evaluation cache to only the parts accessed during a best game (all that is needed to display tree and play game), so that unpickling it is much faster.
     If force_overwrite is true, then it remakes the solver regardless of whether the corresponding file exists, and overwrites the file if it does exist.
+    If resume is true, the solve continues from the checkpoint an earlier unfinished solve left (see make_solver).
     """
     # NOTE: as of now, setting pickle_entire to True doesn't do anything. To restore this functionality, will need to change the solver and nightmare_solver classes to offer a way to preserve the old evaluations cache that contains *all* evaluated game states so that it can be pickled. However, this is not high priority.
     f_name = f_name_from_id(problem.identity)
@@ -159,7 +195,7 @@ def pickle_solver(problem: Problem, pickle_entire=False, force_overwrite=False):
     if(os.path.exists(f_name) and not force_overwrite):
         print(f"Asked to pickle {f_name}, but it already exists. Returning None.")
         return
-    s = make_solver(problem)
+    s = make_solver(problem, resume=resume)
     f = open(f_name, 'wb') # open mode write binary. Needed for pickling to work.
     console.print(Text.assemble("\nPickling ", display.get_filename_text(f_name), ". . ."))
     git_hash = git.Repo(search_parent_directories=True).head.object.hexsha
@@ -177,13 +213,17 @@ def get_or_make_solver(
         pickle_entire=False,
         force_overwrite=True,
         no_pickles=False,
-        capitulate=False
+        capitulate=False,
+        time_budget=None,
+        resume=False,
     ) -> tuple[solver.Solver, bool] :
     """
     Given a `problem`, if the corresponding solver has been pickled, gets it, otherwise, makes it, pickles it.
     If pickle_entire is True, pickles the entire solver; otherwise, only pickles the parts of the evaluations cache needed to play the game perfectly.
     If force_overwrite is true, makes solver and writes it to file regardless of whether or not it existed before.
     If no_pickles is True, does not interact with pickles in any way. Makes solver from scratch, and does not pickle it nor change any existing pickles. Precludes force_overwrite and pickle_entire.
+    If time_budget is not None, the solver is made with that many seconds to solve (see Solver.solve()). Only used with no_pickles, so that a solver that isn't proven optimal never gets pickled.
+    If resume is True, a solver that gets made continues from the checkpoint an earlier unfinished solve left (see make_solver).
     Returns:
         (solver, made_from_scratch)
         made_from_scratch: a bool indicating whether or not the solver was made from scratch
@@ -194,7 +234,7 @@ def get_or_make_solver(
         gc.collect()
     if(no_pickles):
         display.cprint_if_active(DISPLAY, "No pickles. Making solver from scratch.")
-        s = make_solver(problem, capitulate=capitulate)
+        s = make_solver(problem, capitulate=capitulate, time_budget=time_budget, resume=resume)
         made_from_scratch = True
     else:
         f_name = f_name_from_id(problem.identity)
@@ -211,14 +251,16 @@ def get_or_make_solver(
                     DISPLAY,
                     "Problem has been solved, but will overwrite the solver file."
                 )
-                s = pickle_solver(problem, pickle_entire=pickle_entire, force_overwrite=force_overwrite)
+                s = pickle_solver(
+                    problem, pickle_entire=pickle_entire, force_overwrite=force_overwrite, resume=resume
+                )
                 made_from_scratch = True
         else:
             display.cprint_if_active(
                 DISPLAY,
                 f"Problem has not been solved. Solving. If this problem has 20+ answers, this may take some time . . ."
             )
-            s = pickle_solver(problem, pickle_entire=pickle_entire)
+            s = pickle_solver(problem, pickle_entire=pickle_entire, resume=resume)
             made_from_scratch = True
     if(DISABLE_GC):
         gc.enable()
@@ -229,24 +271,101 @@ def display_problem_solution(
     pickle_entire=False,
     force_overwrite=False,
     no_pickles=False,
-    capitulate=False
+    capitulate=False,
+    time_budget=None,
+    resume=False,
 ):
     """
     Given a `problem`, gets or makes a solver for it (see get_or_make_solver), then prints the best move tree with the options that are currently set (SHOW_COMBOS_IN_TREE).
     """
     (s, made_from_scatch) = get_or_make_solver(
-        problem, pickle_entire, force_overwrite, no_pickles, capitulate
+        problem, pickle_entire, force_overwrite, no_pickles, capitulate, time_budget, resume
     )
     display_solution_from_solver(s, display_problem=not(made_from_scatch))
-def play(problem: Problem, pickle_entire=False, force_overwrite=False, no_pickles=False, capitulate=False):
+def play(
+    problem: Problem,
+    pickle_entire=False,
+    force_overwrite=False,
+    no_pickles=False,
+    capitulate=False,
+    time_budget=None,
+    lazy=False,
+    resume=False,
+):
     """
     Given a `problem`, gets or makes a solver for it (see get_or_make_solver), then plays that problem, prompting the user for answers to its queries. Affected by PRINT_COMBOS option.
+    If `lazy`, does not solve the problem first. Instead, searches for each move when it's needed, for at most `time_budget` seconds (default LAZY_SECONDS_PER_MOVE) per move. Does not pickle anything.
     """
+    if(lazy and not(capitulate)):
+        s = make_solver(problem, lazy=True)
+        seconds_per_move = LAZY_SECONDS_PER_MOVE if (time_budget is None) else time_budget
+        play_from_solver(s, display_problem=False, seconds_per_move=seconds_per_move)
+        return
     (s, made_from_scatch) = get_or_make_solver(
-        problem, pickle_entire, force_overwrite, no_pickles, capitulate
+        problem, pickle_entire, force_overwrite, no_pickles, capitulate, time_budget, resume
     )
     play_from_solver(s, display_problem=not(made_from_scatch))
 
+def compare_move_orderings(problem: Problem, move_orderings=(None, "balance", "answers_left")):
+    """
+    Solve `problem` (without pickling) once with each move ordering in `move_orderings` (see MOVE_ORDERING in config.py), then print a table comparing how many subtrees each pruned, how long each took, and the expected cost each found.
+    """
+    solvers = []
+    for move_ordering in move_orderings:
+        s = Solver_Nightmare(problem) if(problem.mode == NIGHTMARE) else solver.Solver(problem)
+        s.move_ordering = move_ordering
+        console.print(f"\nSolving with move ordering {move_ordering} . . .")
+        s.solve()
+        solvers.append(s)
+    table = Table(title=f"Move Orderings for {problem.identity}")
+    for (header, justify) in [
+        ("Move Ordering", "left"), ("Pruned Subtrees", "right"), ("Seconds", "right"), ("Expected Cost", "right")
+    ]:
+        table.add_column(header, justify=justify)
+    for s in solvers:
+        table.add_row(
+            str(s.move_ordering),
+            f"{s.num_pruned_subtrees:,}",
+            f"{s.seconds_to_solve:,}",
+            f"({s.expected_cost[0]:0.4f}, {s.expected_cost[1]:0.4f})",
+        )
+    console.print(table)
+    return solvers
+
+def benchmark_isomorphic_proposals(problem: Problem, repeat=5):
+    """
+    Time solver_utils._get_isomorphic_proposals_lol against the pairwise version it replaced, on the small partition set dicts of every game state one query from the start of `problem`, after checking that both give the same lists. Prints a table of the best of `repeat` times per game state.
+    """
+    solver_utils = solver.solver_utils
+    s = Solver_Nightmare(problem) if(problem.mode == NIGHTMARE) else solver.Solver(problem)
+    small_partition_set_dicts = []
+    for q_infos in s.qs_dict.values():
+        for q_info in q_infos.values():
+            for cwa_set in q_info:
+                if(type(s.qs_dict) is solver_utils.query_table.Query_Dict):
+                    small_partition_set_dicts.append(solver_utils.query_table.get_rows_and_pset_dict(s.qs_dict, cwa_set)[1])
+                else:
+                    small_partition_set_dicts.append(solver_utils._get_updated_qs_dict_and_pset_dict(s.qs_dict, cwa_set)[1])
+    table = Table(title=f"Isomorphic Proposals for {problem.identity} ({len(small_partition_set_dicts):,} game states)")
+    for (header, justify) in [("Version", "left"), ("Microseconds per Game State", "right")]:
+        table.add_column(header, justify=justify)
+    for (version, get_isomorphic_proposals_lol) in [
+        ("pairwise", solver_utils._get_isomorphic_proposals_lol_pairwise),
+        ("indexed", solver_utils._get_isomorphic_proposals_lol),
+    ]:
+        for small_partition_set_dict in small_partition_set_dicts:
+            assert (
+                get_isomorphic_proposals_lol(small_partition_set_dict) ==
+                solver_utils._get_isomorphic_proposals_lol_pairwise(small_partition_set_dict)
+            )
+        seconds = min(timeit.repeat(
+            lambda: [get_isomorphic_proposals_lol(small_partition_set_dict) for small_partition_set_dict in small_partition_set_dicts],
+            number=1,
+            repeat=repeat,
+        ))
+        table.add_row(version, f"{(seconds * 1e6) / len(small_partition_set_dicts):,.1f}")
+    console.print(table)
+
 def get_web_problem(p_id, raw_mode, level, num_verifiers):
     """
     A convenience function for getting a web problem. If p_id is not None, gets a problem from the web with that ID. If it is None, gets an arbitrary problem with given mode, level of difficulty, and num_verifiers. Those are randomly chosen if they are None. Returns the problem, or None if there was a problem getting the problem.
@@ -351,6 +470,31 @@ def make_parser():
         type=int,
         help="Only has an effect when used with -w to get a problem from the web. Specify the number of verifiers (4, 5, or 6) of the problem obtained from turingmachine.info. If unspecified, will be chosen randomly."
     )
+    parser.add_argument(
+        "--compare_move_orderings", "-cmo",
+        action="store_true",
+        help="Solve the problem once with each move ordering (see MOVE_ORDERING in config.py) and print how many subtrees each one pruned and how long each one took. Does not pickle anything."
+    )
+    parser.add_argument(
+        "--benchmark_isomorphic_proposals", "-bip",
+        action="store_true",
+        help="Time the indexed isomorphic proposals filter against the pairwise one it replaced, on the game states one query from the start, and print a table of the times. Does not solve or pickle anything."
+    )
+    parser.add_argument(
+        "--time_budget", "-tb",
+        type=float,
+        help="Solve for at most about this many seconds, then use the best moves found so far. Starts from the moves --capitulate would make and improves on them until time runs out. Prints whether the result is proven optimal. Choosing this turns on --no_pickles."
+    )
+    parser.add_argument(
+        "--lazy", "-lz",
+        action="store_true",
+        help="Only has an effect when used with -p. Start playing right away, instead of solving the whole problem first. Each move is searched for when it's needed, for at most LAZY_SECONDS_PER_MOVE (see config.py) seconds, or --time_budget seconds if given. Only the game tree under the current game state is searched, and what was learned about it is kept for later moves. Does not pickle anything."
+    )
+    parser.add_argument(
+        "--resume", "-r",
+        action="store_true",
+        help="Continue solving from the checkpoint file that an earlier, unfinished solve of this problem left, instead of starting over. Long solves write a checkpoint every CHECKPOINT_SECONDS (see config.py), and solves that run out of --time_budget keep theirs, so they can be resumed. Without --resume, an existing checkpoint is renamed to end in .old rather than deleted."
+    )
     return parser
 def do_two_funcs(do_func_1: bool, func_1: callable, do_func_2: bool, func_2: callable, *args, **kwargs):
     """
@@ -423,20 +567,35 @@ if(__name__ == "__main__"):
             args.verifiers,
             args.new_problem
         )
-        args.no_pickles = True if (args.capitulate) else args.no_pickles # capitulate turns on no pickles
+        if(args.compare_move_orderings):
+            compare_move_orderings(problem)
+            exit()
+        if(args.benchmark_isomorphic_proposals):
+            benchmark_isomorphic_proposals(problem)
+            exit()
+        # capitulate and time_budget turn on no pickles
+        args.no_pickles = True if (args.capitulate or (args.time_budget is not None)) else args.no_pickles
         do_two_funcs(
             args.display,
             display_problem_solution,
-            args.play,
+            args.play and not(args.lazy),
             play,
             problem,
             no_pickles=args.no_pickles,
             force_overwrite=args.force_overwrite,
-            capitulate=args.capitulate
+            capitulate=args.capitulate,
+            time_budget=args.time_budget,
+            resume=args.resume,
         )
+        if(args.play and args.lazy):
+            play(problem, capitulate=args.capitulate, time_budget=args.time_budget, lazy=True)
         if(not(args.play or args.display) and not(args.capitulate)):
             s = get_or_make_solver(
-                problem, no_pickles=not(args.force_overwrite), force_overwrite=args.force_overwrite
+                problem,
+                no_pickles=not(args.force_overwrite) or (args.time_budget is not None),
+                force_overwrite=args.force_overwrite,
+                time_budget=args.time_budget,
+                resume=args.resume,
             )[0]
     except KeyboardInterrupt:
         console.print("\nBaii")
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from .query_table import Memo_Stats
+
+class Canonical_Form_Cache:
+    """
+    A least recently used cache of nightmare mode's working cwa_set conversions, that holds at most `max_entries` of them, for a whole search. It is used as the working_cwa_set_convert_cache of solver_utils' nightmare convert functions, which only call get() and set items, so it maps a working cwa_set to what they store for it: (canonical form, permutation). A working cwa_set's conversion doesn't depend on the round it's in, so a cwa_set reached again in a later round or in a sibling subtree isn't canonicalized again, unlike with a new dict for each round. Counts the hits and misses of get(), and the evictions.
+    """
+    __slots__ = (
+        "max_entries",
+        "entries",
+        "num_hits",
+        "num_misses",
+        "num_evictions",
+    )
+    def __init__(self, max_entries):
+        self.max_entries   = max_entries
+        self.entries       = OrderedDict() # working cwa_set : conversion, least recently used first.
+        self.num_hits      = 0
+        self.num_misses    = 0
+        self.num_evictions = 0
+
+    def get(self, working_cwa_set, default=None):
+        conversion = self.entries.get(working_cwa_set)
+        if conversion is None:
+            self.num_misses += 1
+            return default
+        self.num_hits += 1
+        self.entries.move_to_end(working_cwa_set)
+        return conversion
+
+    def __setitem__(self, working_cwa_set, conversion):
+        self.entries[working_cwa_set] = conversion
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.num_evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        """ Drop every entry, but keep the counts. """
+        self.entries.clear()
+
+    def stats(self):
+        return Memo_Stats(self.num_hits, self.num_misses, self.num_evictions)
@@ -73,6 +73,7 @@ P_ORDER               = True  # Display tables in permutation order in nightmare
 LINES_BETWEEN_ANSWERS = False # print a line b/t every unique answer in answer tables
 DISPLAY               = True  # display the problem when asked to solve
 PRINT_COMBOS          = True  # print remaining combos after every query in play()
+LAZY_SECONDS_PER_MOVE = 5     # most seconds to search for each move when playing lazily (play --lazy)
 
 # Solver workings
 A_TOL                        = 1e-8
@@ -97,6 +98,34 @@ NIGHTMARE_BITSET_TYPE        = (     # cache game state set type in standard mod
     int
     # np.ndarray
 )
+WORKING_CWA_SET_TYPE         = (     # working game state cwa_set type. Choose 1. See solver_utils.make_working_cwa_set.
+    frozenset                        # frozenset of CWA indexes.
+    # int                            # bit i is set iff CWA i is in the set.
+)
+PACKED_CACHE_KEYS            = False # key the evaluations_cache by one int per game state. Needs int bitset types.
+S_MODE_LOWER_BOUND_PRUNING   = False # skip moves whose lower bound cost can't beat the best move so far (standard).
+N_MODE_LOWER_BOUND_PRUNING   = True  # same, in nightmare mode, where game states are pricier to evaluate.
+LOWER_BOUND_SLACK            = 1e-9  # how much a lower bound must beat the best cost by to prune. See solver_utils.
+USE_CUTOFF_BOUNDS            = True  # let searches that can't beat the best move stop early and cache Cost_Bounds.
+MOVE_ORDERING                = (     # order to search each game state's moves in. Choose 1.
+    None                             # qs_dict order.
+    # "balance"                      # most even true/false split first.
+    # "answers_left"                 # fewest expected distinct answers left first.
+)
+SEARCH_ENGINE                = (     # how solve() searches the game tree. Choose 1. Both give the same results.
+    "recursive"                      # _calculate_best_move.
+    # "iterative"                    # solver_iterative: an explicit stack, so no recursion limit. Reports stack depth.
+)
+NUM_PROCESSES                = 0     # worker processes for solve(). 0 or 1 to solve in this process only.
+PARALLEL_SPLIT_DEPTH         = 0     # 0: one worker task per root move. 1: one per game state a move below root.
+CHECKPOINT_SECONDS           = 600   # how often solve() appends its progress to a checkpoint file. None: never.
+EVAL_CACHE_MAX_ENTRIES       = None  # most entries the evaluations_cache holds before evicting some. None: no limit.
+EVAL_CACHE_EVICT_FRACTION    = 0.25  # fraction of the evaluations_cache's entries to evict at once.
+EVAL_CACHE_SPILL_DIRECTORY   = None  # directory for a disk file to keep evicted entries in. None: drop them.
+EVAL_CACHE_ARRAY_COSTS       = False # keep the evaluations_cache's exact costs in NumPy arrays instead of tuples.
+EVAL_CACHE_INTERN_CWA_SETS   = True  # store each distinct cwa_set in the evaluations_cache's keys once. See Cwa_Set_Pool.
+QS_DICT_MEMO_MAX_ENTRIES     = 64    # most filtered qs_dicts to memoize, least recently used evicted first. 0: no memo.
+CANONICAL_CACHE_MAX_ENTRIES  = 16384 # most canonical forms of cwa_sets to keep across rounds in nightmare mode. 0: per round.
 
 # Change How Debugging Information Is Displayed
 PARTITION_DIVIDER          = '│' # options: '│' and '|'. For printing partition dictionary.
@@ -113,3 +142,4 @@ DISPLAY_CWA_BITSETS         = False  # Display all the cwa bitsets at the beginn
 PICKLE_DIRECTORY      = "src/problems/Pickles/no_store_moves_upgrade" # Where all pickled solvers go.
 USER_PROBS_FILE_NAME  = "src/problems/user_problems.txt"
 TIME_PICKLE_FILE_NAME = "src/problems/Pickles/time_pickle_file.bin"
+CHECKPOINT_DIRECTORY  = "src/problems/Checkpoints" # Where checkpoints of unfinished solves go. See --resume.
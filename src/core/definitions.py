@@ -23,7 +23,8 @@ all_125_possibilities_set = set(possibilities)
 def int_to_tri_sq_ci_tuple(n):
     return(tuple([get_digit(n, i, 10) for i in range(2, -1, -1)]))
 
-Rule = namedtuple('Rule', ['name', 'reject_set', 'func', 'card_index', 'unique_id'])
+# reject_mask is the reject_set as an int, with bit i set iff possibilities[i] is in it.
+Rule = namedtuple('Rule', ['name', 'reject_set', 'func', 'card_index', 'unique_id', 'reject_mask'])
 
 Query_Info = namedtuple(
     'Query_Info',
@@ -38,7 +39,17 @@ Game_State = namedtuple(
     [
         'num_queries_this_round',
         'proposal_used_this_round',
-        'cwa_set', # a set of ints corresponding to the indexes of the cwas in the the full_cwas_list
+        'cwa_set', # the indexes of the cwas in the the full_cwas_list: a frozenset, or an int with those bits set.
+    ]
+)
+
+# An evaluations_cache entry for a game state whose search was cut off before its exact cost was known. Exact
+# entries are plain (rounds, queries) tuples.
+Cost_Bounds = namedtuple(
+    'Cost_Bounds',
+    [
+        'lower', # the game state's cost is at least this. (rounds, -inf): only the rounds are bounded.
+        'upper', # the game state's cost is at most this (the cost of the best move found), or (inf, inf).
     ]
 )
 
@@ -0,0 +1,138 @@
+import mmap, os, pickle, struct, tempfile
+
+# A Disk_Cache is an open-addressing hash table, with linear probing, in an mmap'd file. Each slot is two unsigned
+# 64-bit ints: the hash of a key (_EMPTY if the slot has never been used) and the offset of the key's record in a
+# second, append-only, data file (_DELETED if the key has been deleted since). A record is a 4-byte length followed by
+# the pickled (key, value). Both files are unnamed temporary files, so they disappear when the process ends.
+_EMPTY   = 0
+_DELETED = (1 << 64) - 1
+_HASH_MASK = (1 << 64) - 1
+_RECORD_HEADER = struct.Struct('<I')
+_SLOT_SIZE = 16
+
+def _key_hash(key):
+    key_hash = hash(key) & _HASH_MASK
+    return key_hash if (key_hash != _EMPTY) else 1
+
+class Disk_Cache:
+    """
+    A dict-like map of key : value kept on disk, in files in `directory`, rather than in memory. The table of slots is mmap'd, and a record is only read when a lookup finds a slot with the key's hash. Used by Evaluations_Cache to keep the entries it evicts. Keys are hashed with hash(), so a Disk_Cache is only good for the process that made it.
+    """
+    __slots__ = (
+        "directory",
+        "data_file",
+        "data_size",
+        "table_file",
+        "table_mmap",
+        "table",
+        "num_slots",
+        "num_used_slots",
+        "num_entries",
+    )
+    def __init__(self, directory, num_slots=1 << 16):
+        if(not os.path.exists(directory)):
+            os.makedirs(directory)
+        self.directory      = directory
+        self.data_file      = tempfile.TemporaryFile(dir=directory)
+        self.data_size      = 0
+        self.num_entries    = 0
+        self.table_file     = None
+        self._make_table(num_slots)
+
+    def __len__(self):
+        return self.num_entries
+
+    def _make_table(self, num_slots):
+        """ Replace the table with an empty one with `num_slots` slots (a power of 2). """
+        if self.table_file is not None:
+            self._close_table()
+        self.table_file = tempfile.TemporaryFile(dir=self.directory)
+        self.table_file.truncate(num_slots * _SLOT_SIZE) # sparse, and reads as all zeros, i.e. all _EMPTY.
+        self.table_mmap = mmap.mmap(self.table_file.fileno(), num_slots * _SLOT_SIZE)
+        self.table = memoryview(self.table_mmap).cast('Q')
+        self.num_slots = num_slots
+        self.num_used_slots = 0
+
+    def _close_table(self):
+        self.table.release()
+        self.table_mmap.close()
+        self.table_file.close()
+
+    def close(self):
+        """ Close (and so delete) the files. The Disk_Cache can't be used after this. """
+        self._close_table()
+        self.data_file.close()
+
+    def _grow_table(self):
+        """ Double the number of slots, and leave out the deleted ones. """
+        old_table = [
+            (self.table[2 * slot], self.table[(2 * slot) + 1]) for slot in range(self.num_slots)
+            if self.table[2 * slot] != _EMPTY and self.table[(2 * slot) + 1] != _DELETED
+        ]
+        self._make_table(self.num_slots * 2)
+        mask = self.num_slots - 1
+        for (key_hash, offset) in old_table:
+            slot = key_hash & mask
+            while self.table[2 * slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            self.table[2 * slot] = key_hash
+            self.table[(2 * slot) + 1] = offset
+        self.num_used_slots = len(old_table)
+
+    def _read_record(self, offset):
+        fd = self.data_file.fileno()
+        (record_size,) = _RECORD_HEADER.unpack(os.pread(fd, _RECORD_HEADER.size, offset))
+        return pickle.loads(os.pread(fd, record_size, offset + _RECORD_HEADER.size))
+
+    def _find_slot(self, key, key_hash):
+        """
+        Returns
+        -------
+        (slot, record_value)
+            If `key` is present, its slot and its value. Otherwise, the slot to put it in, and None.
+        """
+        table = self.table
+        mask = self.num_slots - 1
+        slot = key_hash & mask
+        free_slot = None
+        while True:
+            slot_hash = table[2 * slot]
+            if slot_hash == _EMPTY:
+                return ((slot if (free_slot is None) else free_slot), None)
+            offset = table[(2 * slot) + 1]
+            if offset == _DELETED:
+                if free_slot is None:
+                    free_slot = slot
+            elif slot_hash == key_hash:
+                (record_key, record_value) = self._read_record(offset)
+                if record_key == key:
+                    return (slot, (record_value,))
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        (slot, record_value) = self._find_slot(key, _key_hash(key))
+        return default if (record_value is None) else record_value[0]
+
+    def __setitem__(self, key, value):
+        """ Append a record for `key` to the data file, and point its slot at it. The old record, if any, is left as garbage. """
+        key_hash = _key_hash(key)
+        (slot, record_value) = self._find_slot(key, key_hash)
+        record = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        os.pwrite(self.data_file.fileno(), _RECORD_HEADER.pack(len(record)) + record, self.data_size)
+        if record_value is None:
+            self.num_entries += 1
+            if self.table[2 * slot] == _EMPTY:
+                self.num_used_slots += 1
+        self.table[2 * slot] = key_hash
+        self.table[(2 * slot) + 1] = self.data_size
+        self.data_size += _RECORD_HEADER.size + len(record)
+        if (2 * self.num_used_slots) > self.num_slots:
+            self._grow_table()
+
+    def pop(self, key, default=None):
+        (slot, record_value) = self._find_slot(key, _key_hash(key))
+        if record_value is None:
+            return default
+        self.table[(2 * slot) + 1] = _DELETED
+        self.num_entries -= 1
+        return record_value[0]
@@ -1399,8 +1399,8 @@ class Solver_Displayer:
         """
         Parameters
         ----------
-        cache_gs: Game_State
-            A game state that is using a bitset to represent which CWAs are possible.
+        cache_gs: Game_State | int
+            A game state that is using a bitset to represent which CWAs are possible, or a packed one (see solver_utils.pack_cache_gs).
 
         title: str | Text
             The title of the table.
@@ -1413,6 +1413,7 @@ class Solver_Displayer:
 
         WARN: only use this on cache game states that are actually different from working game states. i.e. don't use this in standard mode if you're using set as bitset_type.
         """
+        cache_gs = solver.solver_utils.unpack_cache_key(cache_gs)
         q_str = _highlight(f' Queries this round: {cache_gs.num_queries_this_round}.')
         prop_str = _highlight(f' Current Proposal: {cache_gs.proposal_used_this_round}.')
         if(type(title) is str):
@@ -0,0 +1,390 @@
+import heapq, sys
+from collections import namedtuple
+import numpy as np
+from . import solver_utils
+from .definitions import Cost_Bounds
+from .hashable_numpy_array import Hashable_Numpy_Array
+
+Cache_Stats = namedtuple(
+    'Cache_Stats',
+    ['num_hits', 'num_misses', 'num_evictions', 'num_disk_hits', 'num_shared_cwa_sets', 'num_bytes_saved']
+)
+
+_MISSING = object()
+
+def _cache_cwa_set_size(cache_cwa_set):
+    """ The number of elements in a cache cwa_set, whichever bitset type it is. """
+    if isinstance(cache_cwa_set, (set, frozenset)):
+        return len(cache_cwa_set)
+    return solver_utils.bitset_to_int(cache_cwa_set).bit_count()
+
+def keep_priority(cache_key):
+    """
+    How much the evaluations cache entry of `cache_key` (a cache game state or a packed one) is worth keeping. Entries with the lowest priority are evicted first. Begin round states are kept over states in the middle of a round, since every state in a round leads to one, and after that, states with larger cwa_sets are kept, since they have larger subtrees and so are more expensive to recompute.
+    """
+    cache_game_state = solver_utils.unpack_cache_key(cache_key)
+    return (
+        (cache_game_state.proposal_used_this_round is None),
+        _cache_cwa_set_size(cache_game_state.cwa_set),
+    )
+
+class Cost_Array:
+    """
+    Growable NumPy float64 storage for costs, `width` floats each: 2 for a (rounds, queries) cost, 4 for a Cost_Bounds. Each cost lives in a slot (an int), so that a dict can hold the slot rather than tuples of floats.
+    """
+    __slots__ = (
+        "width",
+        "values",
+        "values_view",
+        "free_slots",
+        "num_slots_used",
+    )
+    def __init__(self, width, num_slots=1 << 12):
+        self.width          = width
+        self.values         = np.zeros(width * num_slots, dtype=np.float64) # slot s is values[width * s:width * (s + 1)]
+        self.values_view    = memoryview(self.values) # much faster than the ndarray for single floats.
+        self.free_slots     = []
+        self.num_slots_used = 0
+
+    def add(self, values):
+        """ Put `values` in a free slot, and return the slot. """
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = self.num_slots_used
+            self.num_slots_used += 1
+            if (self.width * slot) == len(self.values):
+                self.values_view.release()
+                self.values = np.concatenate((self.values, np.zeros(len(self.values), dtype=np.float64)))
+                self.values_view = memoryview(self.values)
+        self.set(slot, values)
+        return slot
+
+    def set(self, slot, values):
+        start = self.width * slot
+        for (offset, value) in enumerate(values):
+            self.values_view[start + offset] = value
+
+    def get(self, slot):
+        start = self.width * slot
+        return tuple(self.values_view[start:start + self.width].tolist())
+
+    def free(self, slot):
+        self.free_slots.append(slot)
+
+def _cwa_set_num_bytes(cwa_set):
+    """ The bytes a cwa_set takes up, not counting anything shared with other cwa_sets. """
+    if type(cwa_set) is Hashable_Numpy_Array:
+        return sys.getsizeof(cwa_set) + cwa_set.nparray.nbytes
+    return sys.getsizeof(cwa_set)
+
+class Cwa_Set_Pool:
+    """
+    Hash-consing for the cwa_sets of cache game states: intern_game_state() gives back a game state whose cwa_set is the one pooled cwa_set equal to it, so every distinct cwa_set is stored once however many game states (e.g. the same cwa_set with different proposal_used_this_round) hold it. Counts the cwa_sets it shared and the bytes the copies it dropped took up.
+    NOTE: ints can't be weakly referenced, so rather than weak references, the pool holds its cwa_sets until new_generation() replaces them with the cwa_sets still in use.
+    """
+    __slots__ = (
+        "pool",
+        "num_shared",
+        "num_bytes_saved",
+    )
+    def __init__(self):
+        self.pool            = dict() # cwa_set : the one copy of it that game states share.
+        self.num_shared      = 0
+        self.num_bytes_saved = 0
+
+    def __len__(self):
+        return len(self.pool)
+
+    def intern_game_state(self, cache_game_state):
+        cwa_set = cache_game_state.cwa_set
+        pooled_cwa_set = self.pool.setdefault(cwa_set, cwa_set)
+        if pooled_cwa_set is cwa_set:
+            return cache_game_state
+        self.num_shared += 1
+        self.num_bytes_saved += _cwa_set_num_bytes(cwa_set)
+        return cache_game_state._replace(cwa_set=pooled_cwa_set)
+
+    def new_generation(self, cache_game_states):
+        """ Drop the pooled cwa_sets that none of `cache_game_states` (the ones still in use) hold. """
+        self.pool = {
+            cache_game_state.cwa_set : cache_game_state.cwa_set
+            for cache_game_state in cache_game_states if (type(cache_game_state) is not int)
+        }
+
+class Evaluations_Cache(dict):
+    """
+    A dict of cache game state : evaluation that holds at most `max_entries` entries in memory (no limit if None). When an insert goes over the limit, the `evict_fraction` of entries with the lowest keep_priority() are evicted, so evictions happen in batches rather than on every insert. If `spill_directory` is not None, evicted entries go to a Disk_Cache in that directory, and get(), pop(), `in` and del fall through to it; otherwise they are dropped. If `array_costs`, exact costs and Cost_Bounds are kept in Cost_Arrays and the dict only holds their slots (exact cost slots as is, Cost_Bounds slots as ~slot, so they are negative); every way of reading the cache gives back tuples of floats and Cost_Bounds as usual. If `intern_cwa_sets`, new keys have their cwa_sets interned in a Cwa_Set_Pool (packed keys have nothing to share), whose next generation starts after each batch of evictions. Counts the hits and misses of get(), and the evictions.
+    NOTE: Searches only ever read the cache with get() and write it with []. A dropped game state is just searched again; the filter step recomputes any dropped game state on the best game tree. len() and iterating only see the entries in memory.
+    """
+    __slots__ = (
+        "max_entries",
+        "evict_fraction",
+        "num_hits",
+        "num_misses",
+        "num_evictions",
+        "spill_directory",
+        "disk_cache",
+        "num_disk_hits",
+        "cost_array",
+        "bounds_array",
+        "cwa_set_pool",
+        "dirty_keys",
+        "num_marks",
+    )
+    def __init__(
+            self, max_entries=None, evict_fraction=0.25, spill_directory=None, array_costs=False, intern_cwa_sets=False
+        ):
+        dict.__init__(self)
+        self.max_entries     = max_entries
+        self.evict_fraction  = evict_fraction
+        self.num_hits        = 0
+        self.num_misses      = 0
+        self.num_evictions   = 0
+        self.spill_directory = spill_directory
+        self.disk_cache      = None # made on the first eviction, if spilling.
+        self.num_disk_hits   = 0
+        self.cost_array      = Cost_Array(width=2) if array_costs else None
+        self.bounds_array    = Cost_Array(width=4) if array_costs else None
+        self.cwa_set_pool    = Cwa_Set_Pool() if intern_cwa_sets else None
+        self.dirty_keys      = None # the keys set since the last mark() (in order, as a dict of key : None), once marked.
+        self.num_marks       = 0
+
+    def __reduce__(self):
+        # dict subclasses get their items set before their state when unpickled, and __setitem__ needs the slots.
+        # NOTE: the disk_cache's entries are not pickled. Its files only make sense to this process.
+        return (
+            Evaluations_Cache,
+            (
+                self.max_entries,
+                self.evict_fraction,
+                self.spill_directory,
+                (self.cost_array is not None),
+                (self.cwa_set_pool is not None),
+            ),
+            (self.num_hits, self.num_misses, self.num_evictions, self.num_disk_hits),
+            None,
+            iter(self.items()),
+        )
+
+    def __setstate__(self, state):
+        (self.num_hits, self.num_misses, self.num_evictions, self.num_disk_hits) = state
+
+    def _decode(self, stored):
+        """ The evaluation that a value stored in the dict stands for. Only Cost_Array slots are ints. """
+        if type(stored) is not int:
+            return stored
+        if stored >= 0:
+            return self.cost_array.get(stored)
+        bounds = self.bounds_array.get(~stored)
+        return Cost_Bounds(lower=bounds[:2], upper=bounds[2:])
+
+    def _encode(self, evaluation, previous):
+        """ What to store in the dict for `evaluation`, reusing the slot of the `previous` stored value if it can. """
+        if type(evaluation) is tuple: # exact costs. Cost_Bounds is a namedtuple, so it isn't this type.
+            if (type(previous) is int) and (previous >= 0):
+                self.cost_array.set(previous, evaluation)
+                return previous
+            self._free(previous)
+            return self.cost_array.add(evaluation)
+        if type(evaluation) is Cost_Bounds:
+            values = (evaluation.lower[0], evaluation.lower[1], evaluation.upper[0], evaluation.upper[1])
+            if (type(previous) is int) and (previous < 0):
+                self.bounds_array.set(~previous, values)
+                return previous
+            self._free(previous)
+            return ~self.bounds_array.add(values)
+        self._free(previous)
+        return evaluation
+
+    def _free(self, stored):
+        if type(stored) is int:
+            if stored >= 0:
+                self.cost_array.free(stored)
+            else:
+                self.bounds_array.free(~stored)
+
+    def get(self, cache_game_state, default=None):
+        result = dict.get(self, cache_game_state, _MISSING)
+        if type(result) is int:
+            self.num_hits += 1
+            return self._decode(result)
+        if result is _MISSING:
+            if self.disk_cache is not None:
+                result = self.disk_cache.get(cache_game_state, _MISSING)
+                if result is not _MISSING:
+                    self.num_disk_hits += 1
+                    return result
+            self.num_misses += 1
+            return default
+        self.num_hits += 1
+        return result
+
+    def __getitem__(self, cache_game_state):
+        result = dict.get(self, cache_game_state, _MISSING)
+        if (result is _MISSING) and (self.disk_cache is not None):
+            result = self.disk_cache.get(cache_game_state, _MISSING)
+        if result is _MISSING:
+            raise KeyError(cache_game_state)
+        return self._decode(result)
+
+    def __contains__(self, cache_game_state):
+        return dict.__contains__(self, cache_game_state) or (
+            (self.disk_cache is not None) and (self.disk_cache.get(cache_game_state, _MISSING) is not _MISSING)
+        )
+
+    def pop(self, cache_game_state, default=_MISSING):
+        result = dict.pop(self, cache_game_state, _MISSING)
+        if type(result) is int:
+            self._free(result)
+            result = self._decode(result)
+        if self.disk_cache is not None:
+            disk_result = self.disk_cache.pop(cache_game_state, _MISSING)
+            if result is _MISSING:
+                result = disk_result
+        if result is _MISSING:
+            if default is _MISSING:
+                raise KeyError(cache_game_state)
+            return default
+        return result
+
+    def __delitem__(self, cache_game_state):
+        self.pop(cache_game_state)
+
+    # The dict methods below would see the Cost_Array slots the dict holds rather than the evaluations, so they decode
+    # them. Like len() and iterating, they only see the entries in memory.
+    def items(self):
+        if self.cost_array is None:
+            return dict.items(self)
+        return ((cache_game_state, self._decode(stored)) for (cache_game_state, stored) in dict.items(self))
+
+    def values(self):
+        if self.cost_array is None:
+            return dict.values(self)
+        return (self._decode(stored) for stored in dict.values(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        other_has_slots = (type(other) is Evaluations_Cache) and (other.cost_array is not None)
+        if (self.cost_array is None) and not(other_has_slots):
+            return dict.__eq__(self, other)
+        if len(self) != len(other):
+            return False
+        for (cache_game_state, evaluation) in self.items():
+            other_stored = dict.get(other, cache_game_state, _MISSING)
+            if other_has_slots and (other_stored is not _MISSING):
+                other_stored = other._decode(other_stored)
+            if (other_stored is _MISSING) or (other_stored != evaluation):
+                return False
+        return True
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if (result is NotImplemented) else not(result)
+
+    __hash__ = None
+
+    def update(self, other=(), **kwargs):
+        """ Set each entry of `other` (a mapping or an iterable of pairs) and `kwargs` with [], so they're encoded, interned and counted against max_entries like any other. """
+        for (cache_game_state, evaluation) in (other.items() if hasattr(other, "keys") else other):
+            self[cache_game_state] = evaluation
+        for (cache_game_state, evaluation) in kwargs.items():
+            self[cache_game_state] = evaluation
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, cache_game_state, default=None):
+        result = dict.get(self, cache_game_state, _MISSING)
+        if result is _MISSING:
+            self[cache_game_state] = default
+            return default
+        return self._decode(result)
+
+    def popitem(self):
+        (cache_game_state, stored) = dict.popitem(self)
+        evaluation = self._decode(stored)
+        self._free(stored)
+        return (cache_game_state, evaluation)
+
+    def copy(self):
+        """ Return a plain dict of the entries in memory. """
+        return dict(self.items())
+
+    def __setitem__(self, cache_game_state, evaluation):
+        if self.cost_array is not None:
+            evaluation = self._encode(evaluation, dict.get(self, cache_game_state))
+        if (
+            (self.cwa_set_pool is not None) and (type(cache_game_state) is not int) and
+            (not dict.__contains__(self, cache_game_state)) # an existing key keeps its own cwa_set anyway.
+        ):
+            cache_game_state = self.cwa_set_pool.intern_game_state(cache_game_state)
+        dict.__setitem__(self, cache_game_state, evaluation)
+        if self.dirty_keys is not None:
+            self.dirty_keys[cache_game_state] = None
+        if (self.max_entries is not None) and (len(self) > self.max_entries):
+            self._evict()
+
+    def _evict(self):
+        num_to_evict = max(len(self) - self.max_entries, int(len(self) * self.evict_fraction))
+        if (self.spill_directory is not None) and (self.disk_cache is None):
+            from .disk_cache import Disk_Cache
+            self.disk_cache = Disk_Cache(self.spill_directory)
+        for cache_game_state in heapq.nsmallest(num_to_evict, self.keys(), key=keep_priority):
+            evaluation = self.pop(cache_game_state) if (self.cost_array is not None) else dict.pop(self, cache_game_state)
+            if self.disk_cache is not None:
+                self.disk_cache[cache_game_state] = evaluation
+            elif self.dirty_keys is not None:
+                self.dirty_keys.pop(cache_game_state, None) # dropped, so new_entries() can't give it anyway.
+        self.num_evictions += num_to_evict
+        if self.cwa_set_pool is not None:
+            self.cwa_set_pool.new_generation(self.keys())
+
+    def mark(self):
+        """ Start keeping track of the keys that get set from now on, and return a mark to give to new_entries() later. Only the latest mark can be given. """
+        self.dirty_keys = dict()
+        self.num_marks += 1
+        return self.num_marks
+
+    def new_entries(self, mark):
+        """
+        Return a list of the (cache_game_state, evaluation) entries set since `mark` (see mark()), in the order they were first set: both new entries and ones whose evaluation was changed in place (e.g. a Cost_Bounds replaced by the exact cost). Entries that were set and then evicted are only there if they were spilled to disk.
+        """
+        if mark != self.num_marks:
+            raise ValueError(f"Mark {mark} is not the latest mark of this evaluations cache, {self.num_marks}.")
+        entries = []
+        for cache_game_state in self.dirty_keys:
+            stored = dict.get(self, cache_game_state, _MISSING)
+            if (stored is _MISSING) and (self.disk_cache is not None):
+                stored = self.disk_cache.get(cache_game_state, _MISSING)
+            if stored is not _MISSING:
+                entries.append((cache_game_state, self._decode(stored)))
+        return entries
+
+    def stats(self):
+        (num_shared_cwa_sets, num_bytes_saved) = (
+            (0, 0) if (self.cwa_set_pool is None) else (self.cwa_set_pool.num_shared, self.cwa_set_pool.num_bytes_saved)
+        )
+        return Cache_Stats(
+            self.num_hits, self.num_misses, self.num_evictions, self.num_disk_hits, num_shared_cwa_sets, num_bytes_saved
+        )
+
+    def close(self):
+        """ Delete the disk_cache's files, if there is a disk_cache. """
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
+def stats_str(cache_stats: Cache_Stats):
+    num_lookups = cache_stats.num_hits + cache_stats.num_disk_hits + cache_stats.num_misses
+    hit_rate = (100 * (cache_stats.num_hits + cache_stats.num_disk_hits) / num_lookups) if num_lookups else 0
+    result = (
+        f"Evaluations cache: {cache_stats.num_hits:,} hits, {cache_stats.num_misses:,} misses ({hit_rate:0.2f}% hit rate), {cache_stats.num_evictions:,} evictions, {cache_stats.num_disk_hits:,} disk hits."
+    )
+    if cache_stats.num_shared_cwa_sets:
+        result += (
+            f" Interning shared {cache_stats.num_shared_cwa_sets:,} cwa_sets, saving {cache_stats.num_bytes_saved:,} bytes."
+        )
+    return result
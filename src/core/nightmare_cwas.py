@@ -0,0 +1,67 @@
+import itertools
+import numpy as np
+
+class Nightmare_Cwas_List:
+    """
+    The full_cwas_list of a nightmare problem, without a (combo, permutation, answer) tuple for each of its CWAs. Every possible combo has a CWA for each permutation of the verifiers, so CWA i is kept as combo_ids[i], its combo's index in combos (and combo_answers), and permutation_ids[i], its permutation's index in the table of itertools.permutations of the verifier indexes that all the CWAs share. Indexing or iterating over it makes the (combo, permutation, answer) tuples a list of CWAs would have, so it stands in for that list anywhere (e.g. in display code), while the solver reads the arrays directly (see cwa_rule_ids and one_answer_left).
+    """
+    __slots__ = (
+        "combos",
+        "combo_answers",
+        "permutations",
+        "combo_ids",
+        "permutation_ids",
+        "answers",
+    )
+    def __init__(self, possible_combos_with_answers, num_verifiers):
+        self.combos          = [combo for (combo, answer) in possible_combos_with_answers]
+        self.combo_answers   = [answer for (combo, answer) in possible_combos_with_answers]
+        self.permutations    = tuple(itertools.permutations(range(num_verifiers)))
+        num_permutations     = len(self.permutations)
+        combo_ids            = np.repeat(np.arange(len(self.combos), dtype=np.int32), num_permutations)
+        permutation_ids      = np.tile(np.arange(num_permutations, dtype=np.int16), len(self.combos))
+        # sorted by answer, like the full_cwas_list of other modes. The sort is stable, so each answer's CWAs stay
+        # in combo, then permutation, order.
+        order = np.argsort(np.array(self.combo_answers, dtype=np.int64)[combo_ids], kind='stable')
+        self.combo_ids       = combo_ids[order]
+        self.permutation_ids = permutation_ids[order]
+        # answers[i] is the answer of CWA i. A list, since one_answer_left looks them up one at a time.
+        self.answers         = [self.combo_answers[combo_id] for combo_id in self.combo_ids.tolist()]
+
+    def __len__(self):
+        return len(self.answers)
+
+    def __getitem__(self, cwa_index):
+        if isinstance(cwa_index, slice):
+            return [self[i] for i in range(*cwa_index.indices(len(self)))]
+        return (
+            self.combos[self.combo_ids[cwa_index]],
+            self.permutations[self.permutation_ids[cwa_index]],
+            self.answers[cwa_index],
+        )
+
+    def __iter__(self):
+        for (combo_id, permutation_id, answer) in zip(
+            self.combo_ids.tolist(), self.permutation_ids.tolist(), self.answers
+        ):
+            yield (self.combos[combo_id], self.permutations[permutation_id], answer)
+
+    def cwa_rule_ids(self) -> np.ndarray:
+        """
+        Return an int array whose [cwa_index, v_index] element is the unique_id of the rule CWA cwa_index assigns to verifier v_index: rule permutation[v_index] of its combo.
+        """
+        num_verifiers = len(self.permutations[0])
+        combo_rule_ids = np.array(
+            [[rule.unique_id for rule in combo] for combo in self.combos], dtype=np.intp
+        ).reshape(len(self.combos), num_verifiers)
+        permutation_table = np.array(self.permutations, dtype=np.intp)
+        return combo_rule_ids[self.combo_ids[:, np.newaxis], permutation_table[self.permutation_ids]]
+
+    def one_answer_left(self, working_cwa_set):
+        """ solver.one_answer_left, with the answers looked up in self.answers. """
+        answers = self.answers
+        if(type(working_cwa_set) is int):
+            return (answers[(working_cwa_set & -working_cwa_set).bit_length() - 1] == answers[working_cwa_set.bit_length() - 1])
+        iterator = iter(working_cwa_set)
+        first_answer = answers[next(iterator)]
+        return all((answers[cwa_index] == first_answer) for cwa_index in iterator)
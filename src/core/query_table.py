@@ -0,0 +1,192 @@
+from collections import OrderedDict, namedtuple
+import numpy as np
+from .definitions import Query_Info
+
+Memo_Stats = namedtuple('Memo_Stats', ['num_hits', 'num_misses', 'num_evictions'])
+
+class Query_Table:
+    """
+    A bit matrix of the queries in a base qs_dict (see solver_utils._init_base_qs_dict): row r is the query (proposals[r], verifiers[r]), and true_bits[r] is its q_info's cwa_set_true as packed bits, little bit order, so that bit i is CWA i (the same order as int working cwa_sets' bytes). Every CWA not in a base q_info's cwa_set_true is in its cwa_set_false, so the false side doesn't need its own matrix. Lets full_filter work on all of a qs_dict's queries with a few NumPy calls rather than with set operations on each query.
+    """
+    __slots__ = (
+        "num_cwas",
+        "num_bytes",
+        "proposals",
+        "verifiers",
+        "proposal_ids",
+        "true_bits",
+    )
+    def __init__(self, base_qs_dict: dict, num_cwas, true_bits_by_query=None):
+        self.num_cwas  = num_cwas
+        self.num_bytes = (num_cwas + 7) >> 3
+        self.proposals = [] # row : proposal
+        self.verifiers = [] # row : verifier index
+        true_bits_rows = []
+        for (proposal, inner_dict) in base_qs_dict.items():
+            for (v_index, q_info) in inner_dict.items():
+                self.proposals.append(proposal)
+                self.verifiers.append(v_index)
+                true_bits_rows.append(
+                    self.packed_bits(q_info.cwa_set_true) if (true_bits_by_query is None)
+                    else true_bits_by_query[(proposal, v_index)]
+                )
+        # row : index of the row's proposal in base_qs_dict, to tell proposals apart in NumPy.
+        proposal_to_id = {proposal : proposal_id for (proposal_id, proposal) in enumerate(base_qs_dict)}
+        self.proposal_ids = np.array([proposal_to_id[proposal] for proposal in self.proposals], dtype=np.int64)
+        self.true_bits = np.array(true_bits_rows, dtype=np.uint8).reshape(len(true_bits_rows), self.num_bytes)
+
+    def packed_bits(self, cwa_set):
+        """ Return working cwa_set `cwa_set` as a row of packed bits, like the rows of true_bits. """
+        if(type(cwa_set) is int):
+            return np.frombuffer(cwa_set.to_bytes(self.num_bytes, 'little'), dtype=np.uint8)
+        bool_mask = np.zeros(self.num_cwas, dtype=bool)
+        bool_mask[list(cwa_set)] = True
+        return np.packbits(bool_mask, bitorder='little')
+
+class Query_Dict(dict):
+    """
+    A qs_dict that also knows its Query_Table, and which row of it each of its queries is: rows[i] is the row of the ith query in iteration order. It is still an ordinary qs_dict to everything that reads it.
+    """
+    __slots__ = (
+        "table",
+        "rows",
+    )
+
+def make_query_dict(qs_dict: dict, table: Query_Table, rows):
+    query_dict = Query_Dict(qs_dict)
+    query_dict.table = table
+    query_dict.rows = np.asarray(rows, dtype=np.intp)
+    return query_dict
+
+def make_base_query_dict(base_qs_dict: dict, num_cwas, true_bits_by_query=None):
+    """ Return `base_qs_dict` as a Query_Dict, with a new Query_Table made from it (and from the packed cwa_set_true rows in `true_bits_by_query` of (proposal, verifier index) : row, if given, rather than packing them again). """
+    return make_query_dict(base_qs_dict, Query_Table(base_qs_dict, num_cwas, true_bits_by_query), np.arange(
+        sum(len(inner_dict) for inner_dict in base_qs_dict.values())
+    ))
+
+def get_rows_and_pset_dict(query_dict: Query_Dict, current_cwa_set):
+    """
+    The Query_Table version of solver_utils._get_updated_qs_dict_and_pset_dict. The true count, usefulness and small partition of all of `query_dict`'s queries come from ANDing their rows with `current_cwa_set` at once, and small partitions are numbered with one np.unique, so that the queries to keep and the small partition sets only take a Python loop over the useful queries. Small partitions are given as those numbers rather than as cwa_sets; they're only compared with each other.
+
+    Returns
+    -------
+    (rows_dict, small_partition_set_dict) : tuple
+    `rows_dict` : dict
+        A dictionary from {proposal : list of the rows of its queries to keep}, in `query_dict`'s order.
+    `small_partition_set_dict` : dict
+        A dictionary from {proposal : set of the numbers of its small partitions}
+    """
+    table = query_dict.table
+    if(type(current_cwa_set) is int):
+        current_cwa_set_len = current_cwa_set.bit_count()
+        min_cwa_index = (current_cwa_set & -current_cwa_set).bit_length() - 1
+    else:
+        current_cwa_set_len = len(current_cwa_set)
+        min_cwa_index = min(current_cwa_set, default=0)
+    current_bits = table.packed_bits(current_cwa_set)
+    true_bits = table.true_bits[query_dict.rows] & current_bits
+    true_counts = np.bitwise_count(true_bits).sum(axis=1, dtype=np.int64)
+    useful = np.flatnonzero((0 < true_counts) & (true_counts < current_cwa_set_len))
+    if(not useful.size):
+        return (dict(), dict())
+    (true_bits, true_counts, useful_rows) = (true_bits[useful], true_counts[useful], query_dict.rows[useful])
+    # the same tie break as solver_utils._get_small_partition: the partition with the smallest CWA index.
+    true_has_min = ((true_bits[:, min_cwa_index >> 3] >> (min_cwa_index & 7)) & 1).astype(bool)
+    true_is_small = ((2 * true_counts) < current_cwa_set_len) | (
+        ((2 * true_counts) == current_cwa_set_len) & true_has_min
+    )
+    small_partitions = np.where(true_is_small[:, np.newaxis], true_bits, (~true_bits) & current_bits)
+    (_, small_partition_ids) = np.unique(
+        small_partitions.view(np.dtype((np.void, table.num_bytes))).ravel(), return_inverse=True
+    )
+    # keep a proposal's query only if it is the first one with its small partition, like in the loops version.
+    (_, first_indexes) = np.unique(
+        (table.proposal_ids[useful_rows] * len(useful_rows)) + small_partition_ids, return_index=True
+    )
+    first_indexes.sort()
+    kept_rows = useful_rows[first_indexes]
+    rows_dict = dict()
+    small_partition_set_dict = dict()
+    for (row, small_partition_id) in zip(kept_rows.tolist(), small_partition_ids[first_indexes].tolist()):
+        proposal = table.proposals[row]
+        small_partition_set = small_partition_set_dict.get(proposal)
+        if small_partition_set is None:
+            small_partition_set_dict[proposal] = {small_partition_id}
+            rows_dict[proposal] = [row]
+        else:
+            small_partition_set.add(small_partition_id)
+            rows_dict[proposal].append(row)
+    return (rows_dict, small_partition_set_dict)
+
+def make_filtered_query_dict(query_dict: Query_Dict, current_cwa_set, rows_dict: dict, proposals):
+    """
+    Return a new Query_Dict of the queries in `rows_dict` (from get_rows_and_pset_dict) of `proposals`, in that order, with their q_infos' cwa_sets intersected with `current_cwa_set`. Only these queries' cwa_sets are ever made.
+    """
+    table = query_dict.table
+    new_qs_dict = dict()
+    new_rows = []
+    for proposal in proposals:
+        inner_dict = query_dict[proposal]
+        new_inner_dict = dict()
+        for row in rows_dict[proposal]:
+            v_index = table.verifiers[row]
+            (q_info_true, q_info_false) = inner_dict[v_index]
+            # put the game state's cwa_set first to keep result a frozenset.
+            new_inner_dict[v_index] = Query_Info(
+                cwa_set_true=current_cwa_set & q_info_true, cwa_set_false=current_cwa_set & q_info_false
+            )
+            new_rows.append(row)
+        new_qs_dict[proposal] = new_inner_dict
+    return make_query_dict(new_qs_dict, table, new_rows)
+
+class Query_Dict_Memo:
+    """
+    A least recently used memo of full_filter's results for Query_Dicts, that holds at most `max_entries` of them, for a whole search. A result is keyed by the rows of the Query_Dict it was filtered from and the cwa_set it was filtered with, which together decide it completely, so a hit gives back exactly what full_filter would have. Game states reached by different moves often have the same cwa_set and were filtered from the same rows (e.g. when two proposals' queries split the CWAs the same way), and those only get filtered once. Counts the hits and misses of get(), and the evictions.
+    """
+    __slots__ = (
+        "max_entries",
+        "entries",
+        "num_hits",
+        "num_misses",
+        "num_evictions",
+    )
+    def __init__(self, max_entries):
+        self.max_entries   = max_entries
+        self.entries       = OrderedDict() # (rows bytes, cwa_set) : filtered Query_Dict, least recently used first.
+        self.num_hits      = 0
+        self.num_misses    = 0
+        self.num_evictions = 0
+
+    @staticmethod
+    def key(query_dict: Query_Dict, current_cwa_set):
+        return (query_dict.rows.tobytes(), current_cwa_set)
+
+    def get(self, key):
+        """ Return the filtered Query_Dict memoized under `key` (see key()), or None. """
+        filtered_query_dict = self.entries.get(key)
+        if filtered_query_dict is None:
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        self.entries.move_to_end(key)
+        return filtered_query_dict
+
+    def put(self, key, filtered_query_dict: Query_Dict):
+        self.entries[key] = filtered_query_dict
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.num_evictions += 1
+
+    def clear(self):
+        """ Drop every entry, but keep the counts. """
+        self.entries.clear()
+
+    def stats(self):
+        return Memo_Stats(self.num_hits, self.num_misses, self.num_evictions)
+
+def memo_stats_str(memo_stats: Memo_Stats, name="Filtered qs_dict memo"):
+    num_lookups = memo_stats.num_hits + memo_stats.num_misses
+    hit_rate = (100 * memo_stats.num_hits / num_lookups) if num_lookups else 0
+    return (
+        f"{name}: {memo_stats.num_hits:,} hits, {memo_stats.num_misses:,} misses ({hit_rate:0.2f}% hit rate), {memo_stats.num_evictions:,} evictions."
+    )
@@ -1,5 +1,6 @@
 import string
-from .definitions import Rule, all_125_possibilities_set, int_to_tri_sq_ci_tuple, Problem, STANDARD, NIGHTMARE, EXTREME
+import numpy as np
+from .definitions import Rule, possibilities, int_to_tri_sq_ci_tuple, Problem, STANDARD, NIGHTMARE, EXTREME
 
 # rule 1
 def triangle_eq_1(triangle, square, circle):
@@ -331,12 +332,27 @@ rcs_deck = { #dict from num: rules list. Dictionary rather than list for ease of
 # longest_rule_name = max([max([(len(r.__name__), r.__name__) for r in rc]) for rc in rcs_deck.values()])[1]
 # print(longest_rule_name, max_rule_name_length)
 # card_index is the rule's index within the list that is the card. (i.e. 0th rule, 1st rule, 2nd rule, etc.)
+# (triangles, squares, circles): arrays whose element i is that digit of possibilities[i].
+_possibility_digit_arrays = tuple(np.array(digits) for digits in zip(*map(int_to_tri_sq_ci_tuple, possibilities)))
+def _get_reject_mask(func):
+    """
+    Return the int whose bit i is set iff rule function `func` rejects possibilities[i]. Functions that only use arithmetic and comparisons work on whole arrays of digits, so they are called once, on the arrays of all 125 possibilities' digits. The rest (with and, or, not, chained comparisons, tuple.count, etc.) raise when given arrays, so they are called on one possibility at a time.
+    """
+    try:
+        accepts = np.asarray(func(*_possibility_digit_arrays))
+    except (ValueError, TypeError):
+        accepts = None
+    if((accepts is None) or (accepts.dtype != bool) or (accepts.shape != (len(possibilities),))):
+        accepts = np.array([bool(func(*int_to_tri_sq_ci_tuple(p))) for p in possibilities])
+    return(int.from_bytes(np.packbits(~accepts, bitorder='little').tobytes(), 'little'))
+
 _unique_id = -1
 def _func_to_Rule(func, card_index):
-    reject_set = {p for p in all_125_possibilities_set if not(func(*(int_to_tri_sq_ci_tuple(p))))}
+    reject_mask = _get_reject_mask(func)
+    reject_set = {p for (i, p) in enumerate(possibilities) if((reject_mask >> i) & 1)}
     global _unique_id
     _unique_id += 1
-    return(Rule(func.__name__, reject_set, func, card_index, _unique_id))
+    return(Rule(func.__name__, reject_set, func, card_index, _unique_id, reject_mask))
 
 for (rule_card_num, rule_card) in rcs_deck.items():
     rcs_deck[rule_card_num] = [_func_to_Rule(f, i) for (i, f) in enumerate(rule_card)]
@@ -344,7 +360,7 @@ for (rule_card_num, rule_card) in rcs_deck.items():
 
 def _rule_with_new_unique_id(old_rule, new_unique_id):
     """ Return a new Rule that is equivalent to old_rule, except it has a new unique_id"""
-    return(Rule(old_rule.name, old_rule.reject_set, old_rule.func, old_rule.card_index, new_unique_id))
+    return(old_rule._replace(unique_id=new_unique_id))
 def _rc_with_new_unique_ids(rc: list[Rule], new_unique_id_start):
     """ Modify the passed in Rule list (rule card) to contain rules with a contiguous block of unique IDs. """
     curr_new_id = new_unique_id_start
@@ -369,18 +385,17 @@ def make_rcs_list(problem: Problem) -> list[list[Rule]]:
         for rc_index in range(len(rcs_list)):
             rc = rcs_list[rc_index]
             new_rc = []
-            rc_reject_sets_dict = dict() # key: reject set. value: name of the rule with that reject set.
+            rc_reject_masks_dict = dict() # key: reject mask. value: name of the rule with that reject mask.
             for rule in rc:
-                fs_reject_set = frozenset(rule.reject_set)
-                if(fs_reject_set in rc_reject_sets_dict):
-                    print(f'{rule.name} is the same as {rc_reject_sets_dict[fs_reject_set]} in rule card {string.ascii_uppercase[rc_index]}.')
+                if(rule.reject_mask in rc_reject_masks_dict):
+                    print(f'{rule.name} is the same as {rc_reject_masks_dict[rule.reject_mask]} in rule card {string.ascii_uppercase[rc_index]}.')
                 else:
                     new_rc.append(rule)
-                    rc_reject_sets_dict[fs_reject_set] = rule.name
+                    rc_reject_masks_dict[rule.reject_mask] = rule.name
             rcs_list[rc_index] = new_rc
             # changing the card_index of each rule for each rc in extreme mode, since cards are combined. Making new Rules b/c the fields of tuples aren't assignable.
             for (i, r) in enumerate(new_rc):
-                new_rc[i] = Rule(r.name, r.reject_set, r.func, i, r.unique_id)
+                new_rc[i] = r._replace(card_index=i)
     _rcs_list_with_new_unique_ids(rcs_list)
     return(rcs_list)
 
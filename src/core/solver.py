@@ -1,26 +1,33 @@
-import time, sys
+import time, sys, os
 import numpy as np
 from rich import progress
-from . import rules, config, solver_utils
+from . import rules, config, solver_utils, query_table
 from .definitions import *
+from .evaluations_cache import Evaluations_Cache, stats_str
+from .nightmare_cwas import Nightmare_Cwas_List
 
-def make_initial_game_state(full_cwas_list):
-    # cwa_set representation_change
-    cwa_set = frozenset(list(range(len(full_cwas_list))))
+def make_initial_game_state(full_cwas_list, set_type=frozenset):
+    """ `set_type` is the type of working cwa_set to use. See config.WORKING_CWA_SET_TYPE. """
+    cwa_set = ((1 << len(full_cwas_list)) - 1) if (set_type is int) else frozenset(range(len(full_cwas_list)))
     initial_game_state = Game_State(num_queries_this_round=0, proposal_used_this_round=None, cwa_set=cwa_set)
     return initial_game_state
 
 def one_answer_left(full_cwas_list, working_cwa_set):
     """
     Given a set of CWA as stored in the working game state object (as opposed to the cache game state object), returns a boolean according to whether or not there is exactly one unique answer remaining in the CWA set. Faster than just making the entire answer set and calling len() on it, b/c instead of going through every CWA, this returns the moment it finds a second answer.
+    For int cwa_sets this is O(1): solver_utils.make_full_cwas_list sorts the CWAs by answer, so each answer's CWAs are one block of bits, and the cwa_set is within one answer block iff its lowest and highest CWAs have the same answer.
     """
-    # cwa_set representation_change
-    # TODO: see if using answer block intersection helps or hurts.
-    # TODO: see which of sorting/not sorting the full cwas list in solver_utils.make_full_cwas_list is better.
+    if(type(full_cwas_list) is Nightmare_Cwas_List):
+        return full_cwas_list.one_answer_left(working_cwa_set)
+    if(type(working_cwa_set) is int):
+        return (
+            full_cwas_list[(working_cwa_set & -working_cwa_set).bit_length() - 1][-1] ==
+            full_cwas_list[working_cwa_set.bit_length() - 1][-1]
+        )
     seen_answer_set = set()
     # See comments in definitions.Game_State for the format game_state_cwa_set is in.
     # May not be a literal Python set object.
-    iterator = iter(working_cwa_set)
+    iterator = iter(solver_utils.cwa_set_indexes(working_cwa_set))
     zeroth_cwa_representation = next(iterator)
     seen_answer_set.add(full_cwas_list[zeroth_cwa_representation][-1])
     current_cwa_representation = next(iterator, None)
@@ -40,19 +47,11 @@ def get_set_r_unique_ids_vs_from_cwas_set_representation(
     """
     Given a cwas_set, returns a list, where list[i] contains a set of the unique_ids for all possible rules for verifier i.
     """
-    # cwa_set representation_change
     # TODO: consider optimizing the 'sets' in possible_rule_ids_by_verifier w/ bitsets or ints or numpy packed bits or bools or something.
     possible_rule_ids_by_verifier = [set() for _ in range(num_vs)]
-    # NOTE: if replace the output of this with a numpy packed bits, then instead of doing a slow Python loop
-    # here over every CWA, can store a numpy array containing the possible rules by verifier bits for every possible CWA, and replace this with a fast vectorized numpy bitwise OR.
-    # for example, let's say that the first CWA assigns some rules to some verifiers that look
-    # like this: 00110010 (a numpy array representing which rules are assigned to which verifiers for the zeroth CWA)
-    # Then, the next CWA may be 11001010.
-    # If you make a numpy double array (an array of arrays) where the double array corresponds to the whole
-    # CWA list, and each array within it corresponds to the rules assigned to verifiers for that specific CWA,
-    # then, you can get the index the full CWA list double array by which CWAs are present now, and then
-    # numpy bitwise OR that indexed list together, for speed gainz. See if you can index a numpy array with a packed bit array; otherwise will have to unpack to booleans. And pay attention to endianness.
-    for cwa_index in cwas_set_representation:
+    # NOTE: this loops over every CWA in Python. Solver.cwa_rule_masks (see solver_utils.make_cwa_rule_masks) gets the
+    # same information as masks with one vectorized numpy bitwise OR, and is what the nightmare solver uses.
+    for cwa_index in solver_utils.cwa_set_indexes(cwas_set_representation):
         cwa = full_cwas_list[cwa_index]
         (c, p) = (cwa[0], cwa[1])
         for v_index in range(num_vs):
@@ -61,7 +60,6 @@ def get_set_r_unique_ids_vs_from_cwas_set_representation(
             unique_id = c[rc_index_for_this_v].unique_id
             corresponding_set.add(unique_id)
     return possible_rule_ids_by_verifier
-# TODO: define a length method if switch to another set representation
 
 # useless_queries = 0
 # useful_queries = 0
@@ -81,12 +79,8 @@ def create_move_info(
         if this is True, then this function will set intersect the q_info sets with the game state sets in order to determine which cwas are left in each case. (used in the filter_cache function, which does not update the qs_dict). If this is False, then it will only do the set intersect if game_state.proposal_used_this_round is not None. If it is None, it will just pull the cwa_sets straight from the qs dict, b/c the qs_dict was just updated at the beginning of the round.
     WARN: could return None
     """
-    # cwa_set representation_change
-    # will need the function to intersect two sets as well as to see if a set is nonempty.
-    # NOTE: According to Python docs, if you mix a frozenset and a set in a binary operation, the result's
-    # type will match the type of the first operand.
-    # See https://docs.python.org/3/library/stdtypes.html#frozenset:~:text=Binary%20operations%20that%20mix%20set%20instances%20with%20frozenset%20return%20the%20type%20of%20the%20first%20operand.%20For%20example%3A%20frozenset(%27ab%27)%20%7C%20set(%27bc%27)%20returns%20an%20instance%20of%20frozenset.
-    # Therefore, all of the game states' cwa_sets created below are frozensets.
+    # NOTE: the working cwa_sets are either all frozensets or all ints (see config.WORKING_CWA_SET_TYPE), and & and
+    # bool() mean the same thing for both, so the game states' cwa_sets created below are the same type as the others.
     if((game_state.proposal_used_this_round is not None) or force_set_intersect):
         cwa_set_if_true = game_state.cwa_set & q_info.cwa_set_true
         cwa_set_if_false = game_state.cwa_set &  q_info.cwa_set_false
@@ -98,8 +92,9 @@ def create_move_info(
         cwa_set_if_false = q_info.cwa_set_false
 
     # this is a useful query.
-    # cwa_set representation_change Will need a function to get the length of a set.
-    num_combos_remaining_true = len(cwa_set_if_true)
+    num_combos_remaining_true = (
+        cwa_set_if_true.bit_count() if (type(cwa_set_if_true) is int) else len(cwa_set_if_true)
+    )
     p_true = num_combos_remaining_true / num_combos_currently
     p_false = 1 - p_true
     p_tuple = (p_false, p_true)
@@ -125,6 +120,14 @@ def testing_stuff(self):
     sd = display.Solver_Displayer(self)
     return sd
 
+class _Out_Of_Time(Exception):
+    """ Raised by Solver.tasks_initialize once the time budget has run out, to stop the search. """
+
+def _move_balance_key(move_info):
+    """ How uneven the move's true/false split is. 0 is an even split. """
+    (p_false, p_true) = move_info[3]
+    return abs(p_true - p_false)
+
 progress = solver_utils.progress_initialize()
 
 class Solver:
@@ -159,20 +162,80 @@ class Solver:
 
         "best_move",
         "put_cache_gs_in_new_ev_cache",
+        "cwa_answer_ids",
+        "answer_block_masks",
+        "cwa_rule_masks",
+        "use_lower_bound_pruning",
+        "move_ordering",
+        "num_pruned_subtrees",
+        "use_cutoff_bounds",
+        "search_engine",
+        "parallel_split_depth",
+        "max_search_stack_depth",
+        "search_deadline",
+        "time_budget_deadline",
+        "checkpoint_f_name",
+        "next_checkpoint_time",
+        "checkpoint_cache_mark",
+        "evaluations_cache_stats",
+        "qs_dict_memo",
+        "qs_dict_memo_stats",
+        "canonical_form_cache",
+        "canonical_form_cache_stats",
+        "proven_optimal",
     )
     initial_best_cost = (float('inf'), float('inf'))
+    parallel_search_supported = True # whether solve() may spread the search across worker processes.
+    anytime_search_supported  = True # whether solve() may stop at a time budget (see _anytime_search).
+    evictable_cache_supported = True # whether the evaluations_cache may evict entries (see config.EVAL_CACHE_MAX_ENTRIES).
+    array_costs_supported     = True # whether the evaluations_cache may keep costs in arrays (see config.EVAL_CACHE_ARRAY_COSTS).
     def __init__(self, problem: Problem):
         self.problem            = problem
         self.n_mode             = (problem.mode == NIGHTMARE)
-        self._evaluations_cache = dict()
+        self._evaluations_cache = Evaluations_Cache(
+            max_entries=(config.EVAL_CACHE_MAX_ENTRIES if self.evictable_cache_supported else None),
+            evict_fraction=config.EVAL_CACHE_EVICT_FRACTION,
+            spill_directory=config.EVAL_CACHE_SPILL_DIRECTORY,
+            array_costs=(config.EVAL_CACHE_ARRAY_COSTS and self.array_costs_supported),
+            intern_cwa_sets=config.EVAL_CACHE_INTERN_CWA_SETS,
+        )
         self._cost_calculator   = solver_utils.calculate_expected_cost # can also be worst_case_cost
         self.rcs_list           = rules.make_rcs_list(problem)
         self.num_rcs            = len(self.rcs_list)
         self.flat_rule_list     = rules.make_flat_rule_list(self.rcs_list)
         self.full_cwas_list     = solver_utils.make_full_cwas_list(self.n_mode, self.rcs_list)
-        self.initial_game_state = make_initial_game_state(self.full_cwas_list)
+        self.initial_game_state = make_initial_game_state(self.full_cwas_list, config.WORKING_CWA_SET_TYPE)
         self.best_move          = None
         self.put_cache_gs_in_new_ev_cache = True
+        self.use_lower_bound_pruning = (
+            config.N_MODE_LOWER_BOUND_PRUNING if self.n_mode else config.S_MODE_LOWER_BOUND_PRUNING
+        )
+        self.move_ordering      = config.MOVE_ORDERING
+        # cutoffs are worked out for the expected cost calculator only.
+        self.use_cutoff_bounds  = (
+            config.USE_CUTOFF_BOUNDS and (self._cost_calculator is solver_utils.calculate_expected_cost)
+        )
+        self.num_pruned_subtrees = 0 # number of game states whose search was skipped by pruning.
+        self.search_engine      = config.SEARCH_ENGINE
+        if self.search_engine not in ("recursive", "iterative"):
+            raise ValueError(f"Unknown search engine {self.search_engine!r}. See config.SEARCH_ENGINE.")
+        self.parallel_split_depth = config.PARALLEL_SPLIT_DEPTH
+        if self.parallel_split_depth not in (0, 1):
+            raise ValueError(f"Unknown parallel split depth {self.parallel_split_depth!r}. See config.PARALLEL_SPLIT_DEPTH.")
+        self.max_search_stack_depth = 0 # deepest the iterative search's stack has been.
+        self.search_deadline    = None # time.time() at which the search stops, for the time budget or a checkpoint.
+        self.time_budget_deadline = None # time.time() at which the time budget runs out, if solving with one.
+        self.checkpoint_f_name  = None # file to write checkpoints to while solving, if any.
+        self.next_checkpoint_time = None
+        self.checkpoint_cache_mark = None # evaluations_cache.mark() as of the last checkpoint.
+        self.evaluations_cache_stats = None # the evaluations_cache's Cache_Stats, once solve()d.
+        # full_filter's results, shared by the whole search. See config.QS_DICT_MEMO_MAX_ENTRIES.
+        self.qs_dict_memo       = (
+            query_table.Query_Dict_Memo(config.QS_DICT_MEMO_MAX_ENTRIES) if config.QS_DICT_MEMO_MAX_ENTRIES else None
+        )
+        self.qs_dict_memo_stats = None # the qs_dict_memo's Memo_Stats, once solve()d.
+        self.canonical_form_cache = None # nightmare mode's working cwa_set conversions. See Solver_Nightmare.
+        self.canonical_form_cache_stats = None # the canonical_form_cache's Memo_Stats, once solve()d.
         self.qs_dict            = solver_utils.make_useful_qs_dict(
             self.full_cwas_list,
             self.initial_game_state.cwa_set,
@@ -181,6 +244,15 @@ class Solver:
         )
         if not self.full_cwas_list: # invalid problem with no solutions.
             return
+        # cwa_answer_ids[cwa_index] is a small int that identifies the answer of that CWA. Used for lower bounds.
+        answer_to_id = dict()
+        self.cwa_answer_ids = [
+            answer_to_id.setdefault(cwa[-1], len(answer_to_id)) for cwa in self.full_cwas_list
+        ]
+        # answer_block_masks[answer_id] has the bits of the CWAs with that answer set. For int working cwa_sets.
+        self.answer_block_masks = solver_utils.make_answer_block_masks(self.full_cwas_list)
+        # cwa_rule_masks[cwa_index, v_index] is the bit of the rule that CWA gives that verifier.
+        self.cwa_rule_masks = solver_utils.make_cwa_rule_masks(self.full_cwas_list, self.n_mode)
         self.possible_rules_by_verifier = [
             [self.flat_rule_list[r_index] for r_index in sorted(set_r_unique_ids)]
             for set_r_unique_ids in
@@ -197,16 +269,16 @@ class Solver:
             set_type=self.bitset_type,
         )
         self.convert_working_gs_to_cache_gs = solver_utils.get_convert_working_to_cache_gs_standard(
-            self.bitset_type
+            self.bitset_type, packed=config.PACKED_CACHE_KEYS
         )
         self.max_hex_length     = 0
         self.max_decimal_length = 0
         # NOTE: below block is only for testing purposes.
         if ((self.bitset_type is not set) and (not self.n_mode)):
-            initial_cache_gs = self.convert_working_gs_to_cache_gs(
+            initial_cache_gs = solver_utils.unpack_cache_key(self.convert_working_gs_to_cache_gs(
                 self.initial_game_state,
                 self.all_cwa_bitsets
-            )
+            ))
             initial_bitset_int = solver_utils.bitset_to_int(initial_cache_gs.cwa_set)
             self.max_hex_length = len(hex(initial_bitset_int).upper()[2:])
             self.max_decimal_length = len(f'{initial_bitset_int:,}')
@@ -231,6 +303,7 @@ class Solver:
         self.size_of_evaluations_cache_in_bytes = -1 # have not called solve() yet.
         self.git_hash                           = None
         self.git_message                        = None
+        self.proven_optimal                     = None # have not called solve() yet.
 
     @staticmethod
     def get_and_apply_moves(game_state : Game_State, qs_dict: dict, force_set_intersect=False):
@@ -241,8 +314,7 @@ class Solver:
         See create_move_info function docstring for what force_set_intersect does.
         """
         # calling len() to figure out num_combos_currently here so don't have to do it repeatedly inside loop
-        # cwa_set representation_change Will have to implement a function to get length of set
-        num_combos_currently = len(game_state.cwa_set)
+        num_combos_currently = solver_utils.cwa_set_len(game_state.cwa_set)
         if(game_state.proposal_used_this_round is None):
             # Yield all proposals b/c it's a new round.
             cost = (1, 1)
@@ -287,6 +359,8 @@ class Solver:
                     #     pass # not a useful query. See other comments.
 
     def tasks_initialize(self, depth, move_generator):
+        if((self.search_deadline is not None) and (time.time() > self.search_deadline)):
+            self._search_deadline_passed()
         if(depth < self.num_concurrent_tasks):
             move_iterable = list(move_generator)
             total = len(move_iterable)
@@ -367,60 +441,111 @@ class Solver:
             qs_dict,
             game_state: Game_State,
             depth=0,
+            cutoff=None,
         ):
         """
         Returns a tuple (best move in this state, expected cost to win from game_state (this is a tuple of (expected rounds, expected total queries))).
         best_move_tup is a tup of (proposal, rc_index)
+        `cutoff`: if not None, the caller only needs the cost if it is less than `cutoff` (a (rounds, -inf) tuple). If the search shows the cost is at least `cutoff`, it may stop early and return a Cost_Bounds instead, which is also what gets cached for the game state.
         """
         # self.called_calculate += 1
         cache_game_state = self.convert_working_gs_to_cache_gs(game_state, self.all_cwa_bitsets)
         result = self._evaluations_cache.get(cache_game_state, None)
+        previous_bounds = None
         if result is not None:
             # self.cache_hits += 1
-            return result
+            if (type(result) is not Cost_Bounds) or ((cutoff is not None) and (result.lower >= cutoff)):
+                return result
+            previous_bounds = result
         if one_answer_left(self.full_cwas_list, game_state.cwa_set):
             if config.CACHE_END_STATES:
                 self._evaluations_cache[cache_game_state] = Solver.double_zero
             return Solver.double_zero
+        if self._trivially_cut_off(game_state, cutoff):
+            return self._store_cost_bounds(cache_game_state, cutoff, Solver.initial_best_cost, previous_bounds)
         if game_state.proposal_used_this_round is None:
             # original_qs_dict = qs_dict                                     # uncomment to debug qs dict
-            qs_dict = solver_utils.full_filter(qs_dict, game_state.cwa_set)  # KEEP this line always
+            qs_dict = self._full_filter(qs_dict, game_state.cwa_set)  # KEEP this line always
             # self._qs_dict_debugging(original_qs_dict, qs_dict, game_state) # uncomment to debug qs dict
 
         best_node_cost = Solver.initial_best_cost
+        # Moves are pruned against prune_cost, which is the best node cost so far, or the cutoff if that is lower.
+        prune_cost = self._initial_prune_cost(cutoff, previous_bounds)
+        any_moves = False
         found_moves = False
         best_move = None
-        move_iterable = self.tasks_initialize(depth, self.get_and_apply_moves(game_state, qs_dict))
+        move_iterable = self.tasks_initialize(
+            depth,
+            self._order_moves(self.get_and_apply_moves(game_state, qs_dict))
+        )
+        use_lower_bounds = self.use_lower_bound_pruning
+        answer_counts = None # only counted once there is a best move for the lower bounds to be compared to.
         for move_info in move_iterable:
+            any_moves = True
             (move, mcost, gs_tup, p_tup) = move_info
-            gs_false_node_cost = self._calculate_best_move(qs_dict, gs_tup[0], depth+1)
-            # TODO: smarter pruning. Also, make a dedicated single-state cost calculator rather than using the regular 2-state cost calculator and setting one of the states to 0 cost, as you're doing now.
-            if (self._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) >= best_node_cost):
+            gs_true_lower_bound = None
+            if (use_lower_bounds and (prune_cost is not Solver.initial_best_cost)):
+                if answer_counts is None:
+                    answer_counts = self._answer_counts(game_state.cwa_set)
+                (gs_false_lower_bound, gs_true_lower_bound) = self._lower_bound_costs(move_info, answer_counts)
+                if self._lower_bound_rules_out(move_info, (gs_false_lower_bound, gs_true_lower_bound), prune_cost):
+                    # Even the lower bounds of both nodes make this move not better than the best move.
+                    self.num_pruned_subtrees += 2
+                    if depth < self.num_concurrent_tasks:
+                        progress.update(self.depth_to_tasks_l[depth], advance=1)
+                    continue
+            gs_false_cutoff = self._child_cutoff(prune_cost, mcost, p_tup, 0, gs_true_lower_bound)
+            gs_false_node_cost = self._calculate_best_move(qs_dict, gs_tup[0], depth+1, gs_false_cutoff)
+            # TODO: make a dedicated single-state cost calculator rather than using the regular 2-state cost calculator and setting one of the states to 0 cost, as you're doing now.
+            if (
+                self._is_cut_off(gs_false_node_cost, gs_false_cutoff) or
+                (self._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) >= prune_cost) or
+                (
+                    (gs_true_lower_bound is not None) and
+                    self._lower_bound_rules_out(move_info, (gs_false_node_cost, gs_true_lower_bound), prune_cost)
+                )
+            ):
                 # The false node alone would make this move not better than the best move, so don't need to search the true node.
+                self.num_pruned_subtrees += 1
+                if depth < self.num_concurrent_tasks:
+                    progress.update(self.depth_to_tasks_l[depth], advance=1)
+                continue
+            gs_true_cutoff = self._child_cutoff(prune_cost, mcost, p_tup, 1, gs_false_node_cost)
+            gs_true_node_cost = self._calculate_best_move(qs_dict, gs_tup[1], depth+1, gs_true_cutoff)
+            if self._is_cut_off(gs_true_node_cost, gs_true_cutoff):
+                # The true node's search was cut off because this move can't be better than the best move.
                 if depth < self.num_concurrent_tasks:
                     progress.update(self.depth_to_tasks_l[depth], advance=1)
                 continue
-            gs_true_node_cost = self._calculate_best_move(qs_dict, gs_tup[1], depth+1)
             gss_costs = (gs_false_node_cost, gs_true_node_cost)
             node_cost_tup = self._cost_calculator(mcost, p_tup, gss_costs)
             if(node_cost_tup < best_node_cost):
                 found_moves = True
                 best_node_cost = node_cost_tup
                 best_move = move
+                if (node_cost_tup < prune_cost):
+                    prune_cost = node_cost_tup
                 if(node_cost_tup == mcost):
                     # WARN: be sure not to mix begin-round-early moves w/regular moves for this prune.
                     break
             if depth < self.num_concurrent_tasks:
                 progress.update(self.depth_to_tasks_l[depth], advance=1)
-        if found_moves:
-            self.best_move = best_move
-        else:
+        if not any_moves:
             new_gs = Game_State(
                 num_queries_this_round=0,
                 proposal_used_this_round=None,
                 cwa_set=game_state.cwa_set
             )
-            best_node_cost = self._calculate_best_move(qs_dict=qs_dict, game_state=new_gs, depth=depth+1)
+            best_node_cost = self._calculate_best_move(
+                qs_dict=qs_dict, game_state=new_gs, depth=depth+1, cutoff=cutoff
+            )
+            # This game state costs exactly what the new round game state costs, bounds and all.
+            self._evaluations_cache[cache_game_state] = best_node_cost
+            return best_node_cost
+        if ((cutoff is not None) and not(best_node_cost < cutoff)):
+            return self._store_cost_bounds(cache_game_state, cutoff, best_node_cost, previous_bounds)
+        if found_moves:
+            self.best_move = best_move
 
         # comment out if not block above and uncomment this to try starting new rounds early as well.
         # if(game_state.num_queries_this_round != 0):
@@ -438,23 +563,384 @@ class Solver:
         self._evaluations_cache[cache_game_state] = best_node_cost
         return best_node_cost
 
-    def solve(self):
+    def _initial_prune_cost(self, cutoff, previous_bounds):
+        """
+        Return the cost to prune a game state's moves against before any of them have been searched: the `cutoff`, or less if `previous_bounds` (from an earlier, cut off search of the game state) has an upper bound below the cutoff. A move whose rounds are more than the upper bound's can't be the best move.
+        """
+        if cutoff is None:
+            return Solver.initial_best_cost
+        if ((previous_bounds is not None) and (previous_bounds.upper[0] + config.A_TOL < cutoff[0])):
+            return (previous_bounds.upper[0] + config.A_TOL, -Solver.inf)
+        return cutoff
+
+    def _child_cutoff(self, prune_cost, mcost, p_tup, child_index, other_child_cost):
+        """
+        Return the cutoff to search a move's game state (child_index 0 for false, 1 for true) with, or None for no cutoff. If that game state's cost is at least the cutoff, then the move's cost is at least `prune_cost`, given that the other game state costs at least `other_child_cost` (None for unknown). Only rounds are cut off on, with A_TOL of room, so float rounding can't cut off a move that ties `prune_cost`.
+        """
+        if ((prune_cost is Solver.initial_best_cost) or not(self.use_cutoff_bounds)):
+            return None
+        other_child_rounds = 0 if (other_child_cost is None) else other_child_cost[0]
+        return (
+            ((prune_cost[0] - mcost[0] - (p_tup[1 - child_index] * other_child_rounds)) / p_tup[child_index]) +
+            config.A_TOL,
+            -Solver.inf,
+        )
+
+    @staticmethod
+    def _is_cut_off(node_cost, cutoff):
+        """
+        Return True if `node_cost`, which _calculate_best_move returned when given `cutoff`, is at least the cutoff (in which case it may be a Cost_Bounds instead of an exact cost).
+        """
+        return ((cutoff is not None) and ((type(node_cost) is Cost_Bounds) or (node_cost >= cutoff)))
+
+    @staticmethod
+    def _trivially_cut_off(game_state: Game_State, cutoff):
+        """
+        Return True if `game_state` obviously can't cost less than `cutoff`: a game state with more than one answer left costs at least a round if it begins a round, and at least 0 rounds otherwise.
+        """
+        return ((cutoff is not None) and (cutoff[0] <= (game_state.proposal_used_this_round is None)))
+
+    def _store_cost_bounds(self, cache_game_state, cutoff, upper, previous_bounds):
+        """
+        Cache and return the Cost_Bounds for a game state whose search was cut off at `cutoff`. `upper` is the cost of the best move the search found (or initial_best_cost). Bounds from an earlier search of the game state are kept if they are tighter.
+        """
+        lower = cutoff
+        if previous_bounds is not None:
+            lower = max(lower, previous_bounds.lower)
+            upper = min(upper, previous_bounds.upper)
+        cost_bounds = Cost_Bounds(lower=lower, upper=upper)
+        self._evaluations_cache[cache_game_state] = cost_bounds
+        return cost_bounds
+
+    def _order_moves(self, move_generator):
+        """
+        Return the moves from `move_generator` in the order they should be searched, according to self.move_ordering (see config.MOVE_ORDERING). Searching good moves first makes best_node_cost tighten early, so more moves get pruned. Ties keep qs_dict order.
+        """
+        if self.move_ordering is None:
+            return move_generator
+        if self.move_ordering == "balance":
+            return sorted(move_generator, key=_move_balance_key)
+        if self.move_ordering == "answers_left":
+            return sorted(move_generator, key=self._move_answers_left_key)
+        raise ValueError(f"Unknown move ordering {self.move_ordering!r}. See config.MOVE_ORDERING.")
+
+    def _move_answers_left_key(self, move_info):
+        """ The expected number of distinct answers left after making the move. """
+        (move, mcost, (gs_false, gs_true), (p_false, p_true)) = move_info
+        return (p_false * self._num_answers(gs_false.cwa_set)) + (p_true * self._num_answers(gs_true.cwa_set))
+
+    def _answer_counts(self, cwa_set):
+        """
+        Return a dict of answer_id : number of CWAs in `cwa_set` with that answer.
+        """
+        return solver_utils.get_answer_counts(cwa_set, self.cwa_answer_ids, self.answer_block_masks)
+
+    def _num_answers(self, cwa_set):
+        """ Return the number of distinct answers in `cwa_set`. """
+        return solver_utils.get_num_answers(cwa_set, self.cwa_answer_ids, self.answer_block_masks)
+
+    def _lower_bound_costs(self, move_info, answer_counts):
+        """
+        Return admissible lower bounds (gs_false_lower_bound, gs_true_lower_bound) on the costs of the move's two game states (see solver_utils.calculate_lower_bound_cost). `answer_counts` are the answer counts of the game state the move is made from. Only the smaller of the two game states gets counted; the other's counts are the difference.
+        """
+        (move, mcost, (gs_false, gs_true), (p_false, p_true)) = move_info
+        (smaller_gs, bigger_gs) = (gs_true, gs_false) if (p_true <= p_false) else (gs_false, gs_true)
+        smaller_answer_counts = self._answer_counts(smaller_gs.cwa_set)
+        smaller_answer_count = smaller_answer_counts.get
+        bigger_answer_counts = [
+            count - smaller_answer_count(answer_id, 0)
+            for (answer_id, count) in answer_counts.items()
+            if (count != smaller_answer_count(answer_id, 0))
+        ]
+        smaller_lower_bound = solver_utils.calculate_lower_bound_cost(smaller_answer_counts.values(), smaller_gs)
+        bigger_lower_bound = solver_utils.calculate_lower_bound_cost(bigger_answer_counts, bigger_gs)
+        if (p_true <= p_false):
+            return (bigger_lower_bound, smaller_lower_bound)
+        return (smaller_lower_bound, bigger_lower_bound)
+
+    def _lower_bound_rules_out(self, move_info, gss_lower_bounds, best_node_cost):
+        """
+        Return True if a move whose game states cost at least `gss_lower_bounds` can't be better than `best_node_cost`.
+        """
+        (move, mcost, gs_tup, p_tup) = move_info
+        lower_bound_cost = self._cost_calculator(mcost, p_tup, gss_lower_bounds)
+        return solver_utils.lower_bound_rules_out(lower_bound_cost, best_node_cost, config.LOWER_BOUND_SLACK)
+
+    def _get_root_search_info(self):
+        """
+        Return everything _calculate_best_move would compute for the initial game state before looking at its moves, so that the moves can be searched elsewhere (e.g. by worker processes). Used by solver_parallel.
+
+        Returns
+        -------
+        (qs_dict, move_infos, search_kwargs)
+            qs_dict is the qs_dict filtered for the initial game state. move_infos is a list of the initial game state's move_infos, in the order _calculate_best_move would examine them. search_kwargs are the extra keyword arguments _calculate_best_move needs to search the game states one move below the initial game state.
+        """
+        qs_dict = self._full_filter(self.qs_dict, self.initial_game_state.cwa_set)
+        move_infos = list(self._order_moves(self.get_and_apply_moves(self.initial_game_state, qs_dict)))
+        return (qs_dict, move_infos, dict())
+
+    def _search(self, qs_dict, game_state: Game_State, depth=0, **search_kwargs):
+        """
+        Search `game_state` with _calculate_best_move, or with the equivalent explicit-stack search in solver_iterative if self.search_engine is "iterative" (see config.SEARCH_ENGINE). `search_kwargs` are any extra keyword arguments _calculate_best_move takes. Returns the cost of `game_state`.
+        """
+        if self.search_engine == "iterative":
+            from . import solver_iterative
+            return solver_iterative.iterative_calculate_best_move(
+                self, qs_dict, game_state, depth, search_context=self._search_context(search_kwargs)
+            )
+        return self._calculate_best_move(qs_dict=qs_dict, game_state=game_state, depth=depth, **search_kwargs)
+
+    def _search_context(self, search_kwargs):
+        """
+        Return the search context (see _enter_game_state) that stands for the extra keyword arguments `search_kwargs` of _calculate_best_move. The standard solver has none.
+        """
+        return None
+
+    def _enter_game_state(self, game_state: Game_State, search_context):
+        """
+        The iterative search's hook for the start of _calculate_best_move. `search_context` carries whatever a solver passes from a game state down to the game states below it (None here).
+
+        Returns
+        -------
+        (cache_game_state, search_context)
+        """
+        return (self.convert_working_gs_to_cache_gs(game_state, self.all_cwa_bitsets), None)
+
+    def _expand_game_state(self, qs_dict, game_state: Game_State, search_context):
+        """
+        The iterative search's hook for the part of _calculate_best_move that gets a game state's moves, once the game state is known to need searching.
+
+        Returns
+        -------
+        (qs_dict, move_generator, search_context)
+            qs_dict and search_context are what to search the game states below `game_state` with.
+        """
+        if game_state.proposal_used_this_round is None:
+            qs_dict = self._full_filter(qs_dict, game_state.cwa_set)
+        return (qs_dict, self.get_and_apply_moves(game_state, qs_dict), None)
+
+    def _full_filter(self, qs_dict, current_cwa_set):
+        """
+        Return solver_utils.full_filter(qs_dict, current_cwa_set), from self.qs_dict_memo if it's there (only Query_Dicts are memoized).
+        """
+        if (self.qs_dict_memo is None) or (type(qs_dict) is not query_table.Query_Dict):
+            return solver_utils.full_filter(qs_dict, current_cwa_set)
+        key = self.qs_dict_memo.key(qs_dict, current_cwa_set)
+        filtered_qs_dict = self.qs_dict_memo.get(key)
+        if filtered_qs_dict is None:
+            filtered_qs_dict = solver_utils.full_filter(qs_dict, current_cwa_set)
+            self.qs_dict_memo.put(key, filtered_qs_dict)
+        return filtered_qs_dict
+
+    def solve(self, num_processes=None, time_budget=None, checkpoint_f_name=None, resume=False):
         """
-        Sets up evaluations_cache with the evaluations of all necessary game states.
+        Sets up evaluations_cache with the evaluations of all necessary game states. If `num_processes` (default config.NUM_PROCESSES) is greater than 1, the search is spread across that many worker processes; the result is the same.
+        If `time_budget` is not None, the search stops after about that many seconds, in this process only, and keeps the best policy it has found so far (see _anytime_search). self.proven_optimal says whether that policy is optimal.
+        If `checkpoint_f_name` is not None, the search writes what it has done to that file every config.CHECKPOINT_SECONDS (see solver_checkpoint), and if `resume`, it starts from what the file already has. The file is deleted once the search finishes, unless it ran out of time, so that a later solve can resume it.
         """
+        if num_processes is None:
+            num_processes = config.NUM_PROCESSES
+        parallel = ((num_processes > 1) and self.parallel_search_supported and (time_budget is None))
+        start = time.time()
+        if checkpoint_f_name is not None:
+            self._start_checkpointing(checkpoint_f_name, resume, write_checkpoints=not(parallel))
         if self.num_concurrent_tasks:
             progress.start()
-        start = time.time()
-        self._calculate_best_move(qs_dict = self.qs_dict, game_state = self.initial_game_state)
+        fallback_moves = None
+        if ((time_budget is not None) and self.anytime_search_supported):
+            fallback_moves = self._anytime_search(self.initial_game_state, start + time_budget)
+        elif parallel:
+            from . import solver_parallel
+            solver_parallel.parallel_calculate_best_move(self, num_processes, self.parallel_split_depth)
+        else:
+            self._search(qs_dict = self.qs_dict, game_state = self.initial_game_state)
         if self.num_concurrent_tasks:
             progress.stop()
+        self.proven_optimal = (fallback_moves is None)
+        if checkpoint_f_name is not None:
+            self._stop_checkpointing(keep_file=not(self.proven_optimal))
         print("Cleaning up evaluations dictionary . . .")
-        filtered_cache = self._filter_cache()
+        if self.proven_optimal:
+            filtered_cache = self._filter_cache()
+        else:
+            filtered_cache = self._filter_anytime_cache(fallback_moves)
         end = time.time()
         self.seconds_to_solve = int(end - start)
+        self.evaluations_cache_stats = self._evaluations_cache.stats()
+        if self.qs_dict_memo is not None:
+            self.qs_dict_memo_stats = self.qs_dict_memo.stats()
+            self.qs_dict_memo.clear() # so that it isn't pickled with the solver.
+        if self.canonical_form_cache is not None:
+            self.canonical_form_cache_stats = self.canonical_form_cache.stats()
+            self.canonical_form_cache.clear()
         self.post_solve_printing()
+        self._evaluations_cache.close()
         self._evaluations_cache = filtered_cache
         self.expected_cost = self.get_move_mcost_gs_ncost_from_cache(self.initial_game_state, ((0,0),))[-1]
+        if not self.proven_optimal:
+            console.print(f"Ran out of time. Best expected cost found: {self.expected_cost}. Not proven optimal.")
+
+    def _start_checkpointing(self, checkpoint_f_name, resume, write_checkpoints):
+        """
+        If `resume` and the checkpoint file `checkpoint_f_name` exists, load it into the evaluations_cache; otherwise start a new one, after moving any file already there aside (see solver_checkpoint.move_aside) so that its progress isn't lost. If `write_checkpoints`, have the search append to the file every config.CHECKPOINT_SECONDS.
+        """
+        from . import solver_checkpoint
+        if os.path.exists(checkpoint_f_name):
+            if resume:
+                console.print(f"Resuming from checkpoint {checkpoint_f_name} . . .")
+                self.num_pruned_subtrees = solver_checkpoint.read_checkpoint(
+                    checkpoint_f_name, self.problem, self._evaluations_cache
+                )
+                console.print(f"Loaded {len(self._evaluations_cache):,} game states.")
+            else:
+                moved_f_name = solver_checkpoint.move_aside(checkpoint_f_name)
+                console.print(
+                    f"[bold red]WARNING[/bold red]: not resuming, so moved the existing checkpoint {checkpoint_f_name} to {moved_f_name}. To continue from it instead, move it back and solve with --resume. Delete it if you don't need it.",
+                    highlight=False
+                )
+        elif resume:
+            console.print(f"There is no checkpoint {checkpoint_f_name} to resume from. Starting from scratch.")
+        self.checkpoint_cache_mark = self._evaluations_cache.mark()
+        if write_checkpoints:
+            self.checkpoint_f_name = checkpoint_f_name
+            self.next_checkpoint_time = time.time() + config.CHECKPOINT_SECONDS
+            self._update_search_deadline()
+
+    def _write_checkpoint(self):
+        """ Append everything the evaluations_cache got since the last checkpoint to the checkpoint file. """
+        from . import solver_checkpoint
+        self.checkpoint_cache_mark = solver_checkpoint.append_segment(
+            self.checkpoint_f_name,
+            self.problem,
+            self.num_pruned_subtrees,
+            self._evaluations_cache,
+            self.checkpoint_cache_mark,
+        )
+
+    def _stop_checkpointing(self, keep_file):
+        """
+        Stop writing checkpoints. If `keep_file`, write one last checkpoint so the file has the whole search; otherwise delete the file.
+        """
+        if self.checkpoint_f_name is not None:
+            if keep_file:
+                self._write_checkpoint()
+            elif os.path.exists(self.checkpoint_f_name):
+                os.remove(self.checkpoint_f_name)
+        self.checkpoint_f_name = None
+        self.next_checkpoint_time = None
+        self._update_search_deadline()
+
+    def _update_search_deadline(self):
+        deadlines = [t for t in (self.time_budget_deadline, self.next_checkpoint_time) if (t is not None)]
+        self.search_deadline = min(deadlines) if deadlines else None
+
+    def _search_deadline_passed(self):
+        """
+        Called by tasks_initialize once time.time() passes self.search_deadline. Raises _Out_Of_Time if the time budget has run out; otherwise, it is time to write a checkpoint.
+        """
+        now = time.time()
+        if ((self.time_budget_deadline is not None) and (now > self.time_budget_deadline)):
+            raise _Out_Of_Time()
+        self._write_checkpoint()
+        self.next_checkpoint_time = time.time() + config.CHECKPOINT_SECONDS
+        self._update_search_deadline()
+
+    def _anytime_search(self, first_working_gs: Game_State, deadline):
+        """
+        Search the game tree under `first_working_gs` until time.time() passes `deadline` (never, if it is None). First make the capitulate policy (see solver_capitulate), then search the game states of that policy exactly, smallest subtrees first, so that each search can use the evaluations of the ones before it. The last game state searched is `first_working_gs`.
+
+        Returns
+        -------
+        None if `first_working_gs` was searched in time, so the evaluations_cache has all of its game tree. Otherwise, fallback_moves: a dict of working game state : capitulate move, for every game state in the capitulate policy. See _filter_anytime_cache.
+        """
+        from .solver_capitulate import choose_best_move_depth_one
+        fallback_moves = dict()
+        policy_game_states = [] # every game state comes before all the game states under it.
+        stack = [first_working_gs]
+        while stack:
+            gs = stack.pop()
+            if ((gs in fallback_moves) or one_answer_left(self.full_cwas_list, gs.cwa_set)):
+                continue
+            move_infos = list(Solver.get_and_apply_moves(gs, self.qs_dict, force_set_intersect=True))
+            if not move_infos:
+                new_gs = Game_State(num_queries_this_round=0, proposal_used_this_round=None, cwa_set=gs.cwa_set)
+                move_infos = list(Solver.get_and_apply_moves(new_gs, self.qs_dict, force_set_intersect=True))
+            (best_move, best_mcost, best_gs_tup, best_expected_result) = choose_best_move_depth_one(
+                self._num_answers, move_infos
+            )
+            fallback_moves[gs] = best_move
+            policy_game_states.append(gs)
+            stack.append(best_gs_tup[0])
+            stack.append(best_gs_tup[1])
+        self.time_budget_deadline = deadline
+        self._update_search_deadline()
+        try:
+            for gs in reversed(policy_game_states):
+                self._filter_calculate_best_move(gs)
+        except _Out_Of_Time:
+            return fallback_moves
+        finally:
+            self.time_budget_deadline = None
+            self._update_search_deadline()
+        return None
+
+    def solve_game_state(self, working_gs: Game_State, time_budget=None):
+        """
+        Search only the game tree under `working_gs`, reusing and adding to whatever the evaluations_cache already has, for at most about `time_budget` seconds if it is not None (see _anytime_search). Unlike solve(), this leaves the evaluations_cache unfiltered, so it can be called on one game state after another, as controller.play_from_solver does when playing lazily. Sets self.proven_optimal for `working_gs`.
+
+        Returns
+        -------
+        (best_move, best_move_cost, gs_tuple, node_evaluation), like get_move_mcost_gs_ncost_from_cache.
+        """
+        if self.num_concurrent_tasks:
+            progress.start()
+        deadline = None if (time_budget is None) else (time.time() + time_budget)
+        fallback_moves = self._anytime_search(working_gs, deadline)
+        if self.num_concurrent_tasks:
+            progress.stop()
+        self.proven_optimal = (fallback_moves is None)
+        filtered_cache = dict()
+        self._fill_anytime_cache(working_gs, fallback_moves or dict(), filtered_cache)
+        cache_gs = self._easy_working_gs_to_cache_gs(working_gs)
+        (best_move, node_evaluation) = filtered_cache[
+            cache_gs if self.put_cache_gs_in_new_ev_cache else working_gs
+        ]
+        best_mcost = ((Solver.does_move_cost_round(best_move, working_gs)), 1)
+        return (best_move, best_mcost, self.apply_move_to_state(best_move, working_gs), node_evaluation)
+
+    def _filter_anytime_cache(self, fallback_moves):
+        """
+        Return a filtered cache (see _filter_cache) for the policy that plays the best moves in every game state that has an exact evaluation in the evaluations_cache, and the `fallback_moves` everywhere else. The costs in it are the costs of that policy.
+        """
+        filtered_cache = dict()
+        self._fill_anytime_cache(self.initial_game_state, fallback_moves, filtered_cache)
+        self.validate_filtered_cache(filtered_cache, alternate_first_state=None)
+        return filtered_cache
+
+    def _fill_anytime_cache(self, working_gs: Game_State, fallback_moves, filtered_cache):
+        """
+        Put the entries for `working_gs` and the game states under it into `filtered_cache`, and return its cost. Helps _filter_anytime_cache.
+        """
+        if one_answer_left(self.full_cwas_list, working_gs.cwa_set):
+            return Solver.double_zero
+        cache_gs = self._easy_working_gs_to_cache_gs(working_gs)
+        gs_to_put_in_cache = cache_gs if self.put_cache_gs_in_new_ev_cache else working_gs
+        if gs_to_put_in_cache not in filtered_cache:
+            evaluation = self._evaluations_cache.get(cache_gs)
+            if ((evaluation is not None) and (type(evaluation) is not Cost_Bounds)):
+                self._filter_cache_from(working_gs, filtered_cache)
+            else:
+                best_move = fallback_moves[working_gs]
+                (gs_false, gs_true) = self.apply_move_to_state(best_move, working_gs)
+                p_true = solver_utils.cwa_set_len(gs_true.cwa_set) / solver_utils.cwa_set_len(working_gs.cwa_set)
+                gss_costs = (
+                    self._fill_anytime_cache(gs_false, fallback_moves, filtered_cache),
+                    self._fill_anytime_cache(gs_true, fallback_moves, filtered_cache),
+                )
+                mcost = (int(Solver.does_move_cost_round(best_move, working_gs)), 1)
+                cost = solver_utils.calculate_expected_cost(mcost, (1 - p_true, p_true), gss_costs)
+                filtered_cache[gs_to_put_in_cache] = (best_move, cost)
+        return filtered_cache[gs_to_put_in_cache][-1]
 
     def post_solve_printing(self):
         """
@@ -481,8 +967,17 @@ class Solver:
             print("Calculating post-solve debug information.")
             gs: Game_State
             num_begin_round_states = 0
-            for gs in self._evaluations_cache:
+            for cache_key in self._evaluations_cache:
+                gs = solver_utils.unpack_cache_key(cache_key)
                 num_begin_round_states += (gs.proposal_used_this_round is None)
+            print(f"Number of pruned subtrees: {self.num_pruned_subtrees:,}")
+            print(stats_str(self.evaluations_cache_stats))
+            if self.qs_dict_memo_stats is not None:
+                print(query_table.memo_stats_str(self.qs_dict_memo_stats))
+            if self.canonical_form_cache_stats is not None:
+                print(query_table.memo_stats_str(self.canonical_form_cache_stats, "Canonical form cache"))
+            if self.search_engine == "iterative":
+                print(f"Max search stack depth: {self.max_search_stack_depth:,}")
             print(f"Number of begin round states: {num_begin_round_states:,}")
             print(f"Total number of states: {len(self._evaluations_cache):,}")
             if len(self._evaluations_cache):
@@ -565,11 +1060,12 @@ class Solver:
         # not nightmare mode
         return( (a, unique_id_in_c_tup) )
     def full_cwa_list_from_cwa_set(self, working_cwa_set):
-        # cwa_set representation_change
         """
         Given a working_cwa_set, return a list of the complete cwas in it. They are sorted in a consistent order.
         """
-        full_cwa_list = [self.full_cwas_list[cwa_index] for cwa_index in working_cwa_set]
+        full_cwa_list = [
+            self.full_cwas_list[cwa_index] for cwa_index in solver_utils.cwa_set_indexes(working_cwa_set)
+        ]
         # sort the list in a consistent way so that printouts when debugging are consistent.
         full_cwa_list.sort(key=self.default_cwa_sort_key)
         return(full_cwa_list)
@@ -594,14 +1090,13 @@ class Solver:
         -------
         A cwa_set that could be used to construct another working game state.
         """
-        # working cwa_set representation_change
         return(gs_cwa_set & q_info_cwa_set)
 
     def print_cache_by_size(self):
         #TODO cache_gs: reconsider this function entirely in light of cache bitsets.
         for gs in self._evaluations_cache:
             break
-        if type(gs.cwa_set) is not frozenset:
+        if self.bitset_type is not set: # then the cache cwa_sets are bitsets, not working cwa_sets.
             console.print(
                 f"print_cache_by_size not implemented for cache cwa sets of type {type(gs.cwa_set)}. Skipping."
             )
@@ -610,7 +1105,7 @@ class Solver:
         console.print(f"\nNumber of game states in evaluations cache by size:", justify="center")
         l = [0] * (len(self.full_cwas_list))
         for gs in self._evaluations_cache:
-            l[len(gs.cwa_set) - 1] += 1
+            l[solver_utils.cwa_set_len(gs.cwa_set) - 1] += 1
         for (size, num) in enumerate(l, start=1):
             console.print(f"{size:>{4},}: {num:>{len(f'{max(l):,}')},}", justify="center")
         console.rule()
@@ -664,7 +1159,15 @@ class Solver:
         Return a new cache that *only* contains the information needed to play the problem perfectly. Useful because pickling is very slow. The current evaluations cache does not contain best moves, only cache states and their evaluations. Therefore, this filter cache will reconstruct the best moves from the evaluations.
         """
         filtered_cache = dict()
-        stack : list[Game_State] = [self.initial_game_state]
+        self._filter_cache_from(self.initial_game_state, filtered_cache)
+        self.validate_filtered_cache(filtered_cache, alternate_first_state=None)
+        return filtered_cache
+
+    def _filter_cache_from(self, first_working_gs: Game_State, filtered_cache):
+        """
+        Put the entries for the best game tree under `first_working_gs` into `filtered_cache`. Helps _filter_cache.
+        """
+        stack : list[Game_State] = [first_working_gs]
         while stack:
             curr_working_gs = stack.pop()
             curr_cache_gs = self._easy_working_gs_to_cache_gs(curr_working_gs)
@@ -675,11 +1178,9 @@ class Solver:
             ):
                 continue
             self.handle_state(curr_working_gs, curr_cache_gs, gs_to_put_in_cache, stack, filtered_cache)
-        self.validate_filtered_cache(filtered_cache, alternate_first_state=None)
-        return filtered_cache
 
     def _filter_calculate_best_move(self, curr_working_gs):
-        return self._calculate_best_move(
+        return self._search(
             qs_dict=self.qs_dict,
             game_state=curr_working_gs,
             depth=0
@@ -696,29 +1197,42 @@ class Solver:
     def handle_state(self, curr_working_gs, curr_cache_gs, gs_to_put_in_cache, stack, new_ev_cache):
         if not self.exist_moves(curr_working_gs):
             if curr_cache_gs not in self._evaluations_cache:
-                message = (
-                    "The following game state should be on the path of the best game tree, but it is not present in the evaluations_cache. Note: Change this if using a 'light' cache."
-                )
-                self._filter_cache_error_show(curr_working_gs, curr_cache_gs, message)
-            del self._evaluations_cache[curr_cache_gs] # don't del if not present in light cache
-            curr_cache_gs = Game_State(
+                if not self._evaluations_cache.num_evictions:
+                    message = (
+                        "The following game state should be on the path of the best game tree, but it is not present in the evaluations_cache. Note: Change this if using a 'light' cache."
+                    )
+                    self._filter_cache_error_show(curr_working_gs, curr_cache_gs, message)
+            else:
+                del self._evaluations_cache[curr_cache_gs]
+            curr_cache_gs = self._easy_working_gs_to_cache_gs(Game_State(
                 proposal_used_this_round=None,
                 num_queries_this_round=0,
-                cwa_set=curr_cache_gs.cwa_set
-            )
+                cwa_set=curr_working_gs.cwa_set
+            ))
         self._handle_state_helper(curr_working_gs, curr_cache_gs, gs_to_put_in_cache, stack, new_ev_cache)
 
     def _handle_state_helper(self, curr_working_gs, curr_cache_gs, gs_to_put_in_cache, stack, new_ev_cache):
-            previous_gs_evaluation_result = self._evaluations_cache.get(curr_cache_gs)
-            if previous_gs_evaluation_result is None:
-                message = (
-                    "The following game state should be on the path of the best game tree, but it is not present in the evaluations_cache. Note: Change this if using a 'light' cache."
-                )
+            previous_gs_evaluation_result = self._evaluations_cache.pop(curr_cache_gs, None)
+            # Once entries have been evicted, the state may have been evicted, or evicted and then only searched with a
+            # cutoff since. Either way, it is recomputed below.
+            if (
+                (previous_gs_evaluation_result is None) or (type(previous_gs_evaluation_result) is Cost_Bounds)
+            ) and (not self._evaluations_cache.num_evictions):
+                if previous_gs_evaluation_result is None:
+                    message = (
+                        "The following game state should be on the path of the best game tree, but it is not present in the evaluations_cache. Note: Change this if using a 'light' cache."
+                    )
+                else:
+                    message = (
+                        "The following game state should be on the path of the best game tree, but the evaluations_cache only has bounds on its cost, not its exact cost."
+                    )
                 self._filter_cache_error_show(curr_working_gs, curr_cache_gs, message)
-            del self._evaluations_cache[curr_cache_gs] # don't del if not present in light cache
             current_gs_eval = self._filter_calculate_best_move(curr_working_gs)
             # NOTE: may need to use floating point 'equal' here
-            if (current_gs_eval != previous_gs_evaluation_result):
+            if (
+                (type(previous_gs_evaluation_result) is tuple) and
+                (current_gs_eval != previous_gs_evaluation_result)
+            ):
                 console.print("current_gs_eval:", current_gs_eval)
                 console.print("previous_gs_eval:", previous_gs_evaluation_result)
                 console.print(
@@ -760,8 +1274,8 @@ class Solver:
         cache_gs = self._easy_working_gs_to_cache_gs(gs) if self.put_cache_gs_in_new_ev_cache else gs
         (best_move, purported_cost) = fcache.get(cache_gs, (None, Solver.double_inf))
         (gs_false, gs_true) = self.apply_move_to_state(best_move, gs)
-        gsf_prob = len(gs_false.cwa_set) / len(gs.cwa_set)
-        gst_prob = len(gs_true.cwa_set) / len(gs.cwa_set)
+        gsf_prob = solver_utils.cwa_set_len(gs_false.cwa_set) / solver_utils.cwa_set_len(gs.cwa_set)
+        gst_prob = solver_utils.cwa_set_len(gs_true.cwa_set) / solver_utils.cwa_set_len(gs.cwa_set)
         p_tup = (gsf_prob, gst_prob)
         fcost = self.validate_fcache_helper(fcache, gs_false)
         tcost = self.validate_fcache_helper(fcache, gs_true)
@@ -1,40 +1,45 @@
 from .solver import *
 
-def fset_answers_from_cwa_set(all_cwas, cwa_set):
-    # cwa_set representation_change TODO!!
-    return(frozenset([all_cwas[cwa][-1] for cwa in cwa_set]))
+def choose_best_move_depth_one(num_answers, move_infos:list):
+    """
+    Return (best_move, best_mcost, best_gs_tup, best_expected_result) for the move in `move_infos` that leaves the fewest (expected answers, expected combos). `num_answers` is a function from a working cwa_set to the number of distinct answers in it (e.g. Solver._num_answers). Also used by Solver to seed its anytime search.
+    """
+    best_expected_result = Solver.initial_best_cost # number of answers left, number of combos left.
+    for(move, mcost, gs_tuple, p_tuple) in move_infos:
+        (p_false, p_true) = p_tuple
+        (gs_false_answers_left, gs_true_answers_left) = [
+            num_answers(gs.cwa_set) for gs in gs_tuple
+        ]
+        (gs_false_combos_left, gs_true_combos_left) = [
+            solver_utils.cwa_set_len(gs.cwa_set) for gs in gs_tuple
+        ]
+        expected_answers_left = (p_false * gs_false_answers_left) + (p_true * gs_true_answers_left)
+        expected_combos_left = (p_false * gs_false_combos_left) + (p_true * gs_true_combos_left)
+        expected_result = (expected_answers_left, expected_combos_left)
+        if(expected_result < best_expected_result):
+            best_expected_result = expected_result
+            best_move = move
+            best_mcost = mcost
+            best_gs_tup = gs_tuple
+    answer = (best_move, best_mcost, best_gs_tup, best_expected_result)
+    return answer
 
 class Solver_Capitulate(Solver):
+    parallel_search_supported = False # capitulation is a greedy search; there is nothing to spread out.
+    anytime_search_supported  = False # capitulation is already fast.
+    evictable_cache_supported = False # the capitulate cache holds the whole policy, not evaluations to recompute.
+    array_costs_supported     = False # the capitulate cache holds (best_move, cost) tuples, not costs.
     def __init__(self, problem: Problem):
         Solver.__init__(self, problem)
         self.num_concurrent_tasks = 0
         self.convert_working_gs_to_cache_gs = solver_utils._do_not_convert_gs
 
     def _choose_best_move_depth_one(self, move_infos:list):
-        # cwa_set representation_change TODO!!
-        best_expected_result = Solver.initial_best_cost # number of answers left, number of combos left.
-        for(move, mcost, gs_tuple, p_tuple) in move_infos:
-            (p_false, p_true) = p_tuple
-            (gs_false_answers_left, gs_true_answers_left) = [
-                len(fset_answers_from_cwa_set(self.full_cwas_list, gs.cwa_set)) for gs in gs_tuple
-            ]
-            (gs_false_combos_left, gs_true_combos_left) = [
-                len(gs.cwa_set) for gs in gs_tuple
-            ]
-            expected_answers_left = (p_false * gs_false_answers_left) + (p_true * gs_true_answers_left)
-            expected_combos_left = (p_false * gs_false_combos_left) + (p_true * gs_true_combos_left)
-            expected_result = (expected_answers_left, expected_combos_left)
-            if(expected_result < best_expected_result):
-                best_expected_result = expected_result
-                best_move = move
-                best_mcost = mcost
-                best_gs_tup = gs_tuple
-        answer = (best_move, best_mcost, best_gs_tup, best_expected_result)
-        return answer
+        return choose_best_move_depth_one(self._num_answers, move_infos)
 
     # NOTE: calculate_best_move must be able to be started with
-    #       calculate_best_move(self.qs_dict, self.initial_game_state)
-    def _calculate_best_move(self, qs_dict, game_state):
+    #       calculate_best_move(self.qs_dict, self.initial_game_state, depth=0), as Solver._search does.
+    def _calculate_best_move(self, qs_dict, game_state, depth=0):
         """ A capitulation """
         stack = [game_state]
         while stack:
@@ -71,8 +76,8 @@ class Solver_Capitulate(Solver):
             exit()
         (best_move, answer_combo_cost) = self._evaluations_cache[game_state]
         (gs_false, gs_true) = self.apply_move_to_state(best_move, game_state)
-        p_false = len(gs_false.cwa_set) / len(game_state.cwa_set)
-        p_true = len(gs_true.cwa_set) / len(game_state.cwa_set)
+        p_false = solver_utils.cwa_set_len(gs_false.cwa_set) / solver_utils.cwa_set_len(game_state.cwa_set)
+        p_true = solver_utils.cwa_set_len(gs_true.cwa_set) / solver_utils.cwa_set_len(game_state.cwa_set)
         (_, cost_false) = self._calculate_actual_expected_for_capitulation(gs_false, new_ev_cache)
         (_, cost_true) = self._calculate_actual_expected_for_capitulation(gs_true, new_ev_cache)
         move_cost = (Solver.does_move_cost_round(best_move, game_state), 1)
@@ -0,0 +1,57 @@
+import os, pickle, time
+
+# A checkpoint file is a sequence of pickled segments, each one a tuple of
+# (problem, num_pruned_subtrees, new_cache_entries)
+# where new_cache_entries is a list of the (cache_game_state, evaluation) pairs the search added to the evaluations_cache
+# or changed in it since the segment before. Segments are only ever appended, so writing a checkpoint costs time
+# proportional to how much the search did since the last one, not to the size of the whole cache. Reading the
+# segments in order leaves each game state with the evaluation of the last segment it is in.
+
+def append_segment(f_name, problem, num_pruned_subtrees, evaluations_cache, mark):
+    """
+    Append a segment to the checkpoint file `f_name` with the entries set in the Evaluations_Cache `evaluations_cache` since `mark` (see Evaluations_Cache.new_entries), including those whose evaluation changed, such as a Cost_Bounds replaced by the exact cost. Returns a new mark, to give as `mark` next time.
+    """
+    new_cache_entries = evaluations_cache.new_entries(mark)
+    directory = os.path.dirname(f_name)
+    if(directory and not os.path.exists(directory)):
+        os.makedirs(directory)
+    with open(f_name, 'ab') as f:
+        pickle.dump((problem, num_pruned_subtrees, new_cache_entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    return evaluations_cache.mark()
+
+def read_checkpoint(f_name, problem, evaluations_cache):
+    """
+    Read the checkpoint file `f_name`, which must have been written while solving `problem`, into `evaluations_cache`. A last segment that was cut short (e.g. because the process was killed while writing it) is ignored.
+
+    Returns
+    -------
+    num_pruned_subtrees
+    """
+    num_pruned_subtrees = 0
+    with open(f_name, 'rb') as f:
+        while True:
+            try:
+                (segment_problem, num_pruned_subtrees, new_cache_entries) = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            if(segment_problem != problem):
+                raise ValueError(
+                    f"Checkpoint file {f_name} was written for problem {segment_problem}, not {problem}."
+                )
+            for (cache_game_state, evaluation) in new_cache_entries:
+                evaluations_cache[cache_game_state] = evaluation # not update(), so the cache stays within its budget.
+    return num_pruned_subtrees
+
+def move_aside(f_name):
+    """
+    Rename the checkpoint file `f_name` to a name no file has yet, f"{f_name}.{date and time}.old", so that a new search doesn't write over it. Returns the new name.
+    """
+    moved_f_name = f"{f_name}.{time.strftime('%Y-%m-%d_%H-%M-%S')}.old"
+    num_tries = 1
+    while os.path.exists(moved_f_name):
+        num_tries += 1
+        moved_f_name = f"{f_name}.{time.strftime('%Y-%m-%d_%H-%M-%S')}_{num_tries}.old"
+    os.rename(f_name, moved_f_name)
+    return moved_f_name
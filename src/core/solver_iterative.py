@@ -0,0 +1,206 @@
+from . import config
+from .solver import Solver, Game_State, Cost_Bounds, one_answer_left, progress
+
+# Profiling hooks. Each hook is called with the current search stack depth every time the iterative search pushes a
+# frame. Kept here rather than on the solver so that solvers stay picklable.
+stack_depth_hooks = []
+
+def add_stack_depth_hook(hook):
+    """ Have `hook(stack_depth)` called every time the iterative search pushes a frame. """
+    stack_depth_hooks.append(hook)
+
+def remove_stack_depth_hook(hook):
+    stack_depth_hooks.remove(hook)
+
+# What a frame on the stack is waiting for.
+_NEXT_MOVE        = 0 # nothing; look at the next move.
+_AWAIT_FALSE      = 1 # the cost of the current move's false game state.
+_AWAIT_TRUE       = 2 # the cost of the current move's true game state.
+_AWAIT_NEW_ROUND  = 3 # the cost of the same game state with a new round started, because there were no moves.
+
+class _Frame:
+    """
+    The local variables of one Solver._calculate_best_move call, kept on an explicit stack instead of Python's.
+    """
+    __slots__ = (
+        "qs_dict",
+        "game_state",
+        "depth",
+        "cutoff",
+        "search_context",
+        "cache_game_state",
+        "previous_bounds",
+        "move_iterator",
+        "best_node_cost",
+        "prune_cost",
+        "best_move",
+        "any_moves",
+        "found_moves",
+        "answer_counts",
+        "phase",
+        "move_info",
+        "gs_true_lower_bound",
+        "child_cutoff",
+        "gs_false_node_cost",
+    )
+
+def iterative_calculate_best_move(s, qs_dict, game_state: Game_State, depth=0, cutoff=None, search_context=None):
+    """
+    Do exactly what `s._calculate_best_move` does, with the same cache entries, pruning, progress updates, and best_move, but with an explicit stack of _Frames instead of recursion, so there is no Python frame overhead per game state and no recursion limit. The solver's _enter_game_state and _expand_game_state hooks do the parts that differ between solvers, and `search_context` is whatever extra state those hooks pass from a game state to the game states below it (see Solver._search_context).
+
+    Records the deepest the stack got in s.max_search_stack_depth, and calls the stack_depth_hooks.
+
+    Returns
+    -------
+    The cost of `game_state`, just like _calculate_best_move.
+    """
+    evaluations_cache = s._evaluations_cache
+    full_cwas_list = s.full_cwas_list
+    cost_calculator = s._cost_calculator
+    use_lower_bounds = s.use_lower_bound_pruning
+    num_concurrent_tasks = s.num_concurrent_tasks
+    depth_to_tasks_l = s.depth_to_tasks_l
+    initial_best_cost = Solver.initial_best_cost
+    hooks = stack_depth_hooks
+    stack = []
+    max_stack_depth = s.max_search_stack_depth
+    call = (qs_dict, game_state, depth, cutoff, search_context)
+    node_cost = None
+    while True:
+        if call is not None:
+            # Enter a game state: the part of _calculate_best_move before its move loop.
+            (qs_dict, game_state, depth, cutoff, search_context) = call
+            call = None
+            (cache_game_state, search_context) = s._enter_game_state(game_state, search_context)
+            result = evaluations_cache.get(cache_game_state, None)
+            node_cost = None
+            if (
+                (result is not None) and
+                ((type(result) is not Cost_Bounds) or ((cutoff is not None) and (result.lower >= cutoff)))
+            ):
+                node_cost = result
+            elif one_answer_left(full_cwas_list, game_state.cwa_set):
+                if config.CACHE_END_STATES:
+                    evaluations_cache[cache_game_state] = Solver.double_zero
+                node_cost = Solver.double_zero
+            elif s._trivially_cut_off(game_state, cutoff):
+                node_cost = s._store_cost_bounds(cache_game_state, cutoff, initial_best_cost, result)
+            if node_cost is None:
+                f = _Frame()
+                (f.qs_dict, move_generator, f.search_context) = s._expand_game_state(
+                    qs_dict, game_state, search_context
+                )
+                f.game_state = game_state
+                f.depth = depth
+                f.cutoff = cutoff
+                f.cache_game_state = cache_game_state
+                f.previous_bounds = result
+                f.move_iterator = iter(s.tasks_initialize(depth, s._order_moves(move_generator)))
+                f.best_node_cost = initial_best_cost
+                f.prune_cost = s._initial_prune_cost(cutoff, result)
+                f.best_move = None
+                f.any_moves = False
+                f.found_moves = False
+                f.answer_counts = None
+                f.phase = _NEXT_MOVE
+                stack.append(f)
+                if len(stack) > max_stack_depth:
+                    max_stack_depth = len(stack)
+                for hook in hooks:
+                    hook(len(stack))
+        if not stack:
+            s.max_search_stack_depth = max_stack_depth
+            return node_cost
+        # Give node_cost to the frame on top of the stack, and carry on with its move loop.
+        f = stack[-1]
+        phase = f.phase
+        done = False
+        if phase == _AWAIT_FALSE:
+            (move, mcost, gs_tup, p_tup) = f.move_info
+            prune_cost = f.prune_cost
+            gs_true_lower_bound = f.gs_true_lower_bound
+            if (
+                s._is_cut_off(node_cost, f.child_cutoff) or
+                (cost_calculator(mcost, p_tup, (node_cost, (0, 0))) >= prune_cost) or
+                (
+                    (gs_true_lower_bound is not None) and
+                    s._lower_bound_rules_out(f.move_info, (node_cost, gs_true_lower_bound), prune_cost)
+                )
+            ):
+                s.num_pruned_subtrees += 1
+                if f.depth < num_concurrent_tasks:
+                    progress.update(depth_to_tasks_l[f.depth], advance=1)
+            else:
+                f.gs_false_node_cost = node_cost
+                f.child_cutoff = s._child_cutoff(prune_cost, mcost, p_tup, 1, node_cost)
+                f.phase = _AWAIT_TRUE
+                call = (f.qs_dict, gs_tup[1], f.depth + 1, f.child_cutoff, f.search_context)
+                node_cost = None
+                continue
+        elif phase == _AWAIT_TRUE:
+            (move, mcost, gs_tup, p_tup) = f.move_info
+            if s._is_cut_off(node_cost, f.child_cutoff):
+                if f.depth < num_concurrent_tasks:
+                    progress.update(depth_to_tasks_l[f.depth], advance=1)
+            else:
+                node_cost_tup = cost_calculator(mcost, p_tup, (f.gs_false_node_cost, node_cost))
+                if (node_cost_tup < f.best_node_cost):
+                    f.found_moves = True
+                    f.best_node_cost = node_cost_tup
+                    f.best_move = move
+                    if (node_cost_tup < f.prune_cost):
+                        f.prune_cost = node_cost_tup
+                    if (node_cost_tup == mcost):
+                        done = True
+                if (not done) and (f.depth < num_concurrent_tasks):
+                    progress.update(depth_to_tasks_l[f.depth], advance=1)
+        elif phase == _AWAIT_NEW_ROUND:
+            # This game state costs exactly what the new round game state costs, bounds and all.
+            evaluations_cache[f.cache_game_state] = node_cost
+            stack.pop()
+            continue
+        f.phase = _NEXT_MOVE
+        node_cost = None
+        if not done:
+            for move_info in f.move_iterator:
+                f.any_moves = True
+                (move, mcost, gs_tup, p_tup) = move_info
+                prune_cost = f.prune_cost
+                gs_true_lower_bound = None
+                if (use_lower_bounds and (prune_cost is not initial_best_cost)):
+                    if f.answer_counts is None:
+                        f.answer_counts = s._answer_counts(f.game_state.cwa_set)
+                    (gs_false_lower_bound, gs_true_lower_bound) = s._lower_bound_costs(move_info, f.answer_counts)
+                    if s._lower_bound_rules_out(move_info, (gs_false_lower_bound, gs_true_lower_bound), prune_cost):
+                        s.num_pruned_subtrees += 2
+                        if f.depth < num_concurrent_tasks:
+                            progress.update(depth_to_tasks_l[f.depth], advance=1)
+                        continue
+                f.move_info = move_info
+                f.gs_true_lower_bound = gs_true_lower_bound
+                f.child_cutoff = s._child_cutoff(prune_cost, mcost, p_tup, 0, gs_true_lower_bound)
+                f.phase = _AWAIT_FALSE
+                call = (f.qs_dict, gs_tup[0], f.depth + 1, f.child_cutoff, f.search_context)
+                break
+            if call is not None:
+                continue
+        # The frame's move loop is over.
+        if not f.any_moves:
+            game_state = f.game_state
+            new_gs = Game_State(
+                num_queries_this_round=0,
+                proposal_used_this_round=None,
+                cwa_set=game_state.cwa_set
+            )
+            f.phase = _AWAIT_NEW_ROUND
+            call = (f.qs_dict, new_gs, f.depth + 1, f.cutoff, None)
+            continue
+        stack.pop()
+        cutoff = f.cutoff
+        if ((cutoff is not None) and not(f.best_node_cost < cutoff)):
+            node_cost = s._store_cost_bounds(f.cache_game_state, cutoff, f.best_node_cost, f.previous_bounds)
+            continue
+        if f.found_moves:
+            s.best_move = f.best_move
+        evaluations_cache[f.cache_game_state] = f.best_node_cost
+        node_cost = f.best_node_cost
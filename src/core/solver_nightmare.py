@@ -1,25 +1,20 @@
 import numpy as np
 from .solver import *
+from .canonical_form_cache import Canonical_Form_Cache
 
-def _calculate_minimal_vs_list(num_rcs, game_state: Game_State, full_cwas_list) -> list[set[int]]:
-    # TODO: print this out to make sure it works
-    minimal_vs_list: list[set[int]] = []
-    r_unique_ids_by_verifier = get_set_r_unique_ids_vs_from_cwas_set_representation(
-        full_cwas_list,
-        game_state.cwa_set,
-        num_rcs,
-        n_mode=True,
-    )
-    for v_index in range(num_rcs):
-        for v_set in minimal_vs_list:
-            for arbitrary_v_set_member in v_set:
-                break
-            if(r_unique_ids_by_verifier[v_index] == r_unique_ids_by_verifier[arbitrary_v_set_member]):
-                v_set.add(v_index)
-                break
+def _calculate_minimal_vs_list(cwa_rule_masks, game_state: Game_State) -> list[set[int]]:
+    """
+    Return a list of sets of verifier indexes, where the verifiers in each set have the same possible rules in `game_state`, in order of each set's lowest verifier index. `cwa_rule_masks` is Solver.cwa_rule_masks.
+    """
+    v_set_by_rule_mask = dict() # dicts keep insertion order, so the sets come out in order of their lowest v_index.
+    rule_masks_by_verifier = solver_utils.get_rule_masks_by_verifier(game_state.cwa_set, cwa_rule_masks)
+    for (v_index, rule_mask) in enumerate(rule_masks_by_verifier):
+        v_set = v_set_by_rule_mask.get(rule_mask)
+        if v_set is None:
+            v_set_by_rule_mask[rule_mask] = {v_index}
         else:
-            minimal_vs_list.append(set([v_index]))
-    return minimal_vs_list
+            v_set.add(v_index)
+    return list(v_set_by_rule_mask.values())
 
 
 def testing_stuff(self):
@@ -50,17 +45,20 @@ class Solver_Nightmare(Solver):
         self.int_verifier_bit_mask = (1 << self.num_possible_rules) - 1
         self.shift_amounts = [v_index * self.num_possible_rules for v_index in range(self.num_rcs)]
         self.convert_working_gs_to_cache_gs = solver_utils.get_convert_working_to_cache_gs_nightmare(
-            self.bitset_type
+            self.bitset_type, packed=config.PACKED_CACHE_KEYS
         )
         self.index_function = solver_utils.get_index_function(self.bitset_type)
+        # working cwa_set conversions, shared by every round of the search. See config.CANONICAL_CACHE_MAX_ENTRIES.
+        if config.CANONICAL_CACHE_MAX_ENTRIES:
+            self.canonical_form_cache = Canonical_Form_Cache(config.CANONICAL_CACHE_MAX_ENTRIES)
         # NOTE: below is only for testing purposes.
-        initial_cache_gs = self.convert_working_gs_to_cache_gs(
+        initial_cache_gs = solver_utils.unpack_cache_key(self.convert_working_gs_to_cache_gs(
             self.initial_game_state,
             self.all_cwa_bitsets,
             dict(),
             self.shift_amounts,
             self.int_verifier_bit_mask
-        )[0]
+        )[0])
         initial_bitset_int = solver_utils.bitset_to_int(initial_cache_gs.cwa_set)
         self.max_hex_length = len(hex(initial_bitset_int).upper()[2:])
         self.max_decimal_length = len(f'{initial_bitset_int:,}')
@@ -76,8 +74,7 @@ class Solver_Nightmare(Solver):
             force_set_intersect=False
         ):
         # TODO: step through with a debugger to understand how the minimal vs_list is working.
-        # cwa_set representation_change Will have to implement a function to get length of set
-        num_combos_currently = len(game_state.cwa_set)
+        num_combos_currently = solver_utils.cwa_set_len(game_state.cwa_set)
         if game_state.proposal_used_this_round is None:
             cost = (1, 1)
             next_num_queries = 1
@@ -179,9 +176,10 @@ class Solver_Nightmare(Solver):
         minimal_vs_list: list[set[int]] = None,
         depth = 0,
         working_cwa_set_convert_cache = None,
+        cutoff = None,
     ):
         if game_state.proposal_used_this_round is None:
-            working_cwa_set_convert_cache = dict()
+            working_cwa_set_convert_cache = self._round_convert_cache()
 
         # self.called_calculate += 1
         (cache_game_state, permutation) = self.convert_working_gs_to_cache_gs(
@@ -195,64 +193,101 @@ class Solver_Nightmare(Solver):
         # self._print_canonical_form_info(game_state, cache_game_state, permutation, max_num_forms=500)
         ######################################## DEBUGGING ###################################################
         result = self._evaluations_cache.get(cache_game_state, None)
+        previous_bounds = None
         if result is not None:
             # self.cache_hits += 1
-            return result
+            if (type(result) is not Cost_Bounds) or ((cutoff is not None) and (result.lower >= cutoff)):
+                return result
+            previous_bounds = result
         if one_answer_left(self.full_cwas_list, game_state.cwa_set):
             if config.CACHE_END_STATES:
                 self._evaluations_cache[cache_game_state] = Solver.double_zero
             return Solver.double_zero
+        if self._trivially_cut_off(game_state, cutoff):
+            return self._store_cost_bounds(cache_game_state, cutoff, Solver.initial_best_cost, previous_bounds)
         best_node_cost = Solver.initial_best_cost
+        # Moves are pruned against prune_cost, which is the best node cost so far, or the cutoff if that is lower.
+        prune_cost = self._initial_prune_cost(cutoff, previous_bounds)
         if game_state.proposal_used_this_round is None:
-            minimal_vs_list = _calculate_minimal_vs_list(
-                self.num_rcs, game_state, self.full_cwas_list
-            )
+            minimal_vs_list = _calculate_minimal_vs_list(self.cwa_rule_masks, game_state)
             # WARN: line below is new and not fully tested/stepped through/debugged in nightmare mode.
-            qs_dict = solver_utils.full_filter(qs_dict, game_state.cwa_set) # FILTER
+            qs_dict = self._full_filter(qs_dict, game_state.cwa_set) # FILTER
 
+        any_moves = False
         found_moves = False
         best_move = None
         # moves_list = list(self.get_and_apply_moves(game_state, qs_dict, minimal_vs_list))
         # For testing purposes, make the entire moves_list before examining any moves.
         move_iterable = self.tasks_initialize(
             depth,
-            self.get_and_apply_moves(game_state, qs_dict, minimal_vs_list)
+            self._order_moves(self.get_and_apply_moves(game_state, qs_dict, minimal_vs_list))
         )
+        use_lower_bounds = self.use_lower_bound_pruning
+        answer_counts = None # only counted once there is a best move for the lower bounds to be compared to.
         for move_info in move_iterable:
+            any_moves = True
             (move, mcost, gs_tup, p_tup) = move_info
+            gs_true_lower_bound = None
+            if (use_lower_bounds and (prune_cost is not Solver.initial_best_cost)):
+                if answer_counts is None:
+                    answer_counts = self._answer_counts(game_state.cwa_set)
+                (gs_false_lower_bound, gs_true_lower_bound) = self._lower_bound_costs(move_info, answer_counts)
+                if self._lower_bound_rules_out(move_info, (gs_false_lower_bound, gs_true_lower_bound), prune_cost):
+                    # Even the lower bounds of both nodes make this move not better than the best move.
+                    self.num_pruned_subtrees += 2
+                    if depth < self.num_concurrent_tasks:
+                        progress.update(self.depth_to_tasks_l[depth], advance=1)
+                    continue
+            gs_false_cutoff = self._child_cutoff(prune_cost, mcost, p_tup, 0, gs_true_lower_bound)
             gs_false_node_cost = self._calculate_best_move(
                 qs_dict=qs_dict,
                 game_state=gs_tup[0],
                 minimal_vs_list=minimal_vs_list,
                 depth=depth + 1,
                 working_cwa_set_convert_cache=working_cwa_set_convert_cache,
+                cutoff=gs_false_cutoff,
             )
-            if (self._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) >= best_node_cost):
+            if (
+                self._is_cut_off(gs_false_node_cost, gs_false_cutoff) or
+                (self._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) >= prune_cost) or
+                (
+                    (gs_true_lower_bound is not None) and
+                    self._lower_bound_rules_out(move_info, (gs_false_node_cost, gs_true_lower_bound), prune_cost)
+                )
+            ):
                 # The false node alone would make this move not better than the best move, so don't need to search the true node.
+                self.num_pruned_subtrees += 1
                 if depth < self.num_concurrent_tasks:
                     progress.update(self.depth_to_tasks_l[depth], advance=1)
                 continue
+            gs_true_cutoff = self._child_cutoff(prune_cost, mcost, p_tup, 1, gs_false_node_cost)
             gs_true_node_cost = self._calculate_best_move(
                 qs_dict=qs_dict,
                 game_state=gs_tup[1],
                 minimal_vs_list=minimal_vs_list,
                 depth=depth + 1,
                 working_cwa_set_convert_cache=working_cwa_set_convert_cache,
+                cutoff=gs_true_cutoff,
             )
+            if self._is_cut_off(gs_true_node_cost, gs_true_cutoff):
+                # The true node's search was cut off because this move can't be better than the best move.
+                if depth < self.num_concurrent_tasks:
+                    progress.update(self.depth_to_tasks_l[depth], advance=1)
+                continue
             gss_costs = (gs_false_node_cost, gs_true_node_cost)
             node_cost_tup = self._cost_calculator(mcost, p_tup, gss_costs)
             if(node_cost_tup < best_node_cost):
                 found_moves = True
                 best_node_cost = node_cost_tup
                 best_move = move
+                if (node_cost_tup < prune_cost):
+                    prune_cost = node_cost_tup
                 if(node_cost_tup == mcost):
                     # WARN: be sure not to mix begin-round-early moves w/regular moves for this prune.
                     break
             if depth < self.num_concurrent_tasks:
                 progress.update(self.depth_to_tasks_l[depth], advance=1)
-        if found_moves:
-            self.best_move = best_move
-        else:
+        if not any_moves:
             new_gs = Game_State(
                 num_queries_this_round=0,
                 proposal_used_this_round=None,
@@ -262,11 +297,66 @@ class Solver_Nightmare(Solver):
             best_node_cost = self._calculate_best_move(
                 qs_dict=qs_dict,
                 game_state=new_gs,
-                depth=depth+1
+                depth=depth+1,
+                cutoff=cutoff,
             )
+            # This game state costs exactly what the new round game state costs, bounds and all.
+            self._evaluations_cache[cache_game_state] = best_node_cost
+            return best_node_cost
+        if ((cutoff is not None) and not(best_node_cost < cutoff)):
+            return self._store_cost_bounds(cache_game_state, cutoff, best_node_cost, previous_bounds)
+        if found_moves:
+            self.best_move = best_move
         self._evaluations_cache[cache_game_state] = best_node_cost
         return best_node_cost
 
+    def _get_root_search_info(self):
+        qs_dict = self._full_filter(self.qs_dict, self.initial_game_state.cwa_set)
+        minimal_vs_list = _calculate_minimal_vs_list(self.cwa_rule_masks, self.initial_game_state)
+        move_infos = list(
+            self._order_moves(self.get_and_apply_moves(self.initial_game_state, qs_dict, minimal_vs_list))
+        )
+        search_kwargs = {
+            "minimal_vs_list"               : minimal_vs_list,
+            "working_cwa_set_convert_cache" : self._round_convert_cache(),
+        }
+        return (qs_dict, move_infos, search_kwargs)
+
+    def _round_convert_cache(self):
+        """
+        Return the working_cwa_set_convert_cache for a new round: the solver's canonical_form_cache, or a new dict if there isn't one (so conversions are only kept for the round).
+        """
+        if self.canonical_form_cache is None:
+            return dict()
+        return self.canonical_form_cache
+
+    def _search_context(self, search_kwargs):
+        """
+        The nightmare search context is (minimal_vs_list, working_cwa_set_convert_cache).
+        """
+        return (search_kwargs.get("minimal_vs_list"), search_kwargs.get("working_cwa_set_convert_cache"))
+
+    def _enter_game_state(self, game_state: Game_State, search_context):
+        (minimal_vs_list, working_cwa_set_convert_cache) = (None, None) if (search_context is None) else search_context
+        if game_state.proposal_used_this_round is None:
+            working_cwa_set_convert_cache = self._round_convert_cache()
+        cache_game_state = self.convert_working_gs_to_cache_gs(
+            game_state,
+            self.all_cwa_bitsets,
+            working_cwa_set_convert_cache,
+            self.shift_amounts,
+            self.int_verifier_bit_mask,
+        )[0]
+        return (cache_game_state, (minimal_vs_list, working_cwa_set_convert_cache))
+
+    def _expand_game_state(self, qs_dict, game_state: Game_State, search_context):
+        (minimal_vs_list, working_cwa_set_convert_cache) = search_context
+        if game_state.proposal_used_this_round is None:
+            minimal_vs_list = _calculate_minimal_vs_list(self.cwa_rule_masks, game_state)
+            qs_dict = self._full_filter(qs_dict, game_state.cwa_set)
+        move_generator = self.get_and_apply_moves(game_state, qs_dict, minimal_vs_list)
+        return (qs_dict, move_generator, (minimal_vs_list, working_cwa_set_convert_cache))
+
     def _easy_working_gs_to_cache_gs(self, working_game_state: Game_State):
         """
         A convenience function for converting a `working_game_state` to a cache_game_state (no permutation info needed). This is used by filter_cache.
@@ -291,24 +381,20 @@ class Solver_Nightmare(Solver):
         return self._evaluations_cache.get(working_game_state, default)
 
     def _filter_calculate_best_move(self, curr_working_gs):
-        minimal_vs_list = _calculate_minimal_vs_list(
-            self.num_rcs, curr_working_gs, self.full_cwas_list
-        )
-        return self._calculate_best_move(
+        minimal_vs_list = _calculate_minimal_vs_list(self.cwa_rule_masks, curr_working_gs)
+        return self._search(
             qs_dict=self.qs_dict,
             game_state=curr_working_gs,
             minimal_vs_list=minimal_vs_list,
             depth=0,
-            working_cwa_set_convert_cache=dict()
+            working_cwa_set_convert_cache=self._round_convert_cache()
         )
 
     def exist_moves(self, curr_working_gs):
         """
         Return True if there are any potentially useful moves to be made in this state with the current proposal_used_this_round. If said proposal is none, return True if there are useful moves to be made this round using any proposal.
         """
-        minimal_vs_list = _calculate_minimal_vs_list(
-            self.num_rcs, curr_working_gs, self.full_cwas_list
-        )
+        minimal_vs_list = _calculate_minimal_vs_list(self.cwa_rule_masks, curr_working_gs)
         for mi in self.get_and_apply_moves(
             curr_working_gs,
             self.qs_dict,
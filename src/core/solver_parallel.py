@@ -0,0 +1,262 @@
+import copy, gc, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from . import config
+from .solver import one_answer_left, progress
+from .definitions import Cost_Bounds
+from .evaluations_cache import Evaluations_Cache
+from .query_table import Query_Dict_Memo
+from .canonical_form_cache import Canonical_Form_Cache
+
+# Per-worker globals. Set once by _worker_initialize when each worker process starts, so the solver, the filtered
+# root qs_dict, and the search kwargs only get pickled once per worker rather than once per task.
+_worker_solver = None
+_worker_qs_dict = None
+_worker_search_kwargs = None
+_worker_shared_best = None
+
+def _worker_initialize(worker_solver, qs_dict, search_kwargs, shared_best):
+    global _worker_solver, _worker_qs_dict, _worker_search_kwargs, _worker_shared_best
+    if config.DISABLE_GC:
+        gc.disable()
+    _worker_solver = worker_solver
+    _worker_qs_dict = qs_dict
+    if worker_solver.canonical_form_cache is not None:
+        # search the root's round with the worker's own canonical_form_cache, not an unpickled copy of the parent's.
+        search_kwargs = dict(search_kwargs, working_cwa_set_convert_cache=worker_solver.canonical_form_cache)
+    _worker_search_kwargs = search_kwargs
+    _worker_shared_best = shared_best
+
+def _read_shared_best(shared_best):
+    with shared_best.get_lock():
+        return (shared_best[0], shared_best[1])
+
+def _offer_shared_best(shared_best, node_cost):
+    """ Lower the shared best root cost to `node_cost` if `node_cost` is better than it. """
+    with shared_best.get_lock():
+        if node_cost < (shared_best[0], shared_best[1]):
+            (shared_best[0], shared_best[1]) = node_cost
+
+def _merge_cache_entries(evaluations_cache, new_cache_entries):
+    """
+    Put a worker's `new_cache_entries` into `evaluations_cache`. Exact costs win over Cost_Bounds, and two Cost_Bounds for the same game state are combined into the tighter of each bound.
+    """
+    for (cache_game_state, evaluation) in new_cache_entries:
+        if type(evaluation) is Cost_Bounds:
+            previous_evaluation = evaluations_cache.get(cache_game_state)
+            if previous_evaluation is not None:
+                if type(previous_evaluation) is not Cost_Bounds:
+                    continue
+                evaluation = Cost_Bounds(
+                    lower=max(evaluation.lower, previous_evaluation.lower),
+                    upper=min(evaluation.upper, previous_evaluation.upper),
+                )
+        evaluations_cache[cache_game_state] = evaluation
+
+def _evaluate_root_move(move_info):
+    """
+    Worker task. Evaluate one root move the same way Solver._calculate_best_move would, pruning the true node against the best root cost any worker has found so far.
+
+    Returns
+    -------
+    (node_cost, new_cache_entries, num_pruned_subtrees)
+        node_cost is None if the move was pruned.
+    """
+    s = _worker_solver
+    cache_mark = s._evaluations_cache.mark()
+    num_pruned_subtrees_before = s.num_pruned_subtrees
+    (move, mcost, gs_tup, p_tup) = move_info
+    gs_false_node_cost = s._search(
+        qs_dict=_worker_qs_dict, game_state=gs_tup[0], depth=1, **_worker_search_kwargs
+    )
+    # Strictly greater: the shared best may come from a move later in the serial order, and a move that ties it must
+    # survive so ties are broken the same way the serial search breaks them.
+    if (
+        s._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) >
+        _read_shared_best(_worker_shared_best)
+    ):
+        node_cost = None
+        s.num_pruned_subtrees += 1
+    else:
+        gs_true_node_cost = s._search(
+            qs_dict=_worker_qs_dict, game_state=gs_tup[1], depth=1, **_worker_search_kwargs
+        )
+        node_cost = s._cost_calculator(mcost, p_tup, (gs_false_node_cost, gs_true_node_cost))
+        _offer_shared_best(_worker_shared_best, node_cost)
+    return (
+        node_cost,
+        s._evaluations_cache.new_entries(cache_mark),
+        s.num_pruned_subtrees - num_pruned_subtrees_before,
+    )
+
+def _evaluate_game_state(game_state):
+    """
+    Worker task. Evaluate a game state one move below the root.
+
+    Returns
+    -------
+    (node_cost, new_cache_entries, num_pruned_subtrees)
+    """
+    s = _worker_solver
+    cache_mark = s._evaluations_cache.mark()
+    num_pruned_subtrees_before = s.num_pruned_subtrees
+    node_cost = s._search(
+        qs_dict=_worker_qs_dict, game_state=game_state, depth=1, **_worker_search_kwargs
+    )
+    return (
+        node_cost,
+        s._evaluations_cache.new_entries(cache_mark),
+        s.num_pruned_subtrees - num_pruned_subtrees_before,
+    )
+
+def _make_worker_solver(s):
+    """
+    Return a shallow copy of the solver `s` that is cheap to send to worker processes: it has an empty evaluations cache, qs_dict_memo and canonical_form_cache (with the same budgets as the ones of `s`) and does not draw progress bars.
+    """
+    worker_solver = copy.copy(s)
+    worker_solver._evaluations_cache = Evaluations_Cache(
+        s._evaluations_cache.max_entries,
+        s._evaluations_cache.evict_fraction,
+        s._evaluations_cache.spill_directory,
+        (s._evaluations_cache.cost_array is not None),
+        (s._evaluations_cache.cwa_set_pool is not None),
+    )
+    if s.qs_dict_memo is not None:
+        worker_solver.qs_dict_memo = Query_Dict_Memo(s.qs_dict_memo.max_entries)
+    if s.canonical_form_cache is not None:
+        worker_solver.canonical_form_cache = Canonical_Form_Cache(s.canonical_form_cache.max_entries)
+    worker_solver.num_concurrent_tasks = 0
+    return worker_solver
+
+def _advance_progress(s, total=None, reset=False):
+    """ Advance the depth 0 progress bar by one task, or, if `total` is given, set its total (resetting it if `reset`). """
+    if not s.num_concurrent_tasks:
+        return
+    task_id = s.depth_to_tasks_l[0]
+    if total is None:
+        progress.update(task_id, advance=1)
+    elif reset:
+        progress.reset(task_id, total=total, visible=True)
+    else:
+        progress.update(task_id, total=total)
+
+def _search_root_moves(s, executor, move_infos, shared_best):
+    """
+    One task per root move. Returns (best_move, best_node_cost).
+    """
+    _advance_progress(s, total=len(move_infos), reset=True)
+    futures = [executor.submit(_evaluate_root_move, move_info) for move_info in move_infos]
+    node_costs = []
+    for future in futures:
+        (node_cost, new_cache_entries, num_pruned_subtrees) = future.result()
+        _merge_cache_entries(s._evaluations_cache, new_cache_entries)
+        s.num_pruned_subtrees += num_pruned_subtrees
+        node_costs.append(node_cost)
+        _advance_progress(s)
+    best_node_cost = s.initial_best_cost
+    best_move = None
+    # Go through the moves in the same order the serial search would, so ties are broken the same way.
+    for ((move, mcost, gs_tup, p_tup), node_cost) in zip(move_infos, node_costs):
+        if (node_cost is not None) and (node_cost < best_node_cost):
+            best_node_cost = node_cost
+            best_move = move
+    return (best_move, best_node_cost)
+
+def _search_depth_one_game_states(s, executor, move_infos):
+    """
+    One task per distinct game state one move below the root. The false game states are searched first; a move's true game state is only searched if the false game state alone does not rule the move out. Returns (best_move, best_node_cost).
+    """
+    cache_gs_to_future = dict()
+    merged_futures = set()
+    def submit(game_state):
+        cache_gs = s._easy_working_gs_to_cache_gs(game_state)
+        if cache_gs not in cache_gs_to_future:
+            cache_gs_to_future[cache_gs] = executor.submit(_evaluate_game_state, game_state)
+        return cache_gs_to_future[cache_gs]
+    def node_cost_from_future(future):
+        (node_cost, new_cache_entries, num_pruned_subtrees) = future.result()
+        if future not in merged_futures:
+            merged_futures.add(future)
+            _merge_cache_entries(s._evaluations_cache, new_cache_entries)
+            s.num_pruned_subtrees += num_pruned_subtrees
+            _advance_progress(s)
+        return node_cost
+
+    false_futures = [submit(gs_tup[0]) for (move, mcost, gs_tup, p_tup) in move_infos]
+    _advance_progress(s, total=len(cache_gs_to_future), reset=True)
+    true_futures = [None] * len(move_infos)
+    pruned = [False] * len(move_infos)
+    # As game states finish, keep a running best over the moves whose game states are both known, and only search
+    # the true game states of moves that the running best does not rule out.
+    running_best_cost = s.initial_best_cost
+    move_costs = [None] * len(move_infos)
+    pending = set(false_futures)
+    while pending:
+        pending = wait(pending, return_when=FIRST_COMPLETED).not_done
+        made_progress = True
+        while made_progress:
+            made_progress = False
+            for (move_index, (move, mcost, gs_tup, p_tup)) in enumerate(move_infos):
+                if pruned[move_index] or (move_costs[move_index] is not None):
+                    continue
+                false_future = false_futures[move_index]
+                true_future = true_futures[move_index]
+                if true_future is None:
+                    if not false_future.done():
+                        continue
+                    gs_false_node_cost = node_cost_from_future(false_future)
+                    # Strictly greater, so that a move tying the final best is never pruned before an earlier move
+                    # in the serial order could win the tie.
+                    if s._cost_calculator(mcost, p_tup, (gs_false_node_cost, (0, 0))) > running_best_cost:
+                        pruned[move_index] = True
+                        s.num_pruned_subtrees += 1
+                        continue
+                    true_futures[move_index] = submit(gs_tup[1])
+                    _advance_progress(s, total=len(cache_gs_to_future))
+                    pending.add(true_futures[move_index])
+                    made_progress = True
+                elif true_future.done():
+                    gss_costs = (node_cost_from_future(false_future), node_cost_from_future(true_future))
+                    move_costs[move_index] = s._cost_calculator(mcost, p_tup, gss_costs)
+                    running_best_cost = min(running_best_cost, move_costs[move_index])
+                    made_progress = True
+    # With every needed game state evaluated, pick the best move in the serial search's order, so ties are broken the
+    # same way.
+    best_node_cost = s.initial_best_cost
+    best_move = None
+    for (move, node_cost) in zip([move_info[0] for move_info in move_infos], move_costs):
+        if (node_cost is not None) and (node_cost < best_node_cost):
+            best_node_cost = node_cost
+            best_move = move
+    return (best_move, best_node_cost)
+
+def parallel_calculate_best_move(s, num_processes, split_depth=0):
+    """
+    Do the work of `s._calculate_best_move` on the initial game state of the solver `s`, but spread the root moves (if `split_depth` is 0) or the game states one move below the root (if `split_depth` is 1) across a pool of `num_processes` worker processes. The workers' evaluations_cache fragments are merged into `s._evaluations_cache`, and the root's evaluation is put in the cache just like the serial search would.
+
+    Returns
+    -------
+    The best move from the initial game state, or None if the search was done serially instead (which happens when the initial game state has no moves to spread out).
+    """
+    game_state = s.initial_game_state
+    if one_answer_left(s.full_cwas_list, game_state.cwa_set):
+        s._search(qs_dict=s.qs_dict, game_state=game_state)
+        return None
+    (qs_dict, move_infos, search_kwargs) = s._get_root_search_info()
+    if not move_infos:
+        s._search(qs_dict=s.qs_dict, game_state=game_state)
+        return None
+    mp_context = multiprocessing.get_context()
+    shared_best = mp_context.Array('d', s.initial_best_cost)
+    with ProcessPoolExecutor(
+        max_workers=num_processes,
+        mp_context=mp_context,
+        initializer=_worker_initialize,
+        initargs=(_make_worker_solver(s), qs_dict, search_kwargs, shared_best),
+    ) as executor:
+        if split_depth == 0:
+            (best_move, best_node_cost) = _search_root_moves(s, executor, move_infos, shared_best)
+        else:
+            (best_move, best_node_cost) = _search_depth_one_game_states(s, executor, move_infos)
+    s._evaluations_cache[s._easy_working_gs_to_cache_gs(game_state)] = best_node_cost
+    s.best_move = best_move
+    return best_move
@@ -1,8 +1,10 @@
-import math, itertools, copy
+import math, itertools, copy, heapq, functools, collections, operator
 import numpy as np
 from rich import progress
-from .definitions import Query_Info, all_125_possibilities_set, Rule, Game_State, console # TODO: delete console
+from .definitions import Query_Info, possibilities, all_125_possibilities_set, Rule, Game_State, console # TODO: delete console
 from .hashable_numpy_array import Hashable_Numpy_Array
+from . import query_table
+from .nightmare_cwas import Nightmare_Cwas_List
 
 ############################## PRIVATE FUNCTIONS #################################################
 def _get_all_rules_combinations(rcs_list):
@@ -25,6 +27,7 @@ def _get_all_rules_combinations(rcs_list):
     #     print(f'{combo_num}: {[rule.name for rule in combo]}')
     return(rules_combos)
 
+_ALL_POSSIBILITIES_MASK = (1 << len(possibilities)) - 1
 def _is_combo_possible(combo: list[Rule]):
     """
     WARN: can return None.
@@ -32,20 +35,62 @@ def _is_combo_possible(combo: list[Rule]):
     1) There must be exactly one possible answer.
     2) Each verifier eliminates at least one possibility that is not eliminated by any other verifier.
     If the rules in combo satisfy those requirements, this function will return the one answer that satisfies all verifiers. Otherwise, this function will return None.
+    The rules' reject sets are compared as their reject masks (see definitions.Rule), so unions are ORs of ints.
     """
-    reject_sets = [rule.reject_set for rule in combo]
-    reject_sets_unions = set.union(*reject_sets)
-    if(len(reject_sets_unions) != (len(all_125_possibilities_set) - 1)):
+    reject_masks = [rule.reject_mask for rule in combo]
+    reject_masks_union = functools.reduce(operator.or_, reject_masks, 0)
+    if(reject_masks_union.bit_count() != (len(possibilities) - 1)):
         return(None)
-    answer = (all_125_possibilities_set - reject_sets_unions).pop()
-    for (i, reject_set) in enumerate(reject_sets):
-        all_other_reject_sets = reject_sets[0 : i] + reject_sets[i + 1 :]
-        other_reject_sets_union = set.union(*all_other_reject_sets)
-        if(not(reject_set - other_reject_sets_union)):
+    answer = possibilities[(_ALL_POSSIBILITIES_MASK & ~reject_masks_union).bit_length() - 1]
+    for (i, reject_mask) in enumerate(reject_masks):
+        other_reject_masks_union = functools.reduce(operator.or_, reject_masks[0 : i] + reject_masks[i + 1 :], 0)
+        if(not(reject_mask & ~other_reject_masks_union)):
             return(None) # means that this rule is redundant.
     return(answer)
 
+def _generate_possible_rules_combos_with_answers(rcs_list):
+    """
+    Yield (combo, answer) for every possible combo of rules from the rules cards (see _is_combo_possible), in the same order as _get_all_rules_combinations, without making the combos that aren't possible. Combos are built one rules card at a time, depth first, carrying the union of the reject masks of the rules so far, and the mask of the possibilities more than one of them rejects. A partial combo is dropped, along with every combo that would extend it, once:
+      * one of its rules rejects nothing that the others don't (more rules can only take more of its rejections away), or
+      * its rules reject every possibility, or can't reject all but one of them even with every rule on the rules cards left.
+    """
+    num_to_reject = len(possibilities) - 1
+    # reachable_masks[rc_index] is the union of the reject masks of all the rules on rules cards rc_index and after.
+    reachable_masks = [0] * (len(rcs_list) + 1)
+    for rc_index in range(len(rcs_list) - 1, -1, -1):
+        reachable_masks[rc_index] = functools.reduce(
+            operator.or_, (rule.reject_mask for rule in rcs_list[rc_index]), reachable_masks[rc_index + 1]
+        )
+    combo = []
+    def extend_combo(rc_index, union_mask, multiple_mask):
+        if(rc_index == len(rcs_list)):
+            if(union_mask.bit_count() == num_to_reject):
+                yield (list(combo), possibilities[(_ALL_POSSIBILITIES_MASK & ~union_mask).bit_length() - 1])
+            return
+        for rule in rcs_list[rc_index]:
+            new_union_mask = union_mask | rule.reject_mask
+            if(
+                (new_union_mask.bit_count() > num_to_reject) or
+                ((new_union_mask | reachable_masks[rc_index + 1]).bit_count() < num_to_reject)
+            ):
+                continue
+            new_multiple_mask = multiple_mask | (union_mask & rule.reject_mask)
+            if(not(rule.reject_mask & ~new_multiple_mask)):
+                continue
+            if(any(not(combo_rule.reject_mask & ~new_multiple_mask) for combo_rule in combo)):
+                continue
+            combo.append(rule)
+            yield from extend_combo(rc_index + 1, new_union_mask, new_multiple_mask)
+            combo.pop()
+    yield from extend_combo(0, 0, 0)
+
 def _get_possible_rules_combos_with_answers(rules_cards_list):
+    return(list(_generate_possible_rules_combos_with_answers(rules_cards_list)))
+
+def _get_possible_rules_combos_with_answers_product(rules_cards_list):
+    """
+    The same as _get_possible_rules_combos_with_answers, by checking every combo of _get_all_rules_combinations. Kept to test the faster version against.
+    """
     all_rules_combos = _get_all_rules_combinations(rules_cards_list)
     return([(c, a) for (c,a) in [(c, _is_combo_possible(c)) for c in all_rules_combos] if(a is not None)])
 
@@ -76,50 +121,128 @@ def _compare_two_proposals_small_partition_sets(sp_1: frozenset, sp_2: frozenset
             return _EXCLUDE_SECOND
         return _NOT_ISOMOPHIC
 
-def _init_base_qs_dict(full_cwas_list, flat_rule_list, n_mode):
+def _init_base_qs_dict(full_cwas_list, flat_rule_list, n_mode, set_type):
+    """
+    Make the qs_dict of every useful query for the CWAs in `full_cwas_list`, before any filtering. For each verifier with more than one possible rule, its useful proposals (those rejected by some but not all of its possible rules) are columns of make_rule_rejects_table, and indexing the table with make_cwa_rule_ids's column for the verifier gives whether each CWA is on the false side of each of those queries, so each verifier takes one NumPy pass rather than a Python loop over proposals x rules x CWAs. Proposals are in all_125_possibilities_set's order, and verifiers in index order, as always.
+
+    Returns
+    -------
+    (base_queries_dict, true_bits_by_query) : tuple
+    `base_queries_dict` : dict
+        The base qs_dict.
+    `true_bits_by_query` : dict
+        A dictionary from {(proposal, verifier index) : the query's cwa_set_true as a row of packed bits}, for its Query_Table.
+    """
     base_queries_dict = dict()
+    true_bits_by_query = dict()
+    proposals = list(all_125_possibilities_set)
+    rejects_table = make_rule_rejects_table(flat_rule_list, proposals)
+    cwa_rule_ids = make_cwa_rule_ids(full_cwas_list, n_mode)
     rules_by_verifier = get_set_r_unique_ids_vs_from_full_cwas(full_cwas_list, n_mode)
     for (unsolved_verifier_index, possible_rule_ids_this_verifier) in enumerate(rules_by_verifier):
         if(len(possible_rule_ids_this_verifier) < 2):
             continue # this verifier is solved and has no useful queries, so on to the next one
-        possible_rules_this_verifier = [flat_rule_list[r_id] for r_id in possible_rule_ids_this_verifier]
-        for proposal in all_125_possibilities_set:
-            rejecting_rules_ids = set()
-            for possible_rule in possible_rules_this_verifier:
-                if(proposal in possible_rule.reject_set):
-                    rejecting_rules_ids.add(possible_rule.unique_id)
-            if(0 < len(rejecting_rules_ids) < len(possible_rules_this_verifier)): # useful query
-                # cwa_set representation_change
-                cwa_set_true = set()
-                cwa_set_false = set()
-                for (cwa_index, cwa) in enumerate(full_cwas_list):
-                    (c, p) = (cwa[0], cwa[1])
-                    combo_rule_id = c[(
-                        p[unsolved_verifier_index] if(n_mode) else unsolved_verifier_index
-                    )].unique_id
-                    # cwa_set representation_change
-                    if(combo_rule_id in rejecting_rules_ids):
-                        cwa_set_false.add(cwa_index)
-                    else:
-                        cwa_set_true.add(cwa_index)
-
-                query_info = Query_Info(
-                    cwa_set_true,
-                    cwa_set_false
-                )
-                if(proposal in base_queries_dict):
-                    inner_dict = base_queries_dict[proposal]
-                    assert (not(unsolved_verifier_index in inner_dict))
-                    inner_dict[unsolved_verifier_index] = query_info
-                else:
-                    base_queries_dict[proposal] = {
-                        unsolved_verifier_index: query_info
-                    }
-    return(base_queries_dict)
+        num_rejecting_rules = rejects_table[sorted(possible_rule_ids_this_verifier)].sum(axis=0)
+        useful_columns = np.flatnonzero(
+            (0 < num_rejecting_rules) & (num_rejecting_rules < len(possible_rule_ids_this_verifier))
+        )
+        # [i, cwa_index] is whether the rule the CWA gives this verifier rejects proposals[useful_columns[i]].
+        cwas_false = rejects_table[np.ix_(cwa_rule_ids[:, unsolved_verifier_index], useful_columns)].T
+        cwas_true = ~cwas_false
+        cwa_sets_true = _bool_masks_to_working_cwa_sets(cwas_true, set_type)
+        cwa_sets_false = _bool_masks_to_working_cwa_sets(cwas_false, set_type)
+        true_bits = np.packbits(cwas_true, axis=1, bitorder='little')
+        for (column, cwa_set_true, cwa_set_false, true_bits_row) in zip(
+            useful_columns.tolist(), cwa_sets_true, cwa_sets_false, true_bits
+        ):
+            proposal = proposals[column]
+            query_info = Query_Info(cwa_set_true, cwa_set_false)
+            true_bits_by_query[(proposal, unsolved_verifier_index)] = true_bits_row
+            if(proposal in base_queries_dict):
+                inner_dict = base_queries_dict[proposal]
+                assert (not(unsolved_verifier_index in inner_dict))
+                inner_dict[unsolved_verifier_index] = query_info
+            else:
+                base_queries_dict[proposal] = {
+                    unsolved_verifier_index: query_info
+                }
+    return(base_queries_dict, true_bits_by_query)
+
+def make_rule_rejects_table(flat_rule_list, proposals) -> np.ndarray:
+    """
+    Return a bool array whose [unique_id, j] element is whether the rule with that unique_id in `flat_rule_list` rejects proposal `proposals[j]`. Made by unpacking the rules' reject masks (see definitions.Rule).
+    """
+    possibility_indexes = {possibility : index for (index, possibility) in enumerate(possibilities)}
+    num_bytes = (len(possibilities) + 7) >> 3
+    rejects_by_possibility = np.zeros((max(rule.unique_id for rule in flat_rule_list) + 1, num_bytes), dtype=np.uint8)
+    for rule in flat_rule_list:
+        rejects_by_possibility[rule.unique_id] = np.frombuffer(rule.reject_mask.to_bytes(num_bytes, 'little'), dtype=np.uint8)
+    rejects_by_possibility = np.unpackbits(
+        rejects_by_possibility, axis=1, count=len(possibilities), bitorder='little'
+    ).astype(bool)
+    return rejects_by_possibility[:, [possibility_indexes[proposal] for proposal in proposals]]
+
+def make_cwa_rule_ids(full_cwas_list, n_mode) -> np.ndarray:
+    """
+    Return an int array whose [cwa_index, v_index] element is the unique_id of the rule the CWA `full_cwas_list[cwa_index]` assigns to verifier v_index.
+    """
+    if(type(full_cwas_list) is Nightmare_Cwas_List):
+        return full_cwas_list.cwa_rule_ids()
+    num_vs = len(full_cwas_list[0][0])
+    return np.array([
+        [(c[p[v_index]] if n_mode else c[v_index]).unique_id for v_index in range(num_vs)]
+        for (c, p) in ((cwa[0], cwa[1]) for cwa in full_cwas_list)
+    ], dtype=np.intp).reshape(len(full_cwas_list), num_vs)
+
+def _bool_masks_to_working_cwa_sets(bool_masks: np.ndarray, set_type):
+    """
+    Return a list of the working cwa_sets (see make_working_cwa_set) of the rows of the 2D bool ndarray `bool_masks`, whose element i is whether CWA i is in that row's cwa_set.
+    """
+    if(set_type is int):
+        return [
+            int.from_bytes(packed_row.tobytes(), 'little')
+            for packed_row in np.packbits(bool_masks, axis=1, bitorder='little')
+        ]
+    if(set_type is frozenset):
+        return [frozenset(np.flatnonzero(bool_mask).tolist()) for bool_mask in bool_masks]
+    raise NotImplementedError(f"_bool_masks_to_working_cwa_sets not implemented for working cwa sets of type {set_type}")
 
 def _get_isomorphic_proposals_lol(small_partition_set_dict: dict):
     """
     Get a list of lists of isomorphic queries. If one query is strictly less useful than another (isomorphic to it for all verifiers it can be used on, but the set of verifiers it can be used on is a strict subset of the verifiers the other query can be used on), then it won't appear in any output list.
+    Proposals with equal small partition sets are isomorphic, so they are bucketed by hashing their small partition sets. The lists to keep are the buckets whose small partition set is not a strict subset of another bucket's; this is what comparing every pair would give. Those come from an index of small partition : bitmask of the buckets whose small partition set has it, where ANDing the bitmasks of a bucket's small partitions gives the buckets that are supersets of it. So this takes time linear in the total size of the small partition sets, times the number of buckets / 64 for the ANDs of the bitmasks, rather than O(P^2) set comparisons. Gives the same lists, in the same order, as _get_isomorphic_proposals_lol_pairwise.
+    """
+    isomorphic_proposals_buckets = dict() # small partition set : list of the proposals with it, in order of first proposal.
+    for (proposal, small_partition_set) in small_partition_set_dict.items():
+        small_partition_set = frozenset(small_partition_set)
+        isomorphic_proposals_list = isomorphic_proposals_buckets.get(small_partition_set)
+        if(isomorphic_proposals_list is None):
+            isomorphic_proposals_buckets[small_partition_set] = [proposal]
+        else:
+            isomorphic_proposals_list.append(proposal)
+    buckets_with_small_partition = dict() # small partition : bitmask of the buckets whose set has it.
+    for (bucket_index, small_partition_set) in enumerate(isomorphic_proposals_buckets):
+        bucket_bit = 1 << bucket_index
+        for small_partition in small_partition_set:
+            buckets_with_small_partition[small_partition] = (
+                buckets_with_small_partition.get(small_partition, 0) | bucket_bit
+            )
+    isomorphic_proposals_lol = []
+    for (bucket_index, (small_partition_set, isomorphic_proposals_list)) in enumerate(
+        isomorphic_proposals_buckets.items()
+    ):
+        superset_buckets = -1 # all bits set.
+        for small_partition in small_partition_set:
+            superset_buckets &= buckets_with_small_partition[small_partition]
+        if(superset_buckets == (1 << bucket_index)):
+            # no other bucket has all of this one's small partitions, so this one isn't strictly less useful.
+            isomorphic_proposals_lol.append(isomorphic_proposals_list)
+    return(isomorphic_proposals_lol)
+
+def _get_isomorphic_proposals_lol_pairwise(small_partition_set_dict: dict):
+    """
+    The original version of _get_isomorphic_proposals_lol, which compares each proposal with the representative of every isomorphic proposals list so far, so O(P^2) set comparisons for P proposals. Kept to check and benchmark _get_isomorphic_proposals_lol against (see controller.benchmark_isomorphic_proposals).
+    Get a list of lists of isomorphic queries. If one query is strictly less useful than another (isomorphic to it for all verifiers it can be used on, but the set of verifiers it can be used on is a strict subset of the verifiers the other query can be used on), then it won't appear in any output list.
     """
     # TODO: instead of making the full list of list, just directly make the flat list of proposals you need right here. i.e. if you find that a proposal is isomorphic to something before it, don't append it to that list; just don't include it at all. Have this function return a flat list of all the proposals you need to include. Maybe make a debug mode function that does make the full lol.
     isomorphic_proposals_lol = []
@@ -181,10 +304,16 @@ def _filter_out_isomorphic_proposals(base_qs_dict, isomorphic_proposals_lol):
 
 def _get_small_partition(cwa_set_1, cwa_set_2):
     """
-    Given the cwa_sets of integers representing which cwas would be remaining for the 2 outcomes of a query (in either order), return a set of integers representing the small partition corresponding to this query.
-    Note that since cwa_set_1 and cwa_set_2 are frozensets, this returns a frozenset.
+    Given the working cwa_sets representing which cwas would be remaining for the 2 outcomes of a query (in either order), return the one that is the small partition corresponding to this query.
     TODO: Consider returning sorted tuples as the small partition, rather than frozensets.
     """
+    if(type(cwa_set_1) is int):
+        s1_len = cwa_set_1.bit_count()
+        s2_len = cwa_set_2.bit_count()
+        if(s1_len == s2_len):
+            # x & -x is the lowest set bit of x, so this is the same tie break as the min()s below.
+            return(cwa_set_1 if((cwa_set_1 & -cwa_set_1) < (cwa_set_2 & -cwa_set_2)) else cwa_set_2)
+        return(cwa_set_1 if(s1_len < s2_len) else cwa_set_2)
     s1_len = len(cwa_set_1)
     s2_len = len(cwa_set_2)
     if(s1_len == s2_len):
@@ -205,13 +334,15 @@ def _get_updated_qs_dict_and_pset_dict(qs_dict: dict, current_cwa_set):
     """
     new_qs_dict = dict()
     small_partition_set_dict = dict() # dict from proposal : small_partition_set
+    set_len = int.bit_count if (type(current_cwa_set) is int) else len
+    current_cwa_set_len = set_len(current_cwa_set)
     for (proposal, inner_dict) in qs_dict.items():
         have_put_proposal_into_new_dict = False
         for (v_index, q_info) in inner_dict.items():
             (q_info_true, q_info_false) =  q_info
             # put the game state's frozenset first to keep result a frozenset.
             cwa_set_true = current_cwa_set & q_info_true
-            if(0 < len(cwa_set_true) < len(current_cwa_set)): # *potentially* useful query
+            if(0 < set_len(cwa_set_true) < current_cwa_set_len): # *potentially* useful query
                 cwa_set_false = current_cwa_set & q_info_false
                 new_q_info = Query_Info(cwa_set_true=cwa_set_true, cwa_set_false=cwa_set_false)
                 small_partition = _get_small_partition(cwa_set_true, cwa_set_false)
@@ -333,11 +464,23 @@ def _convert_cache_bitset_to_canonical_int(
         result |= (bitset << shift_amount)
     return (result, indices)
 
+def _int_cwa_set_to_bool_mask(working_cwa_set: int, num_cwas):
+    """ Return a bool ndarray of length `num_cwas` whose element i is whether CWA i is in the int working cwa_set. """
+    return np.unpackbits(
+        np.frombuffer(working_cwa_set.to_bytes((num_cwas + 7) >> 3, 'little'), dtype=np.uint8),
+        count=num_cwas,
+        bitorder='little',
+    ).view(bool)
+
 def _working_cwa_set_to_cache_bitset(
         working_cwa_set,
         all_cwa_bitsets : np.ndarray,
     ):
-    bitsets_to_include = all_cwa_bitsets[list(working_cwa_set)] # bitwise or reduce these ints
+    if(type(working_cwa_set) is int):
+        # a bool mask rather than a list of indexes, so that no Python loop goes over the bits.
+        bitsets_to_include = all_cwa_bitsets[_int_cwa_set_to_bool_mask(working_cwa_set, len(all_cwa_bitsets))]
+    else:
+        bitsets_to_include = all_cwa_bitsets[list(working_cwa_set)] # bitwise or reduce these ints
     return np.bitwise_or.reduce(bitsets_to_include, axis=0)
 
 def _convert_working_gs_to_cache_gs_standard_int(
@@ -364,6 +507,26 @@ def _convert_working_gs_to_cache_gs_standard_nparray(
     )
     return cache_game_state
 
+# A packed cache key is one int that holds a whole cache game state whose cwa_set is an int bitset:
+# (cwa_set << _PACKED_CWA_SET_SHIFT) | (proposal_used_this_round << _PACKED_QUERIES_BITS) | num_queries_this_round
+# where a proposal_used_this_round of None is stored as 0 (proposals are 3 digit ints from 111 to 555).
+_PACKED_QUERIES_BITS  = 2  # num_queries_this_round is 0, 1, or 2.
+_PACKED_PROPOSAL_BITS = 10
+_PACKED_CWA_SET_SHIFT = _PACKED_QUERIES_BITS + _PACKED_PROPOSAL_BITS
+
+def _convert_working_gs_to_cache_gs_standard_int_packed(
+        working_gs: Game_State,
+        all_cwa_bitsets,
+    ):
+    """ Like _convert_working_gs_to_cache_gs_standard_int, but returns a packed cache key (see pack_cache_gs). """
+    cache_bitset = _working_cwa_set_to_cache_bitset(working_gs.cwa_set, all_cwa_bitsets)
+    proposal = 0 if (working_gs.proposal_used_this_round is None) else working_gs.proposal_used_this_round
+    return (
+        (int(cache_bitset) << _PACKED_CWA_SET_SHIFT) |
+        (proposal << _PACKED_QUERIES_BITS) |
+        working_gs.num_queries_this_round
+    )
+
 def _do_not_convert_gs(working_gs, *other_args):
     return working_gs
 
@@ -394,6 +557,32 @@ def _convert_working_gs_to_cache_gs_nightmare_int(
     )
     return (cache_gs, permutation)
 
+def _convert_working_gs_to_cache_gs_nightmare_int_packed(
+        working_gs: Game_State,
+        all_cwa_bitsets,
+        working_cwa_set_convert_cache : dict,
+        shift_amounts,
+        int_verifier_bit_mask
+    ):
+    """ Like _convert_working_gs_to_cache_gs_nightmare_int, but returns a packed cache key (see pack_cache_gs). """
+    res = working_cwa_set_convert_cache.get(working_gs.cwa_set, None)
+    if res is None:
+        cache_bitset = _working_cwa_set_to_cache_bitset(
+            working_gs.cwa_set,
+            all_cwa_bitsets,
+        )
+        (cache_bitset_canonical_form, permutation) = _convert_cache_bitset_to_canonical_int(
+            cache_bitset,
+            shift_amounts,
+            int_verifier_bit_mask
+        )
+        res = (int(cache_bitset_canonical_form) << _PACKED_CWA_SET_SHIFT, permutation)
+        working_cwa_set_convert_cache[working_gs.cwa_set] = res
+    (shifted_canonical_form, permutation) = res
+    proposal = 0 if (working_gs.proposal_used_this_round is None) else working_gs.proposal_used_this_round
+    cache_key = shifted_canonical_form | (proposal << _PACKED_QUERIES_BITS) | working_gs.num_queries_this_round
+    return (cache_key, permutation)
+
 def _convert_working_gs_to_cache_gs_nightmare_nparray(
         working_gs: Game_State,
         all_cwa_bitsets, # NOTE: eliminate once change working_gs cwa set
@@ -418,6 +607,27 @@ def _convert_working_gs_to_cache_gs_nightmare_nparray(
     )
     return (cache_gs, permutation)
 
+def _huffman_cost(weights, arity):
+    """
+    Return the total weighted depth (sum over leaves of weight * depth) of an optimal `arity`-ary Huffman tree with leaves of the given integer `weights`. No prefix code (i.e. no decision tree whose nodes have at most `arity` children) over leaves with these weights has a smaller total weighted depth.
+    """
+    num_leaves = len(weights)
+    if num_leaves <= 1:
+        return 0
+    if num_leaves <= arity:
+        return sum(weights)
+    # Pad with zero-weight leaves so that every internal node of the tree is full.
+    heap = list(weights) + ([0] * ((-(num_leaves - 1)) % (arity - 1)))
+    heapq.heapify(heap)
+    total_weighted_depth = 0
+    while len(heap) > 1:
+        merged_weight = 0
+        for _ in range(arity):
+            merged_weight += heapq.heappop(heap)
+        total_weighted_depth += merged_weight
+        heapq.heappush(heap, merged_weight)
+    return total_weighted_depth
+
 def _python_index(seq, item):
     return seq.index(item)
 
@@ -455,6 +665,91 @@ def get_cwa_bitsets(full_cwas_list, possible_rules_by_verifier, n_mode, set_type
         dtype=(np.uint8 if (set_type == np.ndarray) else object)
     )
 
+def make_working_cwa_set(cwa_indexes, set_type):
+    """
+    Return a working cwa_set (see definitions.Game_State) of the CWA indexes in `cwa_indexes`. If `set_type` is int, it is an int with bit i set for each CWA i in it; otherwise it is a frozenset of the CWA indexes. See config.WORKING_CWA_SET_TYPE.
+    """
+    if(set_type is int):
+        cwa_indexes = list(cwa_indexes)
+        if not cwa_indexes:
+            return 0
+        bits = bytearray(b'0' * (max(cwa_indexes) + 1))
+        for cwa_index in cwa_indexes:
+            bits[cwa_index] = ord('1')
+        return int(bits[::-1], 2) # int() is O(n) on a base 2 string, unlike or-ing in the bits one at a time.
+    if(set_type is frozenset):
+        return frozenset(cwa_indexes)
+    raise NotImplementedError(f"make_working_cwa_set not implemented for working cwa sets of type {set_type}")
+
+def cwa_set_len(working_cwa_set):
+    """ The number of CWAs in a working cwa_set, whichever type it is. """
+    return working_cwa_set.bit_count() if (type(working_cwa_set) is int) else len(working_cwa_set)
+
+def cwa_set_indexes(working_cwa_set):
+    """ An iterable of the indexes of the CWAs in a working cwa_set, whichever type it is. For int cwa_sets, these are in ascending order. """
+    if(type(working_cwa_set) is int):
+        return [cwa_index for (cwa_index, bit) in enumerate(bin(working_cwa_set)[:1:-1]) if (bit == '1')]
+    return working_cwa_set
+
+def make_cwa_rule_masks(full_cwas_list, n_mode) -> np.ndarray:
+    """
+    Return an array whose [cwa_index, v_index] element has one bit set: the bit of the rule the CWA `full_cwas_list[cwa_index]` assigns to verifier v_index. Bits are numbered in unique_id order of all the rules any CWA assigns, so a bit means the same rule for every verifier. OR-reducing the rows of a cwa_set gives the rules still possible for each verifier; see get_rule_masks_by_verifier.
+    """
+    cwa_rule_ids = make_cwa_rule_ids(full_cwas_list, n_mode)
+    (rule_unique_ids, cwa_rule_bits) = np.unique(cwa_rule_ids, return_inverse=True)
+    cwa_rule_bits = cwa_rule_bits.reshape(cwa_rule_ids.shape)
+    if(len(rule_unique_ids) <= 64):
+        return np.left_shift(np.uint64(1), cwa_rule_bits.astype(np.uint64))
+    return np.array([[1 << bit for bit in row] for row in cwa_rule_bits.tolist()], dtype=object)
+
+def get_rule_masks_by_verifier(working_cwa_set, cwa_rule_masks: np.ndarray) -> list[int]:
+    """
+    Return a list whose element v is a mask of the rules that are still possible for verifier v given the CWAs in `working_cwa_set`. See make_cwa_rule_masks for what the bits mean. Two verifiers have the same possible rules iff their masks are equal.
+    """
+    if(type(working_cwa_set) is int):
+        cwa_rows = cwa_rule_masks[_int_cwa_set_to_bool_mask(working_cwa_set, len(cwa_rule_masks))]
+    else:
+        cwa_rows = cwa_rule_masks[list(working_cwa_set)]
+    return np.bitwise_or.reduce(cwa_rows, axis=0).tolist()
+
+def make_answer_block_masks(full_cwas_list):
+    """
+    Return a list whose element i is an int with the bits set of the CWAs that have the ith distinct answer in `full_cwas_list`. Since make_full_cwas_list sorts the CWAs by answer, each of these answer blocks is one contiguous run of bits, and the answers are numbered in the order they first appear (as Solver.cwa_answer_ids does).
+    """
+    answer_block_masks = []
+    previous_answer = None
+    for (cwa_index, cwa) in enumerate(full_cwas_list):
+        if (not answer_block_masks) or (cwa[-1] != previous_answer):
+            answer_block_masks.append(0)
+            previous_answer = cwa[-1]
+        answer_block_masks[-1] |= (1 << cwa_index)
+    assert (len(answer_block_masks) == len(set(cwa[-1] for cwa in full_cwas_list))), "CWAs not sorted by answer."
+    return answer_block_masks
+
+def get_answer_counts(working_cwa_set, cwa_answer_ids, answer_block_masks):
+    """
+    Return a dict (a Counter, for frozensets) of answer_id : number of CWAs in `working_cwa_set` with that answer, for the answers that have any. For int cwa_sets, this takes a few bit operations per answer left, rather than a step per CWA: the lowest CWA left gives an answer, the answer's block gives its count, and then the block is cleared.
+    """
+    if(type(working_cwa_set) is int):
+        answer_counts = dict()
+        while working_cwa_set:
+            answer_id = cwa_answer_ids[(working_cwa_set & -working_cwa_set).bit_length() - 1]
+            answer_block = working_cwa_set & answer_block_masks[answer_id]
+            answer_counts[answer_id] = answer_block.bit_count()
+            working_cwa_set ^= answer_block
+        return answer_counts
+    return collections.Counter(map(cwa_answer_ids.__getitem__, working_cwa_set))
+
+def get_num_answers(working_cwa_set, cwa_answer_ids, answer_block_masks):
+    """ Return the number of distinct answers of the CWAs in `working_cwa_set`. See get_answer_counts. """
+    if(type(working_cwa_set) is int):
+        num_answers = 0
+        while working_cwa_set:
+            working_cwa_set &= ~answer_block_masks[cwa_answer_ids[(working_cwa_set & -working_cwa_set).bit_length() - 1]]
+            num_answers += 1
+        return num_answers
+    return len(set(map(cwa_answer_ids.__getitem__, working_cwa_set)))
+
 def bitset_to_int(bitset):
     """
     Given a bitset, return the integer that corresponds to it. Note that bitset may be of different types. Intended for use only for non-performance-sensitive tasks like displaying.
@@ -467,7 +762,37 @@ def bitset_to_int(bitset):
         return _nd_array_to_int(bitset.nparray)
     raise NotImplementedError(f"bitset_to_int not implemented for bitsets of type {type(bitset)}")
 
-def get_convert_working_to_cache_gs_standard(bitset_type):
+def pack_cache_gs(cache_gs: Game_State):
+    """ Return the packed cache key (an int) of a cache game state whose cwa_set is an int bitset. """
+    proposal = 0 if (cache_gs.proposal_used_this_round is None) else cache_gs.proposal_used_this_round
+    return (
+        (cache_gs.cwa_set << _PACKED_CWA_SET_SHIFT) |
+        (proposal << _PACKED_QUERIES_BITS) |
+        cache_gs.num_queries_this_round
+    )
+
+def unpack_cache_key(cache_key) -> Game_State:
+    """ Return the cache game state that `cache_key` stands for. Cache keys that are not packed are cache game states already. Intended for use only for non-performance-sensitive tasks like displaying and evicting. """
+    if(type(cache_key) is not int):
+        return cache_key
+    proposal = (cache_key >> _PACKED_QUERIES_BITS) & ((1 << _PACKED_PROPOSAL_BITS) - 1)
+    return Game_State(
+        num_queries_this_round=cache_key & ((1 << _PACKED_QUERIES_BITS) - 1),
+        proposal_used_this_round=(None if (proposal == 0) else proposal),
+        cwa_set=cache_key >> _PACKED_CWA_SET_SHIFT,
+    )
+
+def _packed_keys_not_implemented(bitset_type):
+    return NotImplementedError(
+        f"Packed cache keys are only implemented for bitset_type int, not {bitset_type}. See config.PACKED_CACHE_KEYS."
+    )
+
+def get_convert_working_to_cache_gs_standard(bitset_type, packed=False):
+    """ If `packed`, the returned function gives packed cache keys (see pack_cache_gs) rather than cache game states. """
+    if(packed):
+        if(bitset_type is int):
+            return _convert_working_gs_to_cache_gs_standard_int_packed
+        raise _packed_keys_not_implemented(bitset_type)
     if(bitset_type is int):
         return _convert_working_gs_to_cache_gs_standard_int
     if(bitset_type is np.ndarray):
@@ -478,7 +803,12 @@ def get_convert_working_to_cache_gs_standard(bitset_type):
         f"Convert working game state to cache game state standard not implemented for bitset_type {bitset_type}"
     )
 
-def get_convert_working_to_cache_gs_nightmare(bitset_type):
+def get_convert_working_to_cache_gs_nightmare(bitset_type, packed=False):
+    """ If `packed`, the returned function gives packed cache keys (see pack_cache_gs) rather than cache game states. """
+    if(packed):
+        if(bitset_type is int):
+            return _convert_working_gs_to_cache_gs_nightmare_int_packed
+        raise _packed_keys_not_implemented(bitset_type)
     if(bitset_type is int):
         return _convert_working_gs_to_cache_gs_nightmare_int
     if(bitset_type is np.ndarray):
@@ -497,6 +827,8 @@ def get_set_r_unique_ids_vs_from_full_cwas(full_cwas, n_mode: bool):
     """
     Given a full_cwas iterable, returns a list, where list[i] contains a set of the unique_ids for all possible rules for verifier i. Note: this is used in display.py for printing useful_qs_dict info, to display what rules are possible for each verifier.
     """
+    if(type(full_cwas) is Nightmare_Cwas_List):
+        return [set(np.unique(v_rule_ids).tolist()) for v_rule_ids in full_cwas.cwa_rule_ids().T]
     num_vs = len(full_cwas[0][0])
     possible_rule_ids_by_verifier = [set() for _ in range(num_vs)]
     for cwa in full_cwas:
@@ -511,19 +843,11 @@ def make_full_cwas_list(n_mode: bool, rcs_list: list[list[Rule]]):
     """
     Make a full list of cwas given a boolean of n_mode and the rule cards list.
     NOTE: This does not depend on any property of the problem other than these, so you can use this function to get a full cwas list if the rcs_list contains only a proper subset of rule cards/rules.
+    In nightmare mode, this is a Nightmare_Cwas_List rather than a list: each combo has a CWA for every permutation of the verifiers, which it keeps as indexes rather than as n! tuples, but indexing or iterating over it gives (full rule combo, full permutation, answer) tuples.
     """
     possible_combos_with_answers = _get_possible_rules_combos_with_answers(rcs_list)
     if(n_mode):
-        nightmare_possible_combos_with_answers = []
-        vs = list(range(len(rcs_list))) # vs = [0, 1, 2, . . . for number of verifiers]
-        verifier_permutations = tuple(itertools.permutations(vs))
-        for original_cwa in possible_combos_with_answers:
-            for v_permutation in verifier_permutations:
-                nightmare_possible_combos_with_answers.append(
-                    (original_cwa[0], v_permutation, original_cwa[1])
-                )
-        possible_combos_with_answers = nightmare_possible_combos_with_answers
-        # possible_combos_with_answers is now [(full rule combo, full permutation, answer), ...]
+        return Nightmare_Cwas_List(possible_combos_with_answers, len(rcs_list))
     # sort the possible cwas by answer. Will be helpful in calculating one_answer_left when switch to bitsets.
     possible_combos_with_answers.sort(key=lambda t:t[-1])
     return(possible_combos_with_answers)
@@ -534,18 +858,30 @@ def make_useful_qs_dict(full_cwas_list, cwa_set, flat_rule_list, n_mode):
     """
     if not full_cwas_list: # only happens on invalid problems.
         return None
-    base_qs_dict = _init_base_qs_dict(
+    (base_qs_dict, true_bits_by_query) = _init_base_qs_dict(
         full_cwas_list,
         flat_rule_list,
-        n_mode
+        n_mode,
+        (int if (type(cwa_set) is int) else frozenset),
     )
+    # as a Query_Dict, so that full_filter uses the Query_Table of the base qs_dict from here on.
+    base_qs_dict = query_table.make_base_query_dict(base_qs_dict, len(full_cwas_list), true_bits_by_query)
     useful_qs_dict = full_filter(base_qs_dict, cwa_set)
     return(useful_qs_dict)
 
 def full_filter(qs_dict: dict, current_cwa_set):
     """
-    Given the current cwa_set for a game state and the qs dict, return a *new* qs_dict that is completely updated: all useless/isomorphic queries are filtered out.
+    Given the current cwa_set for a game state and the qs dict, return a *new* qs_dict that is completely updated: all useless/isomorphic queries are filtered out. A query_table.Query_Dict is filtered with its Query_Table, and gives back a Query_Dict; a plain dict is filtered with the set operations below, which are the reference that the Query_Table filtering is tested against.
     """
+    if(type(qs_dict) is query_table.Query_Dict):
+        (rows_dict, small_partition_set_dict) = query_table.get_rows_and_pset_dict(qs_dict, current_cwa_set)
+        isomorphic_proposals_lol = _get_isomorphic_proposals_lol(small_partition_set_dict)
+        return query_table.make_filtered_query_dict(
+            qs_dict,
+            current_cwa_set,
+            rows_dict,
+            [isomorphic_proposals_list[0] for isomorphic_proposals_list in isomorphic_proposals_lol],
+        )
     (updated_qs_dict, small_partition_set_dict) = _get_updated_qs_dict_and_pset_dict(qs_dict, current_cwa_set)
     new_qs_dict = _get_dict_filtered_of_isomorphic_proposals(updated_qs_dict, small_partition_set_dict)
     return(new_qs_dict)
@@ -569,6 +905,42 @@ def progress_initialize():
     return(p)
 
 # NOTE: all calculate_*_cost functions need to take the same 3 parameters, regardless of whether they use them
+def calculate_lower_bound_cost(answer_counts, game_state: Game_State):
+    """
+    Return an admissible lower bound (rounds, queries) on the cost to solve from `game_state`, given `answer_counts`, the number of CWAs in its cwa_set that have each distinct answer left. Each CWA is equally likely, the game ends when one answer is left, and every query splits the CWAs in two. Therefore:
+      * queries: the query tree is a binary tree whose leaves each have one answer, so its expected depth is at least that of the binary Huffman tree over the answers.
+      * rounds: a round is at most 3 queries, so at most 8 outcomes, and a tree of whole rounds costs at least the 8-ary Huffman tree over the answers. Mid-round, the r queries left in the current round are free, so at most 2**r answers can be finished without another round, and every 3 queries after those r cost at least a round.
+    Both bounds are lower bounds for the worst-case cost as well.
+    """
+    free_queries_left_this_round = (
+        0 if (game_state.proposal_used_this_round is None) else 3 - game_state.num_queries_this_round
+    )
+    # Only a few distinct answer count multisets come up in a solve, so the bounds are memoized on them.
+    return _lower_bound_cost_from_sorted_answer_counts(tuple(sorted(answer_counts)), free_queries_left_this_round)
+
+@functools.lru_cache(maxsize=1 << 16)
+def _lower_bound_cost_from_sorted_answer_counts(sorted_answer_counts, free_queries_left_this_round):
+    num_cwas = sum(sorted_answer_counts)
+    num_queries_bound = _huffman_cost(sorted_answer_counts, 2)
+    if free_queries_left_this_round == 0:
+        num_rounds_bound = _huffman_cost(sorted_answer_counts, 8)
+        return (num_rounds_bound / num_cwas, num_queries_bound / num_cwas)
+    # At most 2**free_queries_left_this_round answers can be finished without another round.
+    num_cwas_needing_another_round = sum(sorted_answer_counts[:-(1 << free_queries_left_this_round)])
+    num_rounds_bound = max(
+        3 * num_cwas_needing_another_round,
+        num_queries_bound - (free_queries_left_this_round * num_cwas),
+    )
+    return (num_rounds_bound / (3 * num_cwas), num_queries_bound / num_cwas)
+
+def lower_bound_rules_out(lower_bound_cost, best_cost, slack):
+    """
+    Return True if a node whose cost is at least `lower_bound_cost` can't be better than `best_cost`. The bounds and costs are floats, so the bound must beat `best_cost` by more than `slack` on a component for it to count; otherwise rounding in the costs could make a pruned node that ties `best_cost` look better than it.
+    """
+    if (lower_bound_cost[0] > best_cost[0] + slack):
+        return True
+    return ((lower_bound_cost[0] >= best_cost[0] - slack) and (lower_bound_cost[1] > best_cost[1] + slack))
+
 def calculate_expected_cost(move_cost, probs, gss_costs):
     (mcost_rounds, mcost_queries) = move_cost
     (p_false, p_true) = probs